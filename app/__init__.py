@@ -1,6 +1,8 @@
 
 import os
+import sys
 import time
+import importlib.util
 
 from dotenv import load_dotenv
 
@@ -13,8 +15,10 @@ SERVER_DASHBOARD_URL = f"https://dashboard.heroku.com/apps/{SERVER_NAME}"
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 
+CONFIRMED = (os.getenv("CONFIRMED", default="false") == "true") # skips the confirmation prompts, like in worker processes which have no terminal
+
 def seek_confirmation():
-    if APP_ENV == "development":
+    if APP_ENV == "development" and not CONFIRMED:
         if input("CONTINUE? (Y/N): ").upper() != "Y":
             print("EXITING...")
             exit()
@@ -24,3 +28,20 @@ def server_sleep(seconds=None):
     if APP_ENV == "production":
         print(f"SERVER '{SERVER_NAME.upper()}' SLEEPING...")
         time.sleep(seconds)
+
+def lazy_import(module_name):
+    """
+    Returns the module, but defers executing it until one of its attributes is first accessed.
+    For heavy dependencies (like google.cloud.bigquery) which many scripts import but don't always use.
+
+    Param: module_name (str) like "google.cloud.bigquery"
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.find_spec(module_name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import fcntl
+import base64
+import shutil
+import hashlib
+from contextlib import contextmanager
+from pprint import pprint
+
+from dotenv import load_dotenv
+
+from app import DATA_DIR
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+
+load_dotenv()
+
+ARTIFACT_CACHE = (os.getenv("ARTIFACT_CACHE", default="false") == "true") # opt-in to sharing downloaded files between processes on the same machine
+ARTIFACT_CACHE_DIRPATH = os.getenv("ARTIFACT_CACHE_DIRPATH", default=os.path.join(DATA_DIR, "artifact_cache"))
+ARTIFACT_CACHE_MAX_GB = float(os.getenv("ARTIFACT_CACHE_MAX_GB", default="50"))
+
+def compile_key(blob):
+    """
+    A name for the blob's contents: its MD5 hash, or for composite blobs (which don't have one) its CRC32C checksum and size.
+    Returns None if the blob has neither (in which case it doesn't get cached).
+    """
+    if blob.md5_hash:
+        return "md5-" + base64.b64decode(blob.md5_hash).hex()
+    if blob.crc32c:
+        return "crc32c-" + base64.b64decode(blob.crc32c).hex() + f"-{blob.size}"
+    return None
+
+class ArtifactCache:
+    def __init__(self, dirpath=ARTIFACT_CACHE_DIRPATH, max_gb=ARTIFACT_CACHE_MAX_GB):
+        """
+        Stores downloaded files on local disk, named after the contents of the blob they came from,
+            so the same graph or model only gets downloaded once per machine, no matter how many processes (or storage dirs) need it.
+
+        Each entry is a pair of files named after the content key: "<key>.artifact" (the contents) and "<key>.json" (the metadata).
+        Downloads get written to a temporary file then renamed into place, and each key is locked while downloading,
+            so multiple processes can share the same cache dir.
+
+        The cache also remembers which blob each local file (outside the cache) was copied from,
+            so a storage class can tell a fresh local copy from a stale one (see is_fresh()).
+
+        Params:
+            dirpath (str) where to store the cached files
+            max_gb (float) evicts the least recently used entries when the total size exceeds this
+        """
+        self.dirpath = dirpath
+        self.max_bytes = int(float(max_gb) * 1024 * 1024 * 1024)
+
+        for dirpath in [self.dirpath, self.locks_dirpath, self.local_files_dirpath]:
+            if not os.path.exists(dirpath):
+                os.makedirs(dirpath)
+
+    @property
+    def metadata(self):
+        return {"dirpath": self.dirpath, "max_bytes": self.max_bytes}
+
+    @property
+    def locks_dirpath(self):
+        return os.path.join(self.dirpath, "locks")
+
+    @property
+    def local_files_dirpath(self):
+        return os.path.join(self.dirpath, "local_files")
+
+    def artifact_filepath(self, key):
+        return os.path.join(self.dirpath, f"{key}.artifact")
+
+    def entry_filepath(self, key):
+        return os.path.join(self.dirpath, f"{key}.json")
+
+    def local_file_filepath(self, local_filepath):
+        return os.path.join(self.local_files_dirpath, hashlib.sha256(os.path.abspath(local_filepath).encode("utf-8")).hexdigest() + ".json")
+
+    @contextmanager
+    def locked(self, name):
+        """Prevents multiple processes from downloading the same key (or evicting) at the same time."""
+        with open(os.path.join(self.locks_dirpath, f"{name}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def write_json(filepath, data):
+        tmp_filepath = filepath + f".{os.getpid()}.tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_filepath, filepath) # atomic
+
+    @staticmethod
+    def read_json(filepath):
+        try:
+            with open(filepath, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    #
+    # ENTRIES
+    #
+
+    def read_entry(self, key):
+        return self.read_json(self.entry_filepath(key))
+
+    def delete_entry(self, key):
+        for filepath in [self.entry_filepath(key), self.artifact_filepath(key)]:
+            if os.path.isfile(filepath):
+                os.remove(filepath)
+
+    @property
+    def entries(self):
+        entries = []
+        for filename in os.listdir(self.dirpath):
+            if filename.endswith(".json"):
+                entry = self.read_entry(filename.replace(".json", ""))
+                if entry:
+                    entries.append(entry)
+        return entries
+
+    def touch(self, key):
+        entry = self.read_entry(key)
+        if entry:
+            entry["accessed_at"] = time.time()
+            self.write_json(self.entry_filepath(key), entry)
+
+    #
+    # LOCAL FILES
+    #
+
+    def record(self, blob, local_filepath):
+        """Remembers the local file as a copy of the blob (like after uploading or downloading it)."""
+        stat = os.stat(local_filepath)
+        self.write_json(self.local_file_filepath(local_filepath), {
+            "filepath": os.path.abspath(local_filepath),
+            "key": compile_key(blob),
+            "blob_name": blob.name,
+            "generation": blob.generation,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        })
+
+    def is_fresh(self, blob, local_filepath):
+        """Whether the local file is an unmodified copy of the blob's current contents."""
+        record = self.read_json(self.local_file_filepath(local_filepath))
+        if not record or not os.path.isfile(local_filepath) or record["key"] is None:
+            return False
+        stat = os.stat(local_filepath)
+        return record["key"] == compile_key(blob) and record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns
+
+    #
+    # FETCHING
+    #
+
+    def fetch(self, blob, local_filepath, download):
+        """
+        Copies the blob's contents to the local file, downloading them into the cache first, unless they're already cached.
+        Skips the copy if the local file is already a fresh copy of the blob.
+
+        Params:
+            blob (google.cloud.storage.Blob) with its properties already fetched (see Bucket.get_blob())
+            download (function) which downloads the blob to a given filepath
+        """
+        key = compile_key(blob)
+        if key is None:
+            download(local_filepath)
+            return blob
+
+        if self.is_fresh(blob, local_filepath):
+            print(logstamp(), "ARTIFACT CACHE: FRESH", os.path.basename(local_filepath))
+            self.touch(key)
+            return blob
+
+        with self.locked(key):
+            if os.path.isfile(self.artifact_filepath(key)) and self.read_entry(key):
+                print(logstamp(), "ARTIFACT CACHE: HIT", key[0:16], "|", blob.name)
+            else:
+                print(logstamp(), "ARTIFACT CACHE: MISS", key[0:16], "|", blob.name)
+                tmp_filepath = self.artifact_filepath(key) + f".{os.getpid()}.tmp"
+                try:
+                    download(tmp_filepath)
+                    os.replace(tmp_filepath, self.artifact_filepath(key)) # atomic
+                finally:
+                    if os.path.isfile(tmp_filepath):
+                        os.remove(tmp_filepath)
+                now = time.time()
+                self.write_json(self.entry_filepath(key), {
+                    "key": key,
+                    "blob_name": blob.name,
+                    "generation": blob.generation,
+                    "size": os.path.getsize(self.artifact_filepath(key)),
+                    "created_at": now,
+                    "accessed_at": now,
+                })
+
+            tmp_filepath = local_filepath + f".{os.getpid()}.tmp"
+            shutil.copyfile(self.artifact_filepath(key), tmp_filepath) # a copy rather than a link, so writing to the local file can't corrupt the cache
+            os.replace(tmp_filepath, local_filepath) # atomic
+            self.touch(key)
+
+        self.record(blob, local_filepath)
+        self.evict()
+        return blob
+
+    #
+    # EVICTION
+    #
+
+    @property
+    def total_size(self):
+        return sum([entry["size"] for entry in self.entries])
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits within the max size."""
+        with self.locked("eviction"):
+            entries = sorted(self.entries, key=lambda e: e["accessed_at"])
+            total_size = sum([entry["size"] for entry in entries])
+            while entries and total_size > self.max_bytes:
+                lru_entry = entries.pop(0)
+                print(logstamp(), "ARTIFACT CACHE: EVICTING", lru_entry["key"][0:16], "|", fmt_n(lru_entry["size"]), "BYTES")
+                with self.locked(lru_entry["key"]): # waits for any process which is copying it
+                    self.delete_entry(lru_entry["key"])
+                total_size -= lru_entry["size"]
+
+    def clear(self):
+        for entry in self.entries:
+            self.delete_entry(entry["key"])
+
+
+if __name__ == "__main__":
+
+    cache = ArtifactCache()
+
+    print("-------------------------")
+    print("ARTIFACT CACHE...")
+    pprint(cache.metadata)
+    print("ENTRIES:", fmt_n(len(cache.entries)))
+    print("TOTAL SIZE:", fmt_n(cache.total_size), "BYTES")
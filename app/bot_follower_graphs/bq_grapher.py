@@ -1,6 +1,6 @@
-from memory_profiler import profile
+import os
 
-from networkx import DiGraph
+from app.resource_monitor import monitored
 
 from app import seek_confirmation
 from app.decorators.datetime_decorators import logstamp
@@ -8,47 +8,83 @@ from app.decorators.number_decorators import fmt_n
 from app.bq_service import BigQueryService
 from app.retweet_graphs_v2.graph_storage import GraphStorage
 from app.retweet_graphs_v2.job import Job
+from app.compact_graphs.edge_buffer import EdgeBuffer
+from app.compact_graphs.bipartite_graph import BipartiteGraph, BipartiteGraphBuilder
 
 BOT_MIN = 0.8
-BATCH_SIZE = 100
+BATCH_SIZE = 1000 # the number of bots (each with a list of followers) to fetch at a time
+BIPARTITE = (os.getenv("BIPARTITE", default="true") == "true") # opt-out of storing the graph as a bots x followers matrix (see app/compact_graphs/bipartite_graph.py)
 
 
 class BotFollowerGrapher(GraphStorage, Job):
-    def __init__(self, bq_service=None, bot_min=BOT_MIN, batch_size=BATCH_SIZE, storage_dirpath=None):
+    def __init__(self, bq_service=None, bot_min=BOT_MIN, batch_size=BATCH_SIZE, storage_dirpath=None, bipartite=BIPARTITE):
         self.bq_service = bq_service or BigQueryService()
         self.bot_min = bot_min
         self.batch_size = batch_size
+        self.bipartite = (bipartite == True)
 
         Job.__init__(self)
 
         storage_dirpath = storage_dirpath or f"bot_follower_graphs/bot_min/{self.bot_min}"
-        GraphStorage.__init__(self, dirpath=storage_dirpath)
+        GraphStorage.__init__(self, dirpath=storage_dirpath, binary=(not self.bipartite)) # the bipartite graph is already stored as raw arrays
 
         print("-------------------------")
         print("BOT FOLLOWER GRAPHER...")
         print("  BOT MIN:", self.bot_min)
         print("  BATCH SIZE:", self.batch_size)
+        print("  BIPARTITE:", self.bipartite)
         print("-------------------------")
 
         seek_confirmation()
 
     @property
     def metadata(self):
-        return {**super().metadata, **{"bot_min": self.bot_min, "batch_size": self.batch_size}}
+        return {**super().metadata, **{"bot_min": self.bot_min, "batch_size": self.batch_size, "bipartite": self.bipartite}}
 
-    @profile
+    #
+    # BIPARTITE GRAPH STORAGE
+    #
+
+    @property
+    def graph_filename(self):
+        return "bipartite_graph.npz" if self.bipartite else super().graph_filename
+
+    def write_graph_to_file(self):
+        if not self.bipartite:
+            return super().write_graph_to_file()
+        print(logstamp(), "WRITING GRAPH...")
+        self.graph.save(self.local_graph_filepath)
+
+    def read_graph_from_file(self):
+        if not self.bipartite:
+            return super().read_graph_from_file()
+        print(logstamp(), "READING GRAPH...")
+        return BipartiteGraph.load(self.local_graph_filepath)
+
+    @monitored
     def perform(self):
-        self.graph = DiGraph()
+        self.graph = None
+        if self.bipartite:
+            graph = BipartiteGraphBuilder()
+        else:
+            graph = EdgeBuffer()
 
         print("FETCHING BOT FOLLOWERS...")
 
-        for row in self.bq_service.fetch_bot_follower_lists(bot_min=self.bot_min):
-            bot_id = row["bot_id"]
-            self.graph.add_edges_from([(follower_id, bot_id) for follower_id in row["follower_ids"]])
+        for batch in self.bq_service.fetch_bot_follower_lists(bot_min=self.bot_min, arrow_batch_size=self.batch_size):
+            if self.bipartite:
+                graph.append_record_batch(batch)
+            else:
+                graph.append_lists(batch.column("bot_id"), batch.column("follower_ids"), reverse=True) # from each follower to the bot
+
+            self.counter += batch.num_rows
+            print("  ", logstamp(), "| BOTS:", fmt_n(self.counter), "| EDGES:", fmt_n(graph.edge_count))
 
-            self.counter += 1
-            if self.counter % self.batch_size == 0:
-                print("  ", logstamp(), "| BOTS:", fmt_n(self.counter))
+        print(logstamp(), "ASSEMBLING GRAPH...")
+        if self.bipartite:
+            self.graph = graph.to_bipartite_graph()
+        else:
+            self.graph = graph.to_compact_graph() if self.compact else graph.to_networkx()
 
 
 if __name__ == "__main__":
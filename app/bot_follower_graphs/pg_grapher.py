@@ -1,4 +1,4 @@
-#from memory_profiler import profile
+#from app.resource_monitor import monitored
 #
 #from networkx import DiGraph
 #
@@ -36,7 +36,7 @@
 #    def metadata(self):
 #        return {**super().metadata, **{"bot_min": self.bot_min, "batch_size": self.batch_size}}
 #
-#    @profile
+#    @monitored
 #    def perform(self):
 #        self.graph = DiGraph()
 #
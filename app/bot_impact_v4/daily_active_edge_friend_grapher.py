@@ -4,7 +4,7 @@ import os
 
 from pandas import DataFrame, read_csv
 from networkx import DiGraph, write_gpickle, read_gpickle
-from memory_profiler import profile
+from app.resource_monitor import monitored
 
 from app.decorators.number_decorators import fmt_n
 from app.job import Job
@@ -41,7 +41,7 @@ class NpEncoder(json.JSONEncoder):
         else:
             return super(NpEncoder, self).default(obj)
 
-#@profile
+@monitored
 def save_graph_as_json(graph, local_json_graph_filepath):
     print("CONVERTING GRAPH TO JSON...")
     data = json_graph.node_link_data(graph)
@@ -54,7 +54,7 @@ def save_graph_as_json(graph, local_json_graph_filepath):
 
 
 
-#@profile
+@monitored
 def load_graph(local_graph_filepath):
     print("LOADING GRAPH...")
     graph = read_gpickle(local_graph_filepath)
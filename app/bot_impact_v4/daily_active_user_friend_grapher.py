@@ -1,13 +1,17 @@
 
 import os
 
-from pandas import DataFrame, read_csv
-from networkx import DiGraph, write_gpickle, read_gpickle
+from pandas import read_csv
+from networkx import write_gpickle
 
+from app import seek_confirmation
 from app.decorators.number_decorators import fmt_n
 from app.job import Job
-from app.bq_service import BigQueryService
+from app.bq_service import BigQueryService, ARROW_BATCH_SIZE
 from app.file_storage import FileStorage
+from app.compact_graphs.friend_graph_builder import FriendGraphBuilder
+from app.bot_impact_v4.daily_jobs import N_DAYS, consecutive_dates, batches_to_df, perform_daily
+from app.workers import GRAPH_WORKERS
 
 DATE = os.getenv("DATE", default="2020-01-23")
 TWEET_MIN = os.getenv("TWEET_MIN")
@@ -17,27 +21,44 @@ BATCH_SIZE = int(os.getenv("BATCH_SIZE", default="100000"))
 DESTRUCTIVE = (os.getenv("DESTRUCTIVE", default="false") == "true")
 
 #GRAPH_LIMIT = os.getenv("GRAPH_LIMIT")
-GRAPH_BATCH_SIZE = int(os.getenv("GRAPH_BATCH_SIZE", default="10000"))
 GRAPH_DESTRUCTIVE = (os.getenv("GRAPH_DESTRUCTIVE", default="false") == "true")
-
-
-if __name__ == "__main__":
-
-    print("------------------------")
-    print("GRAPHER...")
-    print("  DATE:", DATE)
-    print("  TWEET_MIN:", TWEET_MIN)
-
-    print("  LIMIT:", LIMIT)
-    print("  BATCH_SIZE:", BATCH_SIZE)
-    print("  DESTRUCTIVE:", DESTRUCTIVE)
-
-    #print("  GRAPH_LIMIT:", GRAPH_LIMIT)
-    print("  GRAPH_BATCH_SIZE:", GRAPH_BATCH_SIZE)
-    print("  GRAPH_DESTRUCTIVE:", GRAPH_DESTRUCTIVE)
-
-    print("------------------------")
-    storage = FileStorage(dirpath=f"daily_active_friend_graphs_v4/{DATE}/tweet_min/{TWEET_MIN}")
+ACTIVE_FRIENDS_ONLY = (os.getenv("ACTIVE_FRIENDS_ONLY", default="false") == "true") # whether to exclude friends who weren't active that day
+COMPACT_GRAPHS = (os.getenv("COMPACT_GRAPHS", default="false") == "true") # opt-in to storing graphs as compact arrays ("graph.npz"), instead of networkx ("graph.gpickle")
+
+NODE_ATTRIBUTES = ["user_id", "rate", "bot"]
+
+def active_nodes(statuses_df):
+    """Returns a row per active user (with their screen name and node attributes), from their tweets."""
+    nodes_df = statuses_df[["screen_name"] + NODE_ATTRIBUTES].dropna(subset=["screen_name"]).drop_duplicates(subset=["screen_name"])
+    return nodes_df.sort_values("screen_name").reset_index(drop=True)
+
+def build_graph(nodes_df, friend_batches, active_friends_only=ACTIVE_FRIENDS_ONLY, job=None):
+    """
+    Returns a compact graph of the active users and their friends, where the attributes of each active user are kept as arrays.
+
+    Params:
+        nodes_df (DataFrame) a row per active user (see active_nodes())
+        friend_batches (iterable of pyarrow.RecordBatch) with "screen_name" and "friend_names" columns
+    """
+    edges = FriendGraphBuilder(nodes=nodes_df["screen_name"].values, restrict=active_friends_only)
+    for batch in friend_batches:
+        edges.append_record_batch(batch, "screen_name", "friend_names")
+        if job:
+            job.counter += batch.num_rows
+            job.progress_report()
+
+    graph = edges.to_compact_graph()
+    graph.set_node_attributes(nodes_df["screen_name"].values, **{name: nodes_df[name].values for name in NODE_ATTRIBUTES})
+    return graph
+
+def graph_daily_active_user_friends(date, tweet_min=TWEET_MIN, limit=LIMIT, active_friends_only=ACTIVE_FRIENDS_ONLY, compact=COMPACT_GRAPHS,
+                                        destructive=DESTRUCTIVE, graph_destructive=GRAPH_DESTRUCTIVE):
+    """
+    Downloads the day's tweets, and saves a graph of the users who tweeted that day, and who they follow.
+
+    Param: date (str) like "2020-01-23"
+    """
+    storage = FileStorage(dirpath=f"daily_active_friend_graphs_v4/{date}/tweet_min/{tweet_min}")
     tweets_csv_filepath = os.path.join(storage.local_dirpath, "tweets.csv")
 
     bq_service = BigQueryService()
@@ -46,90 +67,68 @@ if __name__ == "__main__":
     #
     # LOAD TWEETS
     # tweet_id, text, screen_name, bot, created_at
-    if os.path.exists(tweets_csv_filepath) and not DESTRUCTIVE:
+    if os.path.exists(tweets_csv_filepath) and not destructive:
         print("LOADING TWEETS...")
         statuses_df = read_csv(tweets_csv_filepath)
     else:
         job.start()
         print("DOWNLOADING TWEETS...")
-        statuses = []
-        for row in bq_service.fetch_daily_active_tweeter_statuses(date=DATE, tweet_min=TWEET_MIN, limit=LIMIT):
-            statuses.append(dict(row))
-
-            job.counter += 1
-            if job.counter % BATCH_SIZE == 0:
-                job.progress_report()
+        statuses_df = batches_to_df(bq_service.fetch_daily_active_tweeter_statuses(date=date, tweet_min=tweet_min, limit=limit, arrow_batch_size=BATCH_SIZE), job=job)
         job.end()
-
-        statuses_df = DataFrame(statuses)
-        del statuses
         statuses_df.to_csv(tweets_csv_filepath)
     print(fmt_n(len(statuses_df)))
 
     #
     # MAKE GRAPH
 
-    local_graph_filepath = os.path.join(storage.local_dirpath, "graph.gpickle")
-    gcs_graph_filepath = os.path.join(storage.gcs_dirpath, "graph.gpickle")
+    graph_filename = "graph.npz" if compact else "graph.gpickle"
+    local_graph_filepath = os.path.join(storage.local_dirpath, graph_filename)
+    gcs_graph_filepath = os.path.join(storage.gcs_dirpath, graph_filename)
 
-    if os.path.exists(local_graph_filepath) and not GRAPH_DESTRUCTIVE:
-        print("LOADING GRAPH...")
-        graph = read_gpickle(local_graph_filepath)
-        print(type(graph), graph.number_of_nodes(), graph.number_of_edges())
+    if os.path.exists(local_graph_filepath) and not graph_destructive:
+        print("FOUND EXISTING GRAPH. SKIPPING...", local_graph_filepath)
+        return
+
+    nodes_df = active_nodes(statuses_df)
+    del statuses_df
+    print(fmt_n(len(nodes_df)))
+    print(nodes_df.head())
+
+    print("CREATING GRAPH...")
+    job.start()
+    friend_batches = bq_service.fetch_daily_active_user_friends(date=date, tweet_min=tweet_min, limit=limit, arrow_batch_size=ARROW_BATCH_SIZE)
+    graph = build_graph(nodes_df, friend_batches, active_friends_only=active_friends_only, job=job)
+    job.end()
+    print(type(graph), fmt_n(graph.number_of_nodes()), fmt_n(graph.number_of_edges()))
+
+    if compact:
+        graph.save(local_graph_filepath)
     else:
-        nodes_df = statuses_df.copy()
-        nodes_df = nodes_df[["user_id", "screen_name","rate","bot"]]
-        nodes_df.drop_duplicates(inplace=True)
-        print(len(nodes_df))
-        print(nodes_df.head())
+        write_gpickle(graph.to_networkx(), local_graph_filepath)
+    del graph
+    storage.upload_file(local_graph_filepath, gcs_graph_filepath)
 
-        print("CREATING GRAPH...")
-        graph = DiGraph()
 
-        job.start()
-        print("NODES...")
-        # for each unique node in the list, add a node to the graph.
-        for i, row in nodes_df.iterrows():
-            graph.add_node(row["screen_name"], user_id=row["user_id"], rate=row["rate"], bot=row["bot"])
-
-            job.counter += 1
-            if job.counter % GRAPH_BATCH_SIZE == 0:
-                job.progress_report()
-        job.end()
+if __name__ == "__main__":
 
-        job.start()
-        print("EDGES...")
-        for row in bq_service.fetch_daily_active_user_friends(date=DATE, tweet_min=TWEET_MIN, limit=LIMIT):
-            graph.add_edges_from([(row["screen_name"], friend) for friend in row["friend_names"]])
+    print("------------------------")
+    print("GRAPHER...")
+    print("  DATE:", DATE)
+    print("  N_DAYS:", N_DAYS)
+    print("  GRAPH_WORKERS:", GRAPH_WORKERS)
+    print("  TWEET_MIN:", TWEET_MIN)
 
-            job.counter += 1
-            if job.counter % GRAPH_BATCH_SIZE == 0:
-                job.progress_report()
-        job.end()
+    print("  LIMIT:", LIMIT)
+    print("  BATCH_SIZE:", BATCH_SIZE)
+    print("  DESTRUCTIVE:", DESTRUCTIVE)
+
+    #print("  GRAPH_LIMIT:", GRAPH_LIMIT)
+    print("  GRAPH_DESTRUCTIVE:", GRAPH_DESTRUCTIVE)
+    print("  ACTIVE_FRIENDS_ONLY:", ACTIVE_FRIENDS_ONLY)
+    print("  COMPACT_GRAPHS:", COMPACT_GRAPHS)
+    print("------------------------")
+    seek_confirmation()
 
-        print(type(graph), fmt_n(graph.number_of_nodes()), fmt_n(graph.number_of_edges()))
-        write_gpickle(graph, local_graph_filepath)
-        del graph
-        storage.upload_file(local_graph_filepath, gcs_graph_filepath)
-
-    #breakpoint()
-
-    #metadata = {
-    #    "bq_service":bq_service.metadata,
-    #    "date": DATE,
-    #    "tweet_min": TWEET_MIN,
-    #    "job_params":{
-    #        "limit": LIMIT,
-    #        "batch_size": BATCH_SIZE,
-    #        "graph_batch_size": GRAPH_BATCH_SIZE,
-    #    },
-    #    "results":{
-    #        "tweets": len(statuses_df),
-    #        "nodes": graph.number_of_nodes(),
-    #        "edges": graph.number_of_edges(),
-    #    }
-    #}
-    ## save metadata to JSON
-    #local_metadata_filepath =
-    #gcs_metadata_filepath =
-    #storage.upload_file(local_metadata_filepath, gcs_metadata_filepath)
+    failed_dates = perform_daily(graph_daily_active_user_friends, consecutive_dates(DATE, N_DAYS))
+    if failed_dates:
+        print("DAYS FAILED:", sorted(failed_dates.keys()))
@@ -0,0 +1,76 @@
+import os
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+from pandas import DataFrame
+from dotenv import load_dotenv
+
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+from app.workers import worker_pool, GRAPH_WORKERS, WORKER_MEMORY_MB
+
+load_dotenv()
+
+N_DAYS = int(os.getenv("N_DAYS", default="1")) # the number of consecutive days to process, starting on the DATE
+
+def consecutive_dates(start_date, n_days=N_DAYS):
+    """Returns date strings like ["2020-01-23", "2020-01-24"], for the given number of days."""
+    start_date = datetime.strptime(start_date, "%Y-%m-%d")
+    return [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(0, int(n_days))]
+
+def batches_to_df(record_batches, job=None):
+    """
+    Assembles streamed record batches into a single DataFrame, column by column, instead of a dict per row.
+
+    Params:
+        record_batches (iterable of pyarrow.RecordBatch)
+        job (app.job.Job) optionally, for counting the rows and reporting progress
+    """
+    batches = []
+    for batch in record_batches:
+        batches.append(batch)
+        if job:
+            job.counter += batch.num_rows
+            job.progress_report()
+    if not batches:
+        return DataFrame()
+    return pa.Table.from_batches(batches).to_pandas()
+
+def perform_daily(func, dates, max_workers=GRAPH_WORKERS, worker_memory_mb=WORKER_MEMORY_MB, **kwargs):
+    """
+    Calls the given function for each date, in a pool of worker processes (each handling a single date and then exiting, to return its memory).
+
+    Params:
+        func (function) a module-level function, like func(date, **kwargs), so the workers can import it
+        dates (list of str) like ["2020-01-23", "2020-01-24"]
+        max_workers (int) the number of dates to process at once (1 for processing them in this process)
+        worker_memory_mb (int) optionally, the max memory for each worker process (see app/workers.py)
+
+    Returns the error message for each date which failed (or an empty dict), whether or not the dates were processed in parallel.
+    """
+    completed_dates = []
+    failed_dates = {}
+
+    def complete(date):
+        completed_dates.append(date)
+        print(logstamp(), "COMPLETED DAY", date, "|", fmt_n(len(completed_dates)), "OF", fmt_n(len(dates)))
+
+    def fail(date, err):
+        print(logstamp(), "OOPS", date, err)
+        failed_dates[date] = str(err)
+
+    if int(max_workers) == 1 or len(dates) == 1:
+        for date in dates:
+            try:
+                func(date, **kwargs)
+                complete(date)
+            except Exception as err:
+                fail(date, err)
+        return failed_dates
+
+    pool = worker_pool(max_workers=max_workers, worker_memory_mb=worker_memory_mb)
+    for date in dates:
+        pool.apply_async(func, (date,), kwargs, callback=lambda result, date=date: complete(date), error_callback=lambda err, date=date: fail(date, err))
+    pool.close()
+    pool.join()
+    return failed_dates
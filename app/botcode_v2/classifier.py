@@ -13,10 +13,12 @@ from conftest import compile_mock_rt_graph
 from app import APP_ENV
 from app.decorators.number_decorators import fmt_n, fmt_pct
 from app.friend_graphs.graph_analyzer import GraphAnalyzer
+from app.compact_graphs.compact_graph import CompactGraph
 from app.botcode_v2.network_classifier_helper import getLinkDataRestrained as get_link_data_restrained # TODO: deprecate
 from app.botcode_v2.network_classifier_helper import psi as link_energy
 from app.botcode_v2.network_classifier_helper import computeH as compute_energy_graph
 from app.botcode_v2.network_classifier_helper import compute_bot_probabilities
+from app.botcode_v2.network_classifier_helper import compute_link_energies
 
 load_dotenv()
 
@@ -33,6 +35,9 @@ class NetworkClassifier:
         """
         Takes all nodes in a retweet graph and assigns each user a score from 0 (human) to 1 (bot).
         Then writes the results to CSV file.
+
+        Params:
+            rt_graph (networkx.DiGraph or CompactGraph) the link energies of a CompactGraph get computed all at once
         """
         self.rt_graph = rt_graph
         self.weight_attr = weight_attr
@@ -46,6 +51,8 @@ class NetworkClassifier:
         #self.lambda_01 = 1
         #self.lambda_10 = self.lambda_00 + self.lambda_11 - self.lambda_01 + self.epsilon
 
+        self.compact = isinstance(rt_graph, CompactGraph)
+
         # ARTIFACTS OF THE BOT CLASSIFICATION PROCESS...
         self.energy_graph = None
         self.bot_ids = None
@@ -73,8 +80,12 @@ class NetworkClassifier:
     @lru_cache(maxsize=None)
     def alpha(self):
         """Params for the link_energy function"""
-        in_degrees_list = [v for _,v in self.in_degrees]
-        out_degrees_list = [v for _,v in self.out_degrees]
+        if self.compact:
+            in_degrees_list = self.in_degrees.values
+            out_degrees_list = self.out_degrees.values
+        else:
+            in_degrees_list = [v for _,v in self.in_degrees]
+            out_degrees_list = [v for _,v in self.out_degrees]
         print("MAX IN:", fmt_n(max(in_degrees_list))) #> 76,617
         print("MAX OUT:", fmt_n(max(out_degrees_list))) #> 5,608
 
@@ -95,6 +106,9 @@ class NetworkClassifier:
         """
         print("-----------------")
         print("ENERGIES...")
+        if self.compact:
+            return self.compact_link_energies()
+
         return [(
             link[0],
             link[1],
@@ -105,10 +119,20 @@ class NetworkClassifier:
             )
         ) for link in self.links]
 
+    def compact_link_energies(self):
+        """Same as the link energies of the equivalent networkx graph, without building a list of links or looking up degrees one at a time."""
+        sources, targets, weights = self.rt_graph.edge_arrays()
+        energies = compute_link_energies(
+            self.out_degrees.values[sources], self.in_degrees.values[targets], weights.astype(np.float64),
+            self.alpha, self.lambda_00, self.lambda_11, self.epsilon
+        )
+        node_ids = self.rt_graph.node_ids
+        return list(zip(node_ids[sources].tolist(), node_ids[targets].tolist(), energies.tolist()))
+
     @property
     @lru_cache(maxsize=None)
     def prior_probabilities(self):
-        return dict.fromkeys(list(self.rt_graph.nodes), 0.5) # set all screen names to 0.5
+        return dict.fromkeys(list(self.rt_graph.nodes()), 0.5) # set all screen names to 0.5
 
     def compile_energy_graph(self):
         print("COMPILING ENERGY GRAPH...")
@@ -169,7 +193,7 @@ class NetworkClassifier:
 
 if __name__ == "__main__":
 
-    manager = GraphAnalyzer()
+    manager = GraphAnalyzer(compact=True) # the classifier handles CompactGraphs
 
     #
     # LOAD RT GRAPH
@@ -249,3 +249,22 @@ def psi(u1, u2, wlr, in_graph, out_graph, alpha, lambda00, lambda11, epsilon):
     psi_11 = lambda11 * psi_01
 
     return [psi_00, psi_01, psi_10, psi_11]
+
+def compute_link_energies(dout_u1, din_u2, wlr, alpha, lambda00, lambda11, epsilon):
+    """
+    A vectorized version of psi(), which computes the energies of all links at once.
+
+    Params:
+        dout_u1 (numpy array) the out degree of each link's source
+        din_u2 (numpy array) the in degree of each link's target
+        wlr (numpy array) the number of retweets along each link
+
+    Returns an array with one row per link, like [psi_00, psi_01, psi_10, psi_11]
+    """
+    temp = alpha[1] / dout_u1 - 1 + alpha[2] / din_u2 - 1
+    active = temp < 10
+    psi_01 = np.zeros(len(temp))
+    psi_01[active] = wlr[active] * alpha[0] / (1 + np.exp(temp[active]))
+    lambda01 = 1
+    lambda10 = lambda00 + lambda11 - 1 + epsilon
+    return np.column_stack([lambda00 * psi_01, lambda01 * psi_01, lambda10 * psi_01, lambda11 * psi_01])
@@ -0,0 +1,205 @@
+import os
+import io
+import json
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.api_core.exceptions import ServerError, TooManyRequests
+from google.cloud.bigquery import LoadJobConfig, SourceFormat, WriteDisposition
+
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+
+load_dotenv()
+
+# see: https://cloud.google.com/bigquery/quotas#streaming_inserts
+BQ_WRITER_MAX_BATCH_BYTES = int(os.getenv("BQ_WRITER_MAX_BATCH_BYTES", default=str(9 * 1024 * 1024))) # the request limit is 10 MB, so leave some room for the rest of the request
+BQ_WRITER_MAX_BATCH_ROWS = int(os.getenv("BQ_WRITER_MAX_BATCH_ROWS", default="5000")) # the request limit is 10,000 rows (although 500 are recommended)
+BQ_WRITER_WORKERS = int(os.getenv("BQ_WRITER_WORKERS", default="4")) # the max number of insert requests in flight at once
+BQ_WRITER_RETRIES = int(os.getenv("BQ_WRITER_RETRIES", default="5"))
+BQ_WRITER_LOAD_JOB_MIN_ROWS = int(os.getenv("BQ_WRITER_LOAD_JOB_MIN_ROWS", default="500000")) # uploads this large get staged as a file and loaded in a single job
+
+INSERT_ID_PLACEHOLDER = "00000000-0000-0000-0000-000000000000" # the client assigns each row a random insert id (a uuid4) of this length
+
+RETRYABLE_ERRORS = (ServerError, TooManyRequests, ConnectionError, TimeoutError)
+
+# see: https://cloud.google.com/bigquery/docs/loading-data-cloud-storage-parquet#type_conversions
+ARROW_TYPES = {
+    "STRING": pa.string(),
+    "BYTES": pa.binary(),
+    "INTEGER": pa.int64(),
+    "INT64": pa.int64(),
+    "FLOAT": pa.float64(),
+    "FLOAT64": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+    "BOOL": pa.bool_(),
+    "DATE": pa.date32(),
+    "DATETIME": pa.timestamp("us"),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+def to_arrow_table(records, schema=None):
+    """
+    Converts the records to an arrow table, casting each column to the type of its column in the BigQuery table (if known),
+        because otherwise dates and timestamps (which are usually strings) would be loaded as strings.
+
+    Params:
+        records (list of dictionaries)
+        schema (list of google.cloud.bigquery.SchemaField) optionally, the schema of the destination table
+    """
+    arrow_table = pa.Table.from_pylist(records)
+    for field in (schema or []):
+        arrow_type = ARROW_TYPES.get(field.field_type)
+        if arrow_type is None or field.name not in arrow_table.column_names:
+            continue
+        if field.mode == "REPEATED":
+            arrow_type = pa.list_(arrow_type)
+        i = arrow_table.column_names.index(field.name)
+        if arrow_table.schema.field(i).type != arrow_type:
+            arrow_table = arrow_table.set_column(i, field.name, cast_column(arrow_table.column(i), arrow_type))
+    return arrow_table
+
+def cast_column(column, arrow_type):
+    try:
+        return column.cast(arrow_type)
+    except pa.ArrowInvalid:
+        if not (pa.types.is_timestamp(arrow_type) and arrow_type.tz):
+            raise
+        return column.cast(pa.timestamp(arrow_type.unit)).cast(arrow_type) # like BigQuery, treats timestamps without a zone offset as UTC
+
+def serialized_size(record):
+    """
+    The number of bytes a record will occupy in the insert request, as the client sends it:
+        keyed by column name, wrapped in a per-row envelope with its insert id, and separated from the next row.
+
+    Param: record (dict)
+    """
+    payload = {"insertId": INSERT_ID_PLACEHOLDER, "json": record}
+    return len(json.dumps(payload, default=str).encode("utf-8")) + len(", ")
+
+def split_into_sized_batches(records, max_bytes=BQ_WRITER_MAX_BATCH_BYTES, max_rows=BQ_WRITER_MAX_BATCH_ROWS):
+    """
+    Splits a list of records into batches which don't exceed the given serialized size nor row count.
+    Yields tuples of (offset, batch), where offset is the index of the batch's first record.
+    """
+    batch = []
+    batch_bytes = 0
+    offset = 0
+    for i, row in enumerate(records):
+        row_bytes = serialized_size(row)
+        if batch and (batch_bytes + row_bytes > max_bytes or len(batch) >= max_rows):
+            yield offset, batch
+            batch = []
+            batch_bytes = 0
+            offset = i
+        batch.append(row)
+        batch_bytes += row_bytes
+    if batch:
+        yield offset, batch
+
+class BulkWriter:
+    def __init__(self, client, max_batch_bytes=BQ_WRITER_MAX_BATCH_BYTES, max_batch_rows=BQ_WRITER_MAX_BATCH_ROWS,
+                        max_workers=BQ_WRITER_WORKERS, max_retries=BQ_WRITER_RETRIES, load_job_min_rows=BQ_WRITER_LOAD_JOB_MIN_ROWS):
+        """
+        Uploads records to a BigQuery table, either via concurrent streaming inserts or via a load job.
+
+        Params:
+            client (google.cloud.bigquery.Client)
+            max_batch_bytes (int) the max serialized size of each insert request
+            max_batch_rows (int) the max number of rows in each insert request
+            max_workers (int) the max number of insert requests in flight at once
+            max_retries (int) the number of times to retry a failed insert request, with exponential backoff
+            load_job_min_rows (int) uploads of at least this many records use a load job instead of streaming inserts
+        """
+        self.client = client
+        self.max_batch_bytes = int(max_batch_bytes)
+        self.max_batch_rows = int(max_batch_rows)
+        self.max_workers = int(max_workers)
+        self.max_retries = int(max_retries)
+        self.load_job_min_rows = int(load_job_min_rows)
+
+    @property
+    def metadata(self):
+        return {
+            "max_batch_bytes": self.max_batch_bytes,
+            "max_batch_rows": self.max_batch_rows,
+            "max_workers": self.max_workers,
+            "max_retries": self.max_retries,
+            "load_job_min_rows": self.load_job_min_rows
+        }
+
+    def insert_records(self, table, records):
+        """
+        Params:
+            table (table ID string, Table, or TableReference)
+            records (list of dictionaries)
+
+        Returns a list of error rows, each like {"batch": 0, "index": 123, "errors": [...]},
+            where index refers to the position of the failed record in the given list of records.
+        """
+        if len(records) >= self.load_job_min_rows:
+            return self.load_records(table, records)
+        return self.stream_records(table, records)
+
+    #
+    # STREAMING INSERTS
+    #
+
+    def stream_records(self, table, records):
+        batches = list(split_into_sized_batches(records, max_bytes=self.max_batch_bytes, max_rows=self.max_batch_rows))
+        print(logstamp(), "INSERTING", fmt_n(len(records)), "ROWS IN", fmt_n(len(batches)), "BATCHES...")
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.insert_batch, table, batch) for _, batch in batches]
+            for batch_index, ((offset, _), future) in enumerate(zip(batches, futures)):
+                for error_row in future.result():
+                    errors.append({**error_row, **{"batch": batch_index, "index": offset + error_row["index"]}})
+
+        if errors:
+            print(logstamp(), "ENCOUNTERED", fmt_n(len(errors)), "ERROR ROWS")
+        return errors
+
+    def insert_batch(self, table, batch):
+        """Inserts a single batch of records, retrying with exponential backoff if the request fails."""
+        rows = [list(d.values()) for d in batch]
+        for attempt in range(0, self.max_retries + 1):
+            try:
+                return self.client.insert_rows(table, rows)
+            except RETRYABLE_ERRORS as err:
+                if attempt == self.max_retries:
+                    raise
+                delay = (2 ** attempt) + random.random() # with a little jitter, so the workers don't retry in lockstep
+                print(logstamp(), "RETRYING BATCH IN", round(delay, 1), "SECONDS...", type(err).__name__)
+                time.sleep(delay)
+
+    #
+    # LOAD JOBS
+    #
+
+    def load_records(self, table, records):
+        """Stages the records as an in-memory parquet file, and loads them into the table in a single job (avoids streaming quotas)."""
+        print(logstamp(), "STAGING", fmt_n(len(records)), "ROWS AS PARQUET...")
+        stage = io.BytesIO()
+        pq.write_table(to_arrow_table(records, schema=self.table_schema(table)), stage, compression="snappy")
+        stage.seek(0)
+
+        print(logstamp(), "LOADING", fmt_n(len(records)), "ROWS...")
+        job_config = LoadJobConfig(source_format=SourceFormat.PARQUET, write_disposition=WriteDisposition.WRITE_APPEND)
+        job = self.client.load_table_from_file(stage, table, job_config=job_config)
+        try:
+            job.result()
+        except Exception as err:
+            print(logstamp(), "LOAD JOB FAILED", err)
+            return [{"batch": 0, "index": None, "errors": (job.errors or [{"reason": type(err).__name__, "message": str(err)}])}]
+        return [{"batch": 0, "index": None, "errors": [error]} for error in (job.errors or [])]
+
+    def table_schema(self, table):
+        """Returns the table's schema (fetching the table if given its id), or None if unknown."""
+        if isinstance(table, str):
+            table = self.client.get_table(table) # API call
+        return getattr(table, "schema", None)
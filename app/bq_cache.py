@@ -0,0 +1,267 @@
+import os
+import re
+import json
+import time
+import hashlib
+from pprint import pprint
+
+from dotenv import load_dotenv
+
+from app import DATA_DIR
+from app.decorators.number_decorators import fmt_n
+
+load_dotenv()
+
+BQ_CACHE_DIRPATH = os.getenv("BQ_CACHE_DIRPATH", default=os.path.join(DATA_DIR, "bq_cache"))
+BQ_CACHE_TTL_HOURS = float(os.getenv("BQ_CACHE_TTL_HOURS", default="168")) # one week
+BQ_CACHE_MAX_GB = float(os.getenv("BQ_CACHE_MAX_GB", default="10"))
+BQ_CACHE_COMPRESSION = os.getenv("BQ_CACHE_COMPRESSION", default="zstd")
+
+CACHEABLE_KEYWORDS = ["SELECT", "WITH", "("] # the API queries start with a parenthesized UNION
+MUTATING_KEYWORDS = ["CREATE", "DROP", "INSERT", "UPDATE", "DELETE", "MERGE", "TRUNCATE", "ALTER"]
+
+def normalize_sql(sql):
+    """Collapses whitespace, so differently indented versions of the same query share a cache entry."""
+    return " ".join(sql.split()).rstrip(";").strip()
+
+def strip_leading_comments(sql):
+    """Removes any comment lines (like '-- TOPIC: #MAGA') which precede the first statement."""
+    lines = [line for line in sql.strip().splitlines() if line.strip()]
+    while lines and lines[0].strip().startswith("--"):
+        lines.pop(0)
+    return "\n".join(lines).strip()
+
+def is_cacheable(sql):
+    """Only read-only queries get cached. Migrations and other statements always hit BigQuery."""
+    statement = strip_leading_comments(sql).upper()
+    if any([keyword in statement.split() for keyword in MUTATING_KEYWORDS]):
+        return False
+    return any([statement.startswith(keyword) for keyword in CACHEABLE_KEYWORDS])
+
+def is_mutating(sql):
+    statement = strip_leading_comments(sql).upper()
+    return any([keyword in statement.split() for keyword in MUTATING_KEYWORDS])
+
+def serialize_params(job_config=None):
+    """Param: job_config (google.cloud.bigquery.QueryJobConfig or None)"""
+    if job_config is None or not job_config.query_parameters:
+        return []
+    return [param.to_api_repr() for param in job_config.query_parameters]
+
+class QueryCache:
+    def __init__(self, dirpath=BQ_CACHE_DIRPATH, ttl_hours=BQ_CACHE_TTL_HOURS, max_gb=BQ_CACHE_MAX_GB, compression=BQ_CACHE_COMPRESSION):
+        """
+        Stores query results on disk as compressed parquet files, so re-running the same query doesn't re-scan the same tables.
+
+        Each entry is a pair of files named after the cache key: "<key>.parquet" (the results) and "<key>.json" (the metadata).
+        Keeping the metadata per entry (instead of in a shared index file) lets multiple processes use the same cache dir.
+
+        Params:
+            dirpath (str) where to store the cached results
+            ttl_hours (float) entries older than this are considered stale
+            max_gb (float) evicts the least recently used entries when the total size exceeds this
+            compression (str) the parquet compression codec, like "zstd", "snappy", or "gzip"
+        """
+        self.dirpath = dirpath
+        self.ttl_seconds = float(ttl_hours) * 60 * 60
+        self.max_bytes = int(float(max_gb) * 1024 * 1024 * 1024)
+        self.compression = compression
+
+        if not os.path.exists(self.dirpath):
+            os.makedirs(self.dirpath)
+
+    @property
+    def metadata(self):
+        return {"dirpath": self.dirpath, "ttl_seconds": self.ttl_seconds, "max_bytes": self.max_bytes, "compression": self.compression}
+
+    @staticmethod
+    def compile_key(sql, dataset_address, job_config=None):
+        """A hash of the normalized sql, the query parameters, and the dataset address."""
+        key_parts = {"sql": normalize_sql(sql), "params": serialize_params(job_config), "dataset_address": dataset_address}
+        return hashlib.sha256(json.dumps(key_parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def parse_table_names(sql, dataset_address):
+        """Returns the names of the tables referenced by the sql, like ["retweets_v2", "2_bot_communities"]"""
+        pattern = re.escape(dataset_address) + r"\.(\w+)"
+        return sorted(set(re.findall(pattern, sql)))
+
+    def results_filepath(self, key):
+        return os.path.join(self.dirpath, f"{key}.parquet")
+
+    def entry_filepath(self, key):
+        return os.path.join(self.dirpath, f"{key}.json")
+
+    #
+    # ENTRIES
+    #
+
+    def read_entry(self, key):
+        try:
+            with open(self.entry_filepath(key), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write_entry(self, key, entry):
+        tmp_filepath = self.entry_filepath(key) + f".{os.getpid()}.tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_filepath, self.entry_filepath(key)) # atomic
+
+    def delete_entry(self, key):
+        for filepath in [self.entry_filepath(key), self.results_filepath(key)]:
+            if os.path.isfile(filepath):
+                os.remove(filepath)
+
+    @property
+    def entries(self):
+        entries = []
+        for filename in os.listdir(self.dirpath):
+            if filename.endswith(".json"):
+                entry = self.read_entry(filename.replace(".json", ""))
+                if entry:
+                    entries.append(entry)
+        return entries
+
+    def is_stale(self, entry):
+        return (time.time() - entry["created_at"]) > self.ttl_seconds
+
+    #
+    # READING
+    #
+
+    def lookup(self, sql, dataset_address, job_config=None):
+        """Returns the filepath of the cached results, or None if there are no fresh results."""
+        key = self.compile_key(sql, dataset_address, job_config)
+        entry = self.read_entry(key)
+        if not entry or not os.path.isfile(self.results_filepath(key)):
+            return None
+
+        if self.is_stale(entry):
+            print("QUERY CACHE: STALE", key[0:12])
+            self.delete_entry(key)
+            return None
+
+        entry["accessed_at"] = time.time()
+        self.write_entry(key, entry)
+        print("QUERY CACHE: HIT", key[0:12], "|", fmt_n(entry["row_count"]), "ROWS")
+        return self.results_filepath(key)
+
+    # pyarrow gets imported on first use, so services which don't use the cache don't pay for it
+
+    def read_table(self, filepath):
+        import pyarrow.parquet as pq
+        return pq.read_table(filepath)
+
+    def read_batches(self, filepath, batch_size):
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(filepath).iter_batches(batch_size=int(batch_size))
+
+    #
+    # WRITING
+    #
+
+    def write_table(self, sql, dataset_address, table, job_config=None):
+        """Param: table (pyarrow.Table)"""
+        for _ in self.write_batches(sql, dataset_address, table.to_batches(), job_config=job_config, schema=table.schema):
+            pass
+
+    def write_batches(self, sql, dataset_address, record_batches, job_config=None, schema=None):
+        """
+        Passes through each record batch while writing it to the cache.
+        The entry only gets saved if the batches are fully consumed (so a partially-iterated result never gets cached).
+
+        Params:
+            record_batches (iterable of pyarrow.RecordBatch)
+            schema (pyarrow.Schema) optional, if known in advance (allows empty results to be cached)
+        """
+        import pyarrow.parquet as pq
+        key = self.compile_key(sql, dataset_address, job_config)
+        tmp_filepath = self.results_filepath(key) + f".{os.getpid()}.tmp"
+        writer = None
+        row_count = 0
+        complete = False
+        try:
+            if schema is not None:
+                writer = pq.ParquetWriter(tmp_filepath, schema, compression=self.compression)
+            for record_batch in record_batches:
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_filepath, record_batch.schema, compression=self.compression)
+                writer.write_batch(record_batch)
+                row_count += record_batch.num_rows
+                yield record_batch
+            complete = True
+        finally:
+            if writer is not None:
+                writer.close()
+            if complete and writer is not None:
+                os.replace(tmp_filepath, self.results_filepath(key)) # atomic
+                now = time.time()
+                self.write_entry(key, {
+                    "key": key,
+                    "dataset_address": dataset_address,
+                    "sql": normalize_sql(sql),
+                    "table_names": self.parse_table_names(sql, dataset_address),
+                    "row_count": row_count,
+                    "size": os.path.getsize(self.results_filepath(key)),
+                    "created_at": now,
+                    "accessed_at": now,
+                })
+                print("QUERY CACHE: STORED", key[0:12], "|", fmt_n(row_count), "ROWS")
+                self.evict()
+            elif os.path.isfile(tmp_filepath):
+                os.remove(tmp_filepath)
+
+    #
+    # EVICTION AND INVALIDATION
+    #
+
+    @property
+    def total_size(self):
+        return sum([entry["size"] for entry in self.entries])
+
+    def evict(self):
+        """Removes stale entries, then removes the least recently used entries until the cache fits within the max size."""
+        entries = self.entries
+        for entry in [e for e in entries if self.is_stale(e)]:
+            self.delete_entry(entry["key"])
+        entries = sorted([e for e in entries if not self.is_stale(e)], key=lambda e: e["accessed_at"])
+
+        total_size = sum([entry["size"] for entry in entries])
+        while entries and total_size > self.max_bytes:
+            lru_entry = entries.pop(0)
+            print("QUERY CACHE: EVICTING", lru_entry["key"][0:12])
+            self.delete_entry(lru_entry["key"])
+            total_size -= lru_entry["size"]
+
+    def invalidate(self, table_name):
+        """
+        Removes all entries whose queries reference the given table.
+        Param: table_name (str) like "retweets_v2"
+        """
+        invalidated = [entry for entry in self.entries if table_name in entry["table_names"]]
+        for entry in invalidated:
+            self.delete_entry(entry["key"])
+        if invalidated:
+            print("QUERY CACHE: INVALIDATED", len(invalidated), "ENTRIES FOR TABLE", table_name.upper())
+        return len(invalidated)
+
+    def clear(self):
+        for entry in self.entries:
+            self.delete_entry(entry["key"])
+
+
+if __name__ == "__main__":
+
+    cache = QueryCache()
+
+    print("-------------------------")
+    print("QUERY CACHE...")
+    pprint(cache.metadata)
+    print("  ENTRIES:", fmt_n(len(cache.entries)))
+    print("  TOTAL SIZE:", fmt_n(cache.total_size))
+
+    table_name = os.getenv("INVALIDATE_TABLE")
+    if table_name:
+        cache.invalidate(table_name)
@@ -0,0 +1,304 @@
+import os
+import re
+import time
+import threading
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+import duckdb
+from google.api_core.exceptions import NotFound
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app import DATA_DIR
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+from app.bq_service import BigQueryService, rows_from_record_batches, ARROW_BATCH_SIZE
+
+load_dotenv()
+
+SNAPSHOT_DIRPATH = os.getenv("SNAPSHOT_DIRPATH", default=os.path.join(DATA_DIR, "bq_snapshot"))
+SNAPSHOT_TABLES = os.getenv("SNAPSHOT_TABLES", default="retweets_v2,daily_bot_probabilities") # the tables to export, for use with the local service
+
+# BigQuery syntax -> DuckDB syntax
+# ... only covers the functions and types actually used by the queries in app/bq_service.py
+TRANSLATIONS = [
+    (r"`?[\w-]+\.\w+\.(\w+)`?", r'"\1"'), # fully-qualified table names like `project.dataset.table`, become just "table"
+    (r"`", '"'),
+    (r"\bFLOAT64\b", "DOUBLE"),
+    (r"\bARRAY<(\w+)>", r"\1[]"),
+    (r"\bREGEXP_CONTAINS\(", "regexp_matches("),
+    (r"\bEXTRACT\(\s*DATE\s+FROM\s+([\w\.]+)\s*\)", r"CAST(\1 AS DATE)"),
+    (r"\bARRAY_LENGTH\(", "len("),
+    (r"\s+IGNORE NULLS", ""),
+    (r"\brand\(\)", "random()"),
+    (r"\bUNNEST\((\w+)\)\s+AS\s+(\w+)", r"UNNEST(\1) AS _\2(\2)"),
+    (r",(\s*)\)", r"\1)"), # trailing commas in column definitions
+    (r"\s+PARTITION BY DATE\(\w+\)", ""), # there are no partitioned or clustered tables locally
+    (r"\s+CLUSTER BY \w+(\s*,\s*\w+)*", ""),
+    (r"('[^']*')|@(\w+)", lambda match: match.group(1) or f"${match.group(2)}"), # query parameters (but not string literals, like topics about "@user")
+]
+
+def translate_sql(sql):
+    for pattern, replacement in TRANSLATIONS:
+        sql = re.sub(pattern, replacement, sql, flags=re.IGNORECASE)
+    return sql
+
+def query_params(job_config=None):
+    """Converts the ScalarQueryParameters of a job config into a dict of named params."""
+    if job_config is None or not job_config.query_parameters:
+        return None
+    return {param.name: param.value for param in job_config.query_parameters}
+
+class LocalTable:
+    def __init__(self, table_id, created=None):
+        """A stand-in for google.cloud.bigquery.Table"""
+        self.table_id = table_id
+        self.created = created or datetime.now(tz=timezone.utc)
+
+    def __repr__(self):
+        return f"<LocalTable '{self.table_id}'>"
+
+class LocalRowIterator:
+    def __init__(self, table, page_size=None):
+        """
+        A stand-in for google.cloud.bigquery.table.RowIterator
+
+        Params:
+            table (pyarrow.Table) the query results
+            page_size (int) the max number of rows per record batch
+        """
+        self.table = table
+        self.page_size = page_size or ARROW_BATCH_SIZE
+
+    @property
+    def total_rows(self):
+        return self.table.num_rows
+
+    def __iter__(self):
+        return rows_from_record_batches(self.to_arrow_iterable())
+
+    def to_arrow(self):
+        return self.table
+
+    def to_arrow_iterable(self):
+        yield from self.table.to_batches(max_chunksize=int(self.page_size))
+
+    def to_dataframe(self):
+        return self.table.to_pandas()
+
+class LocalQueryJob:
+    def __init__(self, table, job_id=None):
+        """A stand-in for google.cloud.bigquery.job.QueryJob (which is already complete)"""
+        self.table = table
+        self.job_id = job_id or f"local_{time.time_ns()}"
+        self.state = "DONE"
+        self.location = "local"
+        self.errors = None
+
+    def result(self, page_size=None):
+        return LocalRowIterator(self.table, page_size=page_size)
+
+    def __iter__(self):
+        return iter(self.result())
+
+class LocalClient:
+    def __init__(self, snapshot_dirpath=SNAPSHOT_DIRPATH, database_filepath=None):
+        """
+        A stand-in for google.cloud.bigquery.Client, backed by an embedded DuckDB database over parquet files.
+
+        Each table in the snapshot dir is a parquet file like "retweets_v2.parquet" (or a directory of parquet files like "retweets_v2/").
+        Those are read-only, so any tables created or inserted into get stored in the database file (by default, "local.duckdb" in the snapshot dir).
+
+        Params:
+            snapshot_dirpath (str) the directory of exported tables
+            database_filepath (str) where to persist tables created locally (pass ":memory:" to keep them in memory)
+        """
+        self.snapshot_dirpath = snapshot_dirpath
+        if not os.path.exists(self.snapshot_dirpath):
+            os.makedirs(self.snapshot_dirpath)
+
+        self.database_filepath = database_filepath or os.path.join(self.snapshot_dirpath, "local.duckdb")
+        self.connection = duckdb.connect(self.database_filepath)
+        self.lock = threading.RLock() # the connection isn't thread-safe (see the BulkWriter's insert threads in app/bq_bulk_writer.py)
+        self.register_snapshot_tables()
+
+    def register_snapshot_tables(self):
+        """Creates a view for each parquet table in the snapshot dir, unless a local table of the same name exists."""
+        local_tables = self.table_names(table_type="BASE TABLE")
+        for entry in sorted(os.listdir(self.snapshot_dirpath)):
+            entry_path = os.path.join(self.snapshot_dirpath, entry)
+            if entry.endswith(".parquet"):
+                table_name, parquet_path = entry.replace(".parquet", ""), entry_path
+            elif os.path.isdir(entry_path) and any([f.endswith(".parquet") for f in os.listdir(entry_path)]):
+                table_name, parquet_path = entry, os.path.join(entry_path, "*.parquet")
+            else:
+                continue
+
+            if table_name not in local_tables:
+                self.connection.execute(f"""CREATE OR REPLACE VIEW "{table_name}" AS SELECT * FROM read_parquet('{parquet_path}')""")
+
+    def table_names(self, table_type=None):
+        sql = "SELECT table_name FROM information_schema.tables"
+        if table_type:
+            sql += f" WHERE table_type = '{table_type}'"
+        with self.lock:
+            return [row[0] for row in self.connection.execute(sql).fetchall()]
+
+    @staticmethod
+    def parse_table_id(table):
+        """Param: table (table ID string like "project.dataset.table", or LocalTable)"""
+        return getattr(table, "table_id", str(table).split(".")[-1])
+
+    #
+    # QUERIES
+    #
+
+    def query(self, sql, job_config=None):
+        if getattr(job_config, "dry_run", False): # there's nothing to bill locally
+            return LocalQueryJob(pa.table({}))
+
+        with self.lock:
+            return self.execute(translate_sql(sql), params=query_params(job_config))
+
+    def execute(self, sql, params=None):
+        # snapshot tables are views, so dropping them requires a different statement
+        views = self.table_names(table_type="VIEW")
+        for if_exists, table_name in re.findall(r'DROP TABLE (IF EXISTS )?"(\w+)"', sql, flags=re.IGNORECASE):
+            if table_name in views:
+                sql = re.sub(f'DROP TABLE {if_exists}"{table_name}"', f'DROP VIEW {if_exists}"{table_name}"', sql, flags=re.IGNORECASE)
+        # ... and replacing them requires a table in their place
+        for table_name in re.findall(r'CREATE OR REPLACE TABLE "(\w+)"', sql, flags=re.IGNORECASE):
+            if table_name in views:
+                self.materialize(table_name)
+
+        result = self.connection.execute(sql, params)
+        try:
+            table = result.to_arrow_table() if hasattr(result, "to_arrow_table") else result.fetch_arrow_table() # renamed in newer versions
+        except duckdb.InvalidInputException: # statements like CREATE TABLE don't return any results
+            table = pa.table({})
+        return LocalQueryJob(table)
+
+    #
+    # TABLES
+    #
+
+    def get_table(self, table):
+        table_id = self.parse_table_id(table)
+        if table_id not in self.table_names():
+            raise NotFound(f"TABLE NOT FOUND: '{table_id}'")
+        return LocalTable(table_id)
+
+    def list_tables(self, dataset=None):
+        return [LocalTable(table_name) for table_name in self.table_names()]
+
+    def delete_table(self, table):
+        table_id = self.parse_table_id(table)
+        with self.lock:
+            if table_id in self.table_names(table_type="VIEW"):
+                self.connection.execute(f'DROP VIEW IF EXISTS "{table_id}"')
+            else:
+                self.connection.execute(f'DROP TABLE IF EXISTS "{table_id}"')
+
+    def materialize(self, table_id):
+        """Copies a read-only snapshot view into a local table, so it can be inserted into."""
+        if table_id in self.table_names(table_type="VIEW"):
+            print(logstamp(), "MATERIALIZING SNAPSHOT TABLE...", table_id)
+            self.connection.execute(f'CREATE TABLE "_{table_id}" AS SELECT * FROM "{table_id}"')
+            self.connection.execute(f'DROP VIEW "{table_id}"')
+            self.connection.execute(f'ALTER TABLE "_{table_id}" RENAME TO "{table_id}"')
+
+    def column_names(self, table_id):
+        sql = f"SELECT column_name FROM information_schema.columns WHERE table_name = '{table_id}' ORDER BY ordinal_position"
+        with self.lock:
+            return [row[0] for row in self.connection.execute(sql).fetchall()]
+
+    def insert_arrow_table(self, table_id, arrow_table):
+        with self.lock:
+            self.materialize(table_id)
+            self.connection.register("staged_rows", arrow_table)
+            column_names = ", ".join([f'"{column_name}"' for column_name in arrow_table.column_names])
+            self.connection.execute(f'INSERT INTO "{table_id}" ({column_names}) SELECT {column_names} FROM staged_rows')
+            self.connection.unregister("staged_rows")
+
+    def insert_rows(self, table, rows):
+        """
+        Params:
+            table (table ID string, or LocalTable)
+            rows (list of lists in column order, or list of dicts)
+
+        Returns a list of errors (always empty, because failures raise instead).
+        """
+        if not rows:
+            return []
+        table_id = self.parse_table_id(table)
+        column_names = self.column_names(table_id)
+        if isinstance(rows[0], dict):
+            arrow_table = pa.Table.from_pylist(rows)
+        else:
+            arrow_table = pa.table({column_name: list(values) for column_name, values in zip(column_names, zip(*rows))})
+        self.insert_arrow_table(table_id, arrow_table)
+        return []
+
+    def load_table_from_file(self, file_obj, table, job_config=None):
+        """Loads a parquet file (see BulkWriter.load_records)"""
+        arrow_table = pq.read_table(file_obj)
+        self.insert_arrow_table(self.parse_table_id(table), arrow_table)
+        return LocalQueryJob(pa.table({}))
+
+class LocalBigQueryService(BigQueryService):
+    def __init__(self, snapshot_dirpath=SNAPSHOT_DIRPATH, database_filepath=None, **kwargs):
+        """
+        Has the same methods as the BigQueryService, but runs all queries against a local snapshot of exported tables.
+
+        Params:
+            snapshot_dirpath (str) the directory of exported parquet tables (see export_snapshot)
+            database_filepath (str) where to persist tables created locally
+        """
+        self.snapshot_dirpath = snapshot_dirpath
+        client = LocalClient(snapshot_dirpath=snapshot_dirpath, database_filepath=database_filepath)
+        super().__init__(client=client, **kwargs)
+        print("  SNAPSHOT DIRPATH:", os.path.abspath(self.snapshot_dirpath))
+
+    @property
+    def metadata(self):
+        return {**super().metadata, **{"snapshot_dirpath": self.snapshot_dirpath}}
+
+def export_snapshot(bq_service, table_names, snapshot_dirpath=SNAPSHOT_DIRPATH):
+    """
+    Downloads entire BigQuery tables as parquet files, for use with the LocalBigQueryService.
+
+    Params:
+        bq_service (BigQueryService)
+        table_names (list of str) like ["retweets_v2", "daily_bot_probabilities"]
+    """
+    if not os.path.exists(snapshot_dirpath):
+        os.makedirs(snapshot_dirpath)
+
+    for table_name in table_names:
+        print(logstamp(), "EXPORTING TABLE...", table_name)
+        table = bq_service.client.get_table(f"{bq_service.dataset_address}.{table_name}") # API call
+        parquet_filepath = os.path.join(snapshot_dirpath, f"{table_name}.parquet")
+        writer = None
+        row_count = 0
+        for record_batch in bq_service.client.list_rows(table, page_size=ARROW_BATCH_SIZE).to_arrow_iterable():
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_filepath, record_batch.schema, compression="zstd")
+            writer.write_batch(record_batch)
+            row_count += record_batch.num_rows
+        if writer is not None:
+            writer.close()
+        print(logstamp(), "EXPORTED", fmt_n(row_count), "ROWS TO", os.path.abspath(parquet_filepath))
+
+
+if __name__ == "__main__":
+
+    bq_service = BigQueryService()
+
+    table_names = [table_name.strip() for table_name in SNAPSHOT_TABLES.split(",")]
+    export_snapshot(bq_service, table_names)
+
+    local_service = LocalBigQueryService()
+    for table_name in table_names:
+        results = local_service.execute_query(f"SELECT count(*) as row_count FROM `{local_service.dataset_address}.{table_name}`")
+        print(table_name.upper(), fmt_n(list(results)[0].row_count), "ROWS")
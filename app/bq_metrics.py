@@ -0,0 +1,173 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from collections import defaultdict
+from pprint import pprint
+
+from dotenv import load_dotenv
+
+from app import DATA_DIR
+from app.decorators.number_decorators import fmt_n
+
+load_dotenv()
+
+BQ_METRICS = (os.getenv("BQ_METRICS", default="false") == "true") # opt-in to recording per-query metrics
+BQ_METRICS_FILEPATH = os.getenv("BQ_METRICS_FILEPATH", default=os.path.join(DATA_DIR, "bq_metrics.jsonl"))
+BQ_DRY_RUN = (os.getenv("BQ_DRY_RUN", default="false") == "true") # estimate bytes processed by each query, without running any of them
+
+INTERNAL_METHODS = ["execute_query", "execute_query_in_batches", "estimate_query", "instrument", "resolve_method_name"]
+
+def sql_fingerprint(sql):
+    """
+    A short hash of the sql with whitespace collapsed and literal values replaced,
+        so the same query with different topics / dates / ids shares a fingerprint.
+    """
+    statement = " ".join(sql.split()).rstrip(";").strip()
+    statement = re.sub(r"'(?:[^'\\]|\\.)*'", "?", statement) # string literals
+    statement = re.sub(r"\b\d+(\.\d+)?\b", "?", statement) # numeric literals
+    statement = re.sub(r"\btemp_\w+", "temp_?", statement) # temp table names
+    return hashlib.sha256(statement.encode("utf-8")).hexdigest()[0:12]
+
+def resolve_method_name(service):
+    """
+    Walks up the call stack to find the BigQueryService method which issued the query, like "fetch_bot_ids".
+    Falls back to the name of the internal method, for queries executed directly by a script.
+    """
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        method_name = frame.f_code.co_name
+        if frame.f_locals.get("self") is service:
+            if method_name in INTERNAL_METHODS:
+                fallback = fallback or method_name
+            else:
+                return method_name
+        frame = frame.f_back
+    return fallback
+
+def seconds_between(start, end):
+    if start is None or end is None:
+        return None
+    return round((end - start).total_seconds(), 3)
+
+def job_stats(job):
+    """
+    Extracts the statistics of a completed query job.
+    Uses getattr because the local stand-in (see app/bq_local_service.py) doesn't provide them all.
+
+    Param: job (google.cloud.bigquery.job.QueryJob)
+    """
+    return {
+        "job_id": getattr(job, "job_id", None),
+        "bytes_processed": getattr(job, "total_bytes_processed", None),
+        "bytes_billed": getattr(job, "total_bytes_billed", None),
+        "slot_millis": getattr(job, "slot_millis", None),
+        "cache_hit": getattr(job, "cache_hit", None),
+        "queue_seconds": seconds_between(getattr(job, "created", None), getattr(job, "started", None)),
+        "execution_seconds": seconds_between(getattr(job, "started", None), getattr(job, "ended", None)),
+    }
+
+class InstrumentedResults:
+    def __init__(self, results, on_complete):
+        """
+        Passes through query results (rows or record batches), while timing how long the client spends fetching them.
+        Calls on_complete(row_count, iteration_seconds, complete) once the caller is done iterating.
+
+        Proxies any other attributes (like job_id) to the underlying results.
+
+        Params:
+            results (iterable of Row or pyarrow.RecordBatch)
+            on_complete (function)
+        """
+        self.results = results
+        self.on_complete = on_complete
+
+    def __iter__(self):
+        iterator = iter(self.results)
+        row_count = 0
+        iteration_seconds = 0.0
+        complete = False
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    iteration_seconds += time.perf_counter() - start
+                    complete = True
+                    break
+                iteration_seconds += time.perf_counter() - start # excludes the time the caller spends processing each item
+                row_count += getattr(item, "num_rows", 1)
+                yield item
+        finally: # also runs if the caller stops iterating early
+            self.on_complete(row_count, round(iteration_seconds, 3), complete)
+
+    def __getattr__(self, attr):
+        return getattr(self.results, attr)
+
+class MetricsSink:
+    def __init__(self, filepath=BQ_METRICS_FILEPATH):
+        """
+        Appends one JSON record per query to a JSONL file.
+        Each line is written in a single call, so multiple processes can share the same file.
+
+        Param: filepath (str)
+        """
+        self.filepath = filepath
+        self.lock = threading.Lock()
+
+        dirpath = os.path.dirname(self.filepath)
+        if dirpath and not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+
+    def write(self, record):
+        line = json.dumps({**{"recorded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, **record}, default=str) + "\n"
+        with self.lock:
+            with open(self.filepath, "a") as f:
+                f.write(line)
+
+    def read(self):
+        if not os.path.isfile(self.filepath):
+            return []
+        with open(self.filepath, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def summarize(self, records=None, dry_run=False):
+        """
+        Aggregates the records by method, sorted by the most bytes processed.
+
+        Params:
+            records (list of dict) optional, defaults to all records in the file
+            dry_run (bool) whether to summarize the estimates instead of the actual queries
+        """
+        records = [r for r in (records if records is not None else self.read()) if r.get("dry_run", False) == dry_run]
+        summaries = defaultdict(lambda: {"queries": 0, "bytes_processed": 0, "bytes_billed": 0, "slot_millis": 0, "execution_seconds": 0.0, "iteration_seconds": 0.0, "rows": 0, "errors": 0})
+        for record in records:
+            summary = summaries[record["method"]]
+            summary["queries"] += 1
+            for metric in ["bytes_processed", "bytes_billed", "slot_millis", "execution_seconds", "iteration_seconds", "rows"]:
+                summary[metric] += (record.get(metric) or 0)
+            summary["errors"] += 1 if record.get("error") else 0
+        return sorted([{**{"method": method}, **summary} for method, summary in summaries.items()], key=lambda s: s["bytes_processed"], reverse=True)
+
+
+if __name__ == "__main__":
+
+    sink = MetricsSink()
+    dry_run = BQ_DRY_RUN
+
+    print("-------------------------")
+    print("QUERY METRICS...")
+    print("  FILEPATH:", os.path.abspath(sink.filepath))
+    print("  RECORDS:", fmt_n(len(sink.read())))
+    print("  DRY RUN:", dry_run)
+
+    summaries = sink.summarize(dry_run=dry_run)
+    for summary in summaries:
+        pprint(summary)
+    print("TOTAL BYTES PROCESSED:", fmt_n(sum([s["bytes_processed"] for s in summaries])))
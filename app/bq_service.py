@@ -1,13 +1,16 @@
 from datetime import datetime, timedelta, timezone
 import os
+import time
+import threading
+from uuid import uuid4
 from functools import lru_cache
 from pprint import pprint
 
 from dotenv import load_dotenv
-from google.cloud import bigquery
-from google.cloud.bigquery import QueryJobConfig, ScalarQueryParameter
 
-from app import APP_ENV, seek_confirmation
+from app import APP_ENV, seek_confirmation, lazy_import
+from app.bq_cache import QueryCache, is_cacheable, is_mutating
+from app.bq_metrics import MetricsSink, InstrumentedResults, BQ_METRICS, BQ_DRY_RUN, sql_fingerprint, resolve_method_name, job_stats
 from app.decorators.number_decorators import fmt_n
 
 load_dotenv()
@@ -17,8 +20,26 @@ PROJECT_NAME = os.getenv("BIGQUERY_PROJECT_NAME", default="tweet-collector-py")
 DATASET_NAME = os.getenv("BIGQUERY_DATASET_NAME", default="impeachment_development") #> "_test" or "_production"
 DESTRUCTIVE_MIGRATIONS = (os.getenv("DESTRUCTIVE_MIGRATIONS", default="false") == "true")
 VERBOSE_QUERIES = (os.getenv("VERBOSE_QUERIES", default="false") == "true")
+ARROW_BATCH_SIZE = int(os.getenv("ARROW_BATCH_SIZE", default="100000")) # the max number of rows per columnar record batch
+BQ_CACHE = (os.getenv("BQ_CACHE", default="false") == "true") # opt-in to caching query results on disk (see app/bq_cache.py)
 
 CLEANUP_MODE = (os.getenv("CLEANUP_MODE", default="true") == "true")
+BQ_CONNECTION_CHECK = (os.getenv("BQ_CONNECTION_CHECK", default="false") == "true") # opt-in to authenticating and issuing a trivial query on construction
+
+# the google.cloud imports take most of a second, so they're deferred until the first query
+bigquery = lazy_import("google.cloud.bigquery")
+google_exceptions = lazy_import("google.api_core.exceptions")
+
+CLIENT_LOCK = threading.Lock()
+
+@lru_cache(maxsize=None)
+def construct_client():
+    return bigquery.Client()
+
+def shared_client():
+    """The bigquery client, constructed on first use and shared by all services in this process (and their threads)."""
+    with CLIENT_LOCK: # so concurrent first queries don't each construct a client (or each trigger the deferred imports)
+        return construct_client()
 
 DEFAULT_START = "2019-12-02 01:00:00" # @deprectated, the "beginning of time" for the impeachment dataset. todo: allow customization via env var
 DEFAULT_END = "2020-03-24 20:00:00" # @deprectated, the "end of time" for the impeachment dataset. todo: allow customization via env var
@@ -27,6 +48,19 @@ def generate_timestamp():
     """Formats datetime for storing in BigQuery"""
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+def sql_date_filter(date, column="created_at"):
+    """
+    Filters a timestamp column to the given date, by comparing the column itself to constant bounds (instead of extracting the date from it),
+        so BigQuery can prune the partitions of tables partitioned by DATE(created_at).
+
+    Params:
+        date (str or date) like "2020-01-01"
+        column (str) like "created_at" or "t.created_at"
+    """
+    start_date = datetime.strptime(str(date)[0:10], "%Y-%m-%d")
+    end_date = start_date + timedelta(days=1)
+    return f"({column} >= '{start_date.strftime('%Y-%m-%d')}' AND {column} < '{end_date.strftime('%Y-%m-%d')}')"
+
 def generate_temp_table_id():
     return datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
 
@@ -35,10 +69,37 @@ def split_into_batches(my_list, batch_size=9000):
     for i in range(0, len(my_list), batch_size):
         yield my_list[i : i + batch_size]
 
+def stream_arrow_batches(job, batch_size=ARROW_BATCH_SIZE):
+    """
+    Streams the results of a query job as columnar pyarrow.RecordBatch objects, one per page of results,
+        instead of as one google.cloud.bigquery Row object per row.
+
+    Consume each batch as numpy / pandas columns, like batch.column("user_id").to_numpy() or batch.to_pandas().
+
+    Params:
+        job (google.cloud.bigquery.job.QueryJob)
+        batch_size (int) the max number of rows per record batch (i.e. the page size of each results request)
+    """
+    rows = job.result(page_size=int(batch_size))
+    for record_batch in rows.to_arrow_iterable():
+        yield record_batch
+
+def rows_from_record_batches(record_batches):
+    """
+    Converts columnar record batches back into google.cloud.bigquery Row objects, for callers which iterate row by row.
+
+    Param: record_batches (iterable of pyarrow.RecordBatch)
+    """
+    for record_batch in record_batches:
+        field_to_index = {field_name: i for i, field_name in enumerate(record_batch.schema.names)}
+        for values in zip(*[column.to_pylist() for column in record_batch.columns]):
+            yield bigquery.table.Row(values, field_to_index)
+
 class BigQueryService():
 
     def __init__(self, project_name=PROJECT_NAME, dataset_name=DATASET_NAME,
-                        verbose=VERBOSE_QUERIES, destructive=DESTRUCTIVE_MIGRATIONS, cautious=True):
+                        verbose=VERBOSE_QUERIES, destructive=DESTRUCTIVE_MIGRATIONS, cautious=True, cache=None, client=None,
+                        metrics=None, dry_run=BQ_DRY_RUN, connection_check=BQ_CONNECTION_CHECK):
         self.project_name = project_name
         self.dataset_name = dataset_name
         self.dataset_address = f"{self.project_name}.{self.dataset_name}"
@@ -47,35 +108,110 @@ class BigQueryService():
         self.destructive = (destructive == True)
         self.cautious = (cautious == True)
 
-        self.client = bigquery.Client()
+        self.given_client = client # allows a local stand-in (see app/bq_local_service.py)
+
+        if cache is None and BQ_CACHE:
+            cache = QueryCache()
+        self.cache = cache
+
+        self.dry_run = (dry_run == True)
+        if metrics is None and (BQ_METRICS or self.dry_run):
+            metrics = MetricsSink()
+        self.metrics = metrics
+        self.dry_run_bytes = 0
 
         print("-------------------------")
         print("BIGQUERY SERVICE...")
         print("  DATASET ADDRESS:", self.dataset_address.upper())
         print("  DESTRUCTIVE MIGRATIONS:", self.destructive)
         print("  VERBOSE QUERIES:", self.verbose)
+        print("  QUERY CACHE:", bool(self.cache))
+        print("  QUERY METRICS:", bool(self.metrics))
+        print("  DRY RUN:", self.dry_run)
 
         if self.cautious:
             seek_confirmation()
 
+        if connection_check:
+            self.check_connection()
+
+    @property
+    def client(self):
+        return self.given_client or shared_client()
+
+    @property
+    @lru_cache(maxsize=None)
+    def bulk_writer(self):
+        from app.bq_bulk_writer import BulkWriter
+        return BulkWriter(self.client)
+
+    def check_connection(self):
+        """Authenticates and issues a trivial query, so any credential or network issues surface now instead of at the first real query."""
+        start = time.perf_counter()
+        list(self.client.query("SELECT 1 as connected").result())
+        print("  CONNECTION CHECK:", round(time.perf_counter() - start, 3), "SECONDS")
+
     @property
     def metadata(self):
-        return {"dataset_address": self.dataset_address, "destructive": self.destructive, "verbose": self.verbose}
+        return {"dataset_address": self.dataset_address, "destructive": self.destructive, "verbose": self.verbose, "cache": bool(self.cache), "metrics": bool(self.metrics), "dry_run": self.dry_run}
 
-    def execute_query(self, sql):
-        """Param: sql (str)"""
+    def execute_query(self, sql, job_config=None):
+        """
+        Params:
+            sql (str)
+            job_config (QueryJobConfig) optional, for parameterized queries
+        """
         if self.verbose:
             print(sql)
-        job = self.client.query(sql)
-        return job.result()
 
-    def execute_query_in_batches(self, sql, temp_table_name=None):
-        """Param: sql (str)"""
+        if self.dry_run:
+            return self.estimate_query(sql, job_config=job_config)
+
+        method_name = resolve_method_name(self) if self.metrics else None
+
+        if self.cache and is_cacheable(sql):
+            cached_filepath = self.cache.lookup(sql, self.dataset_address, job_config=job_config)
+            start = time.perf_counter()
+            if cached_filepath:
+                table = self.cache.read_table(cached_filepath)
+                stats = {"local_cache_hit": True}
+            else:
+                job = self.client.query(sql, job_config=job_config)
+                table = job.result().to_arrow()
+                stats = {**job_stats(job), **{"local_cache_hit": False}}
+                self.cache.write_table(sql, self.dataset_address, table, job_config=job_config)
+            rows = list(rows_from_record_batches(table.to_batches()))
+            self.record_query(sql, method_name, rows=len(rows), iteration_seconds=round(time.perf_counter() - start, 3), **stats)
+            return rows
+
+        if self.cache and is_mutating(sql):
+            self.invalidate_cached_results(sql=sql)
+
+        start = time.perf_counter()
+        job = self.client.query(sql, job_config=job_config)
+        results = job.result()
+        wait_seconds = round(time.perf_counter() - start, 3)
+        if is_mutating(sql): # the results of migrations are rarely consumed, so don't wait for that to happen
+            self.record_query(sql, method_name, wait_seconds=wait_seconds, **job_stats(job))
+            return results
+        return self.instrument(sql, method_name, results, job=job, wait_seconds=wait_seconds)
+
+    def execute_query_in_batches(self, sql, temp_table_name=None, arrow_batch_size=None):
+        """
+        Params:
+            sql (str)
+            arrow_batch_size (int) optionally stream the results as columnar record batches of this many rows, instead of row by row
+        """
         if self.verbose:
             print(sql)
 
+        if self.dry_run:
+            return self.estimate_query(sql)
+
+        method_name = resolve_method_name(self) if self.metrics else None
+
         if not temp_table_name:
-            temp_table_id = generate_temp_table_id()
+            temp_table_id = f"{generate_temp_table_id()}_{uuid4().hex[0:8]}" # queries run in the same second, like by parallel workers, need different tables
             temp_table_name = f"{self.dataset_address}.temp_{temp_table_id}"
 
         job_config = bigquery.QueryJobConfig(
@@ -83,25 +219,170 @@ class BigQueryService():
             allow_large_results=True,
             destination=temp_table_name
         )
+
+        if self.cache and is_cacheable(sql):
+            # the cache key ignores the temp table name, which is different every time
+            cached_filepath = self.cache.lookup(sql, self.dataset_address)
+            if cached_filepath:
+                job = None
+                record_batches = self.cache.read_batches(cached_filepath, batch_size=(arrow_batch_size or ARROW_BATCH_SIZE))
+            else:
+                job = self.client.query(sql, job_config=job_config)
+                print("BATCH QUERY JOB:", type(job), job.job_id, job.state, job.location)
+                record_batches = self.cache.write_batches(sql, self.dataset_address, stream_arrow_batches(job, batch_size=(arrow_batch_size or ARROW_BATCH_SIZE)))
+
+            record_batches = self.instrument(sql, method_name, record_batches, job=job, local_cache_hit=(job is None))
+            if arrow_batch_size:
+                return record_batches
+            return rows_from_record_batches(record_batches)
+
         job = self.client.query(sql, job_config=job_config)
         print("BATCH QUERY JOB:", type(job), job.job_id, job.state, job.location)
+        if arrow_batch_size:
+            return self.instrument(sql, method_name, stream_arrow_batches(job, batch_size=arrow_batch_size), job=job)
+        return self.instrument(sql, method_name, job, job=job)
+
+    def submit_query_in_batches(self, sql, temp_table_name=None):
+        """
+        Starts a batch query job, without waiting for it to finish, so many jobs can run at once.
+        Returns the job, whose results any process can stream later via fetch_job_results_in_batches(job.job_id, job.location).
+
+        Params:
+            sql (str)
+        """
+        if self.verbose:
+            print(sql)
+
+        if not temp_table_name:
+            temp_table_id = f"{generate_temp_table_id()}_{uuid4().hex[0:8]}" # jobs submitted in the same second need different tables
+            temp_table_name = f"{self.dataset_address}.temp_{temp_table_id}"
+
+        job_config = bigquery.QueryJobConfig(
+            priority=bigquery.QueryPriority.BATCH,
+            allow_large_results=True,
+            destination=temp_table_name
+        )
+        job = self.client.query(sql, job_config=job_config)
+        print("BATCH QUERY JOB:", job.job_id, job.state, job.location)
         return job
 
+    def fetch_job_results_in_batches(self, job_id, location=None, arrow_batch_size=ARROW_BATCH_SIZE):
+        """
+        Streams the results of a previously submitted query job, as columnar record batches (waiting for it to finish if necessary).
+
+        Params:
+            job_id (str)
+            location (str) the job's location, like "US"
+        """
+        job = self.client.get_job(job_id, location=location)
+        return stream_arrow_batches(job, batch_size=arrow_batch_size)
+
+    #
+    # QUERY METRICS
+    #
+
+    def record_query(self, sql, method_name, **metrics):
+        """Writes a record of the given query to the metrics sink (if enabled)."""
+        if not self.metrics:
+            return
+        self.metrics.write({**{
+            "method": method_name,
+            "fingerprint": sql_fingerprint(sql),
+            "dataset_address": self.dataset_address,
+            "dry_run": self.dry_run,
+        }, **metrics})
+
+    def instrument(self, sql, method_name, results, job=None, **metrics):
+        """
+        Wraps the results, so the query gets recorded once they have been consumed.
+        The job statistics are collected at that point, because batch jobs may still be running when their results are returned.
+
+        Params:
+            results (iterable of Row or pyarrow.RecordBatch)
+            job (google.cloud.bigquery.job.QueryJob) optional
+        """
+        if not self.metrics:
+            return results
+
+        def on_complete(row_count, iteration_seconds, complete):
+            stats = job_stats(job) if job is not None else {}
+            self.record_query(sql, method_name, rows=row_count, iteration_seconds=iteration_seconds, complete=complete, **{**stats, **metrics})
+
+        return InstrumentedResults(results, on_complete=on_complete)
+
+    def estimate_query(self, sql, job_config=None):
+        """
+        Validates the sql and estimates the number of bytes it would process, without running it.
+        Returns empty results, so a whole pipeline can be estimated in dry run mode.
+        """
+        method_name = resolve_method_name(self)
+        dry_run_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False,
+            query_parameters=(job_config.query_parameters if job_config else []))
+        try:
+            job = self.client.query(sql, job_config=dry_run_config)
+            bytes_processed = getattr(job, "total_bytes_processed", None) or 0
+            self.dry_run_bytes += bytes_processed
+            print("DRY RUN:", method_name, "|", fmt_n(bytes_processed), "BYTES", "|", fmt_n(self.dry_run_bytes), "BYTES TOTAL")
+            self.record_query(sql, method_name, bytes_processed=bytes_processed)
+        except Exception as err: # tables created by earlier steps of the pipeline won't exist yet
+            print("DRY RUN:", method_name, "| ERROR:", err)
+            self.record_query(sql, method_name, error=str(err))
+        return []
+
+    def invalidate_cached_results(self, table=None, sql=None):
+        """
+        Removes any cached results which depend on the given table, or on any tables modified by the given sql.
+
+        Params:
+            table (table ID string, Table, or TableReference)
+            sql (str) a migration or other statement which modifies one or more tables
+        """
+        if not self.cache:
+            return
+
+        table_names = []
+        if table is not None:
+            table_names.append(getattr(table, "table_id", str(table).split(".")[-1]))
+        if sql:
+            table_names += QueryCache.parse_table_names(sql, self.dataset_address)
+
+        for table_name in table_names:
+            self.cache.invalidate(table_name)
+
     def insert_records_in_batches(self, table, records):
         """
         Params:
             table (table ID string, Table, or TableReference)
             records (list of dictionaries)
+
+        Returns a list of error rows, like {"batch": 0, "index": 123, "errors": [...]}
         """
-        rows_to_insert = [list(d.values()) for d in records]
         #errors = self.client.insert_rows(table, rows_to_insert)
         #> ... google.api_core.exceptions.BadRequest: 400 POST https://bigquery.googleapis.com/bigquery/v2/projects/.../tables/daily_bot_probabilities/insertAll:
         #> ... too many rows present in the request, limit: 10000 row count: 36092.
         #> ... see: https://cloud.google.com/bigquery/quotas#streaming_inserts
-        errors = []
-        batches = list(split_into_batches(rows_to_insert, batch_size=5000))
-        for batch in batches:
-            errors += self.client.insert_rows(table, batch)
+        # so the bulk writer splits the rows into batches which respect the row and byte limits of each request,
+        # and sends them concurrently (or stages them in a single load job, for very large uploads)
+        if self.dry_run:
+            print("DRY RUN: SKIPPING INSERT OF", fmt_n(len(records)), "ROWS")
+            return []
+
+        errors = self.bulk_writer.insert_records(table, records)
+        self.invalidate_cached_results(table=table)
+        return errors
+
+    def insert_rows(self, table, rows_to_insert):
+        """
+        Params:
+            table (table ID string, Table, or TableReference)
+            rows_to_insert (list of lists, in the order of the table's columns)
+        """
+        if self.dry_run:
+            print("DRY RUN: SKIPPING INSERT OF", fmt_n(len(rows_to_insert)), "ROWS")
+            return []
+
+        errors = self.client.insert_rows(table, rows_to_insert)
+        self.invalidate_cached_results(table=table)
         return errors
 
     def delete_temp_tables_older_than(self, days=3):
@@ -169,7 +450,9 @@ class BigQueryService():
                 user_location       STRING,
                 user_verified       BOOLEAN,
                 user_created_at     TIMESTAMP
-            );
+            )
+            PARTITION BY DATE(created_at)
+            CLUSTER BY user_id;
         """
         return list(self.execute_query(sql))
 
@@ -205,16 +488,129 @@ class BigQueryService():
         new_topics = [topic for topic in topics if topic not in existing_topics]
         if new_topics:
             rows_to_insert = [[new_topic, generate_timestamp()] for new_topic in new_topics]
-            errors = self.client.insert_rows(self.topics_table, rows_to_insert)
+            errors = self.insert_rows(self.topics_table, rows_to_insert)
+            if self.topic_memberships_table_exists():
+                self.index_topics(new_topics)
             return errors
         else:
             print("NO NEW TOPICS...")
             return []
 
+    #
+    # TOPIC MEMBERSHIPS
+    #
+
+    def migrate_topic_memberships_table(self):
+        """
+        An index of which retweets are about which topics (status_id -> topic), clustered by topic,
+            so topic-filtered queries can look up the matching statuses instead of scanning the text of every status.
+        Indexes all existing topics. Subsequently appended topics get indexed as they are added (see append_topics),
+            and subsequently collected retweets get indexed by refreshing the index (see refresh_topic_memberships).
+        """
+        print("MIGRATING TOPIC MEMBERSHIPS TABLE...")
+        sql = ""
+        if self.destructive:
+            sql += f"DROP TABLE IF EXISTS `{self.dataset_address}.topic_memberships`; "
+        sql += f"""
+            CREATE TABLE IF NOT EXISTS `{self.dataset_address}.topic_memberships` (
+                topic STRING,
+                status_id STRING, -- like the retweets tables (which copy it from the tweets table), so it joins without casting
+                created_at TIMESTAMP, -- when the status was created, so the index can be refreshed with subsequent statuses
+            )
+            CLUSTER BY topic;
+        """
+        results = list(self.execute_query(sql))
+        self.fetch_indexed_topics.cache_clear()
+        self.index_topics(self.fetch_topic_names())
+        return results
+
+    def topic_memberships_table_exists(self):
+        try:
+            self.client.get_table(f"{self.dataset_address}.topic_memberships") # API call
+            return True
+        except google_exceptions.NotFound:
+            return False
+
+    @lru_cache(maxsize=None)
+    def fetch_indexed_topics(self):
+        """Returns the (uppercase) topics which have already been indexed. Cached until more topics get indexed."""
+        if not self.topic_memberships_table_exists():
+            return []
+        sql = f"""
+            SELECT DISTINCT topic
+            FROM `{self.dataset_address}.topic_memberships`
+        """
+        return sorted([row.topic for row in self.execute_query(sql)])
+
+    def index_topics(self, topics):
+        """
+        Adds the statuses about each of the given topics to the topic memberships table, in a single scan of the retweets table.
+        Skips topics which have already been indexed.
+
+        Param: topics (list of str) like ["#MAGA", "impeach"]
+        """
+        indexed_topics = self.fetch_indexed_topics()
+        new_topics = sorted(set([topic.upper() for topic in topics]) - set(indexed_topics))
+        if not new_topics:
+            print("NO NEW TOPICS TO INDEX...")
+            return []
+
+        print("INDEXING TOPICS...", new_topics)
+        topics_sql = " UNION ALL ".join([f"SELECT '{topic}' as topic" for topic in new_topics])
+        sql = f"""
+            INSERT INTO `{self.dataset_address}.topic_memberships` (topic, status_id, created_at)
+            SELECT DISTINCT t.topic, rt.status_id, cast(rt.created_at as timestamp) as created_at
+            FROM `{self.dataset_address}.retweets` rt
+            JOIN ({topics_sql}) t ON {self.sql_topic_match("t.topic")}
+        """
+        results = list(self.execute_query(sql))
+        self.fetch_indexed_topics.cache_clear()
+        return results
+
+    def refresh_topic_memberships(self):
+        """
+        Adds the statuses which were collected after each indexed topic was indexed, in a single scan of the retweets table.
+        Only scans the statuses created after the latest one already indexed for each topic (its high-water mark).
+        """
+        print("REFRESHING TOPIC MEMBERSHIPS...")
+        sql = f"""
+            INSERT INTO `{self.dataset_address}.topic_memberships` (topic, status_id, created_at)
+            SELECT DISTINCT t.topic, rt.status_id, cast(rt.created_at as timestamp) as created_at
+            FROM `{self.dataset_address}.retweets` rt
+            JOIN (
+                SELECT topic, max(created_at) as indexed_until
+                FROM `{self.dataset_address}.topic_memberships`
+                GROUP BY 1
+            ) t ON cast(rt.created_at as timestamp) > t.indexed_until AND {self.sql_topic_match("t.topic")}
+        """
+        return list(self.execute_query(sql))
+
+    @staticmethod
+    def sql_topic_match(topic_sql, alias="rt"):
+        """
+        Returns a condition which matches the statuses whose (uppercase) text contains the given (uppercase) topic pattern,
+            like the KS-test queries have always matched topics, so indexed and non-indexed queries return the same statuses.
+
+        Param: topic_sql (str) a SQL expression, like a quoted topic ("'#MAGA'") or a column name ("t.topic")
+        """
+        return f"REGEXP_CONTAINS(upper({alias}.status_text), {topic_sql})"
+
+    def sql_topic_filter(self, topic, alias="rt"):
+        """
+        Returns a condition which restricts the given retweets table alias to the statuses about the given topic.
+        Uses the topic memberships index if the topic has been indexed, otherwise scans the status text.
+        """
+        topic = topic.upper()
+        if topic in self.fetch_indexed_topics():
+            return f"""{alias}.status_id IN (
+                    SELECT tm.status_id FROM `{self.dataset_address}.topic_memberships` tm WHERE tm.topic = '{topic}'
+                )"""
+        return self.sql_topic_match(f"'{topic}'", alias=alias)
+
     def append_tweets(self, tweets):
         """Param: tweets (list of dict)"""
         rows_to_insert = [list(d.values()) for d in tweets]
-        errors = self.client.insert_rows(self.tweets_table, rows_to_insert)
+        errors = self.insert_rows(self.tweets_table, rows_to_insert)
         return errors
 
     #
@@ -289,7 +685,7 @@ class BigQueryService():
         rows_to_insert = [list(d.values()) for d in records]
         #rows_to_insert = [list(d.values()) for d in records if any(d["friend_names"])] # doesn't store failed attempts. can try those again later
         #if any(rows_to_insert):
-        errors = self.client.insert_rows(self.user_friends_table, rows_to_insert)
+        errors = self.insert_rows(self.user_friends_table, rows_to_insert)
         return errors
 
     def user_friend_collection_progress(self):
@@ -330,7 +726,7 @@ class BigQueryService():
         #return list(self.execute_query(sql))
         return self.execute_query(sql) # return the generator so we can avoid storing the results in memory
 
-    def fetch_user_friends_in_batches(self, limit=None, min_friends=None):
+    def fetch_user_friends_in_batches(self, limit=None, min_friends=None, arrow_batch_size=None):
         sql = f"""
             SELECT user_id, screen_name, friend_count, friend_names
             FROM `{self.dataset_address}.user_friends`
@@ -340,7 +736,7 @@ class BigQueryService():
         if limit:
             sql += f" LIMIT {int(limit)}; "
 
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
     def partition_user_friends(self, n=10):
         """Params n (int) the number of partitions, each will be of equal size"""
@@ -381,8 +777,8 @@ class BigQueryService():
         """
         sql = f"""
             SELECT DISTINCT user_id, user_screen_name, user_created_at
-            FROM `{self.dataset_address}.tweets`
-            WHERE upper(status_text) LIKE '%{topic.upper()}%' AND (created_at BETWEEN '{start_at}' AND '{end_at}')
+            FROM `{self.dataset_address}.tweets` t
+            WHERE {self.sql_topic_match(f"'{topic.upper()}'", alias="t")} AND (created_at BETWEEN '{start_at}' AND '{end_at}')
             ORDER BY rand()
             LIMIT {int(limit)};
         """
@@ -392,7 +788,7 @@ class BigQueryService():
     # RETWEET GRAPHS
     #
 
-    def fetch_retweet_counts_in_batches(self, topic=None, start_at=None, end_at=None):
+    def fetch_retweet_counts_in_batches(self, topic=None, start_at=None, end_at=None, arrow_batch_size=None):
         """
         For each retweeter, includes the number of times each they retweeted each other user.
             Optionally about a given topic.
@@ -410,12 +806,12 @@ class BigQueryService():
                 ,user_screen_name
                 ,retweet_user_screen_name
                 ,count(distinct status_id) as retweet_count
-            FROM `{self.dataset_address}.retweets`
+            FROM `{self.dataset_address}.retweets` rt
             WHERE user_screen_name <> retweet_user_screen_name -- excludes people retweeting themselves
         """
         if topic:
             sql+=f"""
-                AND upper(status_text) LIKE '%{topic.upper()}%'
+                AND {self.sql_topic_filter(topic)}
             """
         if start_at and end_at:
             sql+=f"""
@@ -425,7 +821,7 @@ class BigQueryService():
             GROUP BY 1,2,3
         """
 
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
     def fetch_specific_user_friends(self, screen_names):
         sql = f"""
@@ -485,7 +881,7 @@ class BigQueryService():
     # LOCAL ANALYSIS (PG PIPELINE)
     #
 
-    def fetch_tweets_in_batches(self, limit=None, start_at=None, end_at=None):
+    def fetch_tweets_in_batches(self, limit=None, start_at=None, end_at=None, arrow_batch_size=None):
         sql = f"""
             SELECT
                 status_id
@@ -516,10 +912,10 @@ class BigQueryService():
             """
         if limit:
             sql += f" LIMIT {int(limit)}; "
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
 
-    def fetch_user_details_in_batches(self, limit=None):
+    def fetch_user_details_in_batches(self, limit=None, arrow_batch_size=None):
         sql = f"""
             SELECT
                 user_id
@@ -563,9 +959,9 @@ class BigQueryService():
         if limit:
             sql += f"LIMIT {int(limit)};"
 
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
-    def fetch_retweeter_details_in_batches(self, limit=None):
+    def fetch_retweeter_details_in_batches(self, limit=None, arrow_batch_size=None):
         sql = f"""
             SELECT
                 user_id
@@ -593,19 +989,34 @@ class BigQueryService():
         if limit:
             sql += f"LIMIT {int(limit)};"
 
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
     def fetch_retweeters_by_topic_exclusive(self, topic):
         """
         Get the retweeters talking about topic x and those not, so we can perform a two-sample KS-test on them.
         """
         topic = topic.upper() # do uppercase conversion once here instead of many times inside sql below
+        if topic in self.fetch_indexed_topics():
+            sql = f"""
+                -- TOPIC: '{topic}'
+                SELECT
+                    rt.user_id
+                    ,rt.user_created_at
+                    ,count(distinct tm.status_id) as count
+                FROM {self.dataset_address}.retweets rt
+                LEFT JOIN (
+                    SELECT status_id FROM `{self.dataset_address}.topic_memberships` WHERE topic = '{topic}'
+                ) tm ON tm.status_id = rt.status_id
+                GROUP BY 1,2
+            """
+            return self.execute_query(sql)
+
         sql = f"""
             -- TOPIC: '{topic}'
             SELECT
                 rt.user_id
                 ,rt.user_created_at
-                ,count(distinct case when REGEXP_CONTAINS(upper(rt.status_text), '{topic}') then rt.status_id end) as count
+                ,count(distinct case when {self.sql_topic_match(f"'{topic}'")} then rt.status_id end) as count
             FROM {self.dataset_address}.retweets rt
             GROUP BY 1,2
         """
@@ -619,21 +1030,80 @@ class BigQueryService():
         """
         x_topic = x_topic.upper() # do uppercase conversion once here instead of many times inside sql below
         y_topic = y_topic.upper() # do uppercase conversion once here instead of many times inside sql below
+        indexed_topics = self.fetch_indexed_topics()
+        if x_topic in indexed_topics and y_topic in indexed_topics:
+            sql = f"""
+                -- TOPICS: '{x_topic}' | '{y_topic}'
+                SELECT
+                    rt.user_id
+                    ,rt.user_created_at
+                    ,count(distinct case when tm.topic = '{x_topic}' then rt.status_id end) as x_count
+                    ,count(distinct case when tm.topic = '{y_topic}' then rt.status_id end) as y_count
+                FROM {self.dataset_address}.retweets rt
+                JOIN (
+                    SELECT topic, status_id FROM `{self.dataset_address}.topic_memberships` WHERE topic IN ('{x_topic}', '{y_topic}')
+                ) tm ON tm.status_id = rt.status_id
+                GROUP BY 1,2
+                HAVING (x_count > 0 and y_count = 0) OR (x_count = 0 and y_count > 0) -- mutually exclusive populations
+            """
+            return self.execute_query(sql)
+
         sql = f"""
             -- TOPICS: '{x_topic}' | '{y_topic}'
             SELECT
                 rt.user_id
                 ,rt.user_created_at
-                ,count(distinct case when REGEXP_CONTAINS(upper(rt.status_text), '{x_topic}') then rt.status_id end) as x_count
-                ,count(distinct case when REGEXP_CONTAINS(upper(rt.status_text), '{y_topic}') then rt.status_id end) as y_count
+                ,count(distinct case when {self.sql_topic_match(f"'{x_topic}'")} then rt.status_id end) as x_count
+                ,count(distinct case when {self.sql_topic_match(f"'{y_topic}'")} then rt.status_id end) as y_count
             FROM {self.dataset_address}.retweets rt
-            WHERE REGEXP_CONTAINS(upper(rt.status_text), '{x_topic}')
-                OR REGEXP_CONTAINS(upper(rt.status_text), '{y_topic}')
+            WHERE {self.sql_topic_match(f"'{x_topic}'")}
+                OR {self.sql_topic_match(f"'{y_topic}'")}
             GROUP BY 1,2
             HAVING (x_count > 0 and y_count = 0) OR (x_count = 0 and y_count > 0) -- mutually exclusive populations
         """
         return self.execute_query(sql)
 
+    def fetch_retweeter_topic_counts(self, topics, arrow_batch_size=ARROW_BATCH_SIZE):
+        """
+        For each retweeter, counts how many times they were talking about each of the given topics, in a single scan of the retweets table
+            (instead of one scan per topic), so the KS-test populations for all topics can be built locally.
+
+        Param: topics (list of str) like ["#MAGA", "#ImpeachAndConvict"]
+
+        Returns columnar record batches with columns: user_id, user_created_at, topic_0, topic_1, ... (one count column per topic, in the given order).
+        See app/ks_test/topic_matrix.py
+        """
+        topics = [topic.upper() for topic in topics] # do uppercase conversion once here instead of many times inside sql below
+        topics_list = ", ".join([f"'{topic}'" for topic in topics])
+        indexed_topics = self.fetch_indexed_topics()
+        if all([topic in indexed_topics for topic in topics]):
+            topic_counts_sql = "\n".join([f",count(distinct case when tm.topic = '{topic}' then tm.status_id end) as topic_{i}" for i, topic in enumerate(topics)])
+            sql = f"""
+                -- TOPICS: {topics_list}
+                SELECT
+                    rt.user_id
+                    ,cast(rt.user_created_at as timestamp) as user_created_at
+                    {topic_counts_sql}
+                FROM {self.dataset_address}.retweets rt
+                LEFT JOIN (
+                    SELECT topic, status_id FROM `{self.dataset_address}.topic_memberships` WHERE topic IN ({topics_list})
+                ) tm ON tm.status_id = rt.status_id
+                GROUP BY 1,2
+            """
+        else:
+            topic_matches = [self.sql_topic_match(f"'{topic}'") for topic in topics]
+            topic_counts_sql = "\n".join([f",count(distinct case when {match} then rt.status_id end) as topic_{i}" for i, match in enumerate(topic_matches)])
+            sql = f"""
+                -- TOPICS: {topics_list}
+                SELECT
+                    rt.user_id
+                    ,cast(rt.user_created_at as timestamp) as user_created_at
+                    {topic_counts_sql}
+                FROM {self.dataset_address}.retweets rt
+                GROUP BY 1,2
+            """
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
+
     #
     # RETWEET GRAPHS V2 - USER ID LOOKUPS
     #
@@ -672,7 +1142,7 @@ class BigQueryService():
         Param: records (list of dictionaries)
         """
         rows_to_insert = [list(d.values()) for d in records]
-        errors = self.client.insert_rows(self.user_id_lookups_table, rows_to_insert)
+        errors = self.insert_rows(self.user_id_lookups_table, rows_to_insert)
         return errors
 
     def fetch_max_user_id_postlookup(self):
@@ -718,7 +1188,7 @@ class BigQueryService():
         Param: records (list of dictionaries)
         """
         rows_to_insert = [list(d.values()) for d in records]
-        errors = self.client.insert_rows(self.user_id_assignments_table, rows_to_insert)
+        errors = self.insert_rows(self.user_id_assignments_table, rows_to_insert)
         return errors
 
     def migrate_populate_user_screen_names_table(self):
@@ -764,7 +1234,10 @@ class BigQueryService():
         if self.destructive:
             sql += f"DROP TABLE IF EXISTS `{self.dataset_address}.retweets_v2`; "
         sql += f"""
-            CREATE TABLE IF NOT EXISTS `{self.dataset_address}.retweets_v2` as (
+            CREATE TABLE IF NOT EXISTS `{self.dataset_address}.retweets_v2`
+            PARTITION BY DATE(created_at)
+            CLUSTER BY user_id, retweeted_user_id
+            as (
                 SELECT
                     cast(rt.user_id as int64) as user_id
                     ,UPPER(rt.user_screen_name) as user_screen_name
@@ -784,7 +1257,7 @@ class BigQueryService():
         """
         return self.execute_query(sql)
 
-    def fetch_retweet_edges_in_batches_v2(self, topic=None, start_at=None, end_at=None):
+    def fetch_retweet_edges_in_batches_v2(self, topic=None, start_at=None, end_at=None, arrow_batch_size=None):
         """
         For each retweeter, includes the number of times each they retweeted each other user.
             Optionally about a given topic.
@@ -795,6 +1268,14 @@ class BigQueryService():
             start_at (str) : a date string for the earliest tweet
             end_at (str) : a date string for the latest tweet
         """
+        sql = self.retweet_edges_v2_sql(topic=topic, start_at=start_at, end_at=end_at)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
+
+    def submit_retweet_edges_v2(self, topic=None, start_at=None, end_at=None):
+        """Starts the query for fetch_retweet_edges_in_batches_v2(), and returns the job (see submit_query_in_batches)."""
+        return self.submit_query_in_batches(self.retweet_edges_v2_sql(topic=topic, start_at=start_at, end_at=end_at))
+
+    def retweet_edges_v2_sql(self, topic=None, start_at=None, end_at=None):
         sql = f"""
             SELECT
                 rt.user_id
@@ -805,7 +1286,7 @@ class BigQueryService():
         """
         if topic:
             sql+=f"""
-                AND upper(rt.status_text) LIKE '%{topic.upper()}%'
+                AND {self.sql_topic_filter(topic)}
             """
         if start_at and end_at:
             sql+=f"""
@@ -814,7 +1295,36 @@ class BigQueryService():
         sql += """
             GROUP BY 1,2
         """
-        return self.execute_query_in_batches(sql)
+        return sql
+
+    def destructively_migrate_partitioned_table(self, table_name, cluster_by=None):
+        """
+        Re-creates an existing table (like "tweets", "retweets", or "retweets_v2") as partitioned by DATE(created_at),
+            so queries which filter by date only scan the partitions for those dates, instead of the whole table.
+
+        Params:
+            table_name (str)
+            cluster_by (list of str) optionally cluster each partition by these columns, like ["user_id"]
+        """
+        print("PARTITIONING TABLE...", table_name.upper())
+        # BigQuery can't replace an unpartitioned table with a partitioned one of the same name,
+        # ... so copies it into a new partitioned table, then swaps the new table in for the old one
+        sql = f"""
+            CREATE OR REPLACE TABLE `{self.dataset_address}.{table_name}_partitioned`
+            PARTITION BY DATE(created_at)
+        """
+        if cluster_by:
+            sql += f"""
+            CLUSTER BY {', '.join(cluster_by)}
+            """
+        sql += f"""
+            AS (
+                SELECT * FROM `{self.dataset_address}.{table_name}`
+            );
+            DROP TABLE `{self.dataset_address}.{table_name}`;
+            ALTER TABLE `{self.dataset_address}.{table_name}_partitioned` RENAME TO {table_name};
+        """
+        return self.execute_query(sql)
 
     def migrate_daily_bot_probabilities_table(self):
         sql = ""
@@ -853,7 +1363,7 @@ class BigQueryService():
         """Returns any user who has ever had a bot score above the given threshold."""
         return self.execute_query(self.sql_fetch_bot_ids(bot_min))
 
-    def fetch_bot_retweet_edges_in_batches(self, bot_min=0.8):
+    def fetch_bot_retweet_edges_in_batches(self, bot_min=0.8, arrow_batch_size=None):
         """
         For each bot (user with any bot score greater than the specified threshold),
             and each user they retweeted, includes the number of times the bot retweeted them.
@@ -874,7 +1384,7 @@ class BigQueryService():
             GROUP BY 1,2
             -- ORDER BY 1,2
         """
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
     #
     # RETWEET GRAPHS V2 - BOT COMMUNITIES
@@ -900,7 +1410,7 @@ class BigQueryService():
         table = self.n_bot_communities_table(n_communities)
         return self.insert_records_in_batches(table, records)
 
-    def download_n_bot_community_tweets_in_batches(self, n_communities):
+    def download_n_bot_community_tweets_in_batches(self, n_communities, arrow_batch_size=None):
         sql = f"""
             SELECT
                 bc.community_id
@@ -926,9 +1436,9 @@ class BigQueryService():
             -- WHERE t.retweet_status_id IS NULL
             -- ORDER BY 1,2
         """
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
-    def download_n_bot_community_retweets_in_batches(self, n_communities):
+    def download_n_bot_community_retweets_in_batches(self, n_communities, arrow_batch_size=None):
         sql = f"""
             SELECT
                 bc.community_id
@@ -950,7 +1460,7 @@ class BigQueryService():
             JOIN `{self.dataset_address}.retweets_v2` rt on rt.user_id = bc.user_id
             -- ORDER BY 1,2
         """
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
     def destructively_migrate_token_frequencies_table(self, table_address, records):
         print("DESTRUCTIVELY MIGRATING TABLE:", table_address)
@@ -1054,7 +1564,7 @@ class BigQueryService():
         """ # 29,861,268 rows WAT
         return self.execute_query(sql)
 
-    def fetch_bot_followers_in_batches(self, bot_min=0.8):
+    def fetch_bot_followers_in_batches(self, bot_min=0.8, arrow_batch_size=None):
         """
         Returns a row for each bot for each user who follows them.
         Params: bot_min (float) consider users with any score above this threshold as bots (uses pre-computed classification scores)
@@ -1064,12 +1574,14 @@ class BigQueryService():
             SELECT DISTINCT bot_id, follower_id
             FROM `{self.dataset_address}.bot_followers_above_{bot_min_str}`
         """
-        return self.execute_query_in_batches(sql)
+        return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
 
-    def fetch_bot_follower_lists(self, bot_min=0.8):
+    def fetch_bot_follower_lists(self, bot_min=0.8, arrow_batch_size=None):
         """
         Returns a row for each bot, with a list of aggregated follower ids.
-        Params: bot_min (float) consider users with any score above this threshold as bots (uses pre-computed classification scores)
+        Params:
+            bot_min (float) consider users with any score above this threshold as bots (uses pre-computed classification scores)
+            arrow_batch_size (int) optionally stream the results as columnar record batches of this many bots
         """
         bot_min_str = str(int(bot_min * 100)) #> "80"
         sql = f"""
@@ -1077,6 +1589,8 @@ class BigQueryService():
             FROM `{self.dataset_address}.bot_followers_above_{bot_min_str}`
             GROUP BY 1
         """ # takes 90 seconds for ~25K rows
+        if arrow_batch_size:
+            return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
         return self.execute_query(sql)
 
     #
@@ -1225,14 +1739,18 @@ class BigQueryService():
                 -- ,r.tweet_count as rate
             FROM `{self.dataset_address}.tweets` t
             LEFT JOIN `{self.dataset_address}.2_bot_communities` bu ON bu.user_id = cast(t.user_id as int64)
-            WHERE EXTRACT(DATE from created_at) = '{date}'
+            WHERE {sql_date_filter(date)}
             --LIMIT 10
         """
         if limit:
             sql += f" LIMIT {int(limit)};"
         return self.execute_query(sql)
 
-    def fetch_daily_active_tweeter_statuses(self, date, tweet_min=None, limit=None):
+    def fetch_daily_active_tweeter_statuses(self, date, tweet_min=None, limit=None, arrow_batch_size=None):
+        """
+        Params:
+            arrow_batch_size (int) optionally stream the results as columnar record batches of this many rows, instead of row by row
+        """
         sql = f"""
             SELECT DISTINCT
                 t.status_id
@@ -1249,19 +1767,25 @@ class BigQueryService():
                 SELECT
                 cast(user_id as INT64) as user_id, count(distinct status_id) as tweet_count
                 FROM `{self.dataset_address}.tweets` t
-                WHERE EXTRACT(DATE from created_at) = '{date}'
+                WHERE {sql_date_filter(date)}
                 GROUP BY 1
                 -- LIMIT 10
             ) r ON r.user_id = cast(t.user_id as int64)
-            WHERE EXTRACT(DATE from created_at) = '{date}'
+            WHERE {sql_date_filter(date)}
         """
         if tweet_min:
             sql += f" AND tweet_count >= {int(tweet_min)};"
         if limit:
             sql += f" LIMIT {int(limit)};"
+        if arrow_batch_size:
+            return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
         return self.execute_query(sql)
 
-    def fetch_daily_active_tweeter_statuses_for_model_training(self, date, tweet_min=None, limit=None):
+    def fetch_daily_active_tweeter_statuses_for_model_training(self, date, tweet_min=None, limit=None, arrow_batch_size=None):
+        """
+        Params:
+            arrow_batch_size (int) optionally stream the results as columnar record batches of this many rows, instead of row by row
+        """
         sql = f"""
             WITH daily_tweets AS (
                 SELECT
@@ -1271,7 +1795,7 @@ class BigQueryService():
                     ,t.status_text
                     ,t.created_at
                 FROM `{self.dataset_address}.tweets` t
-                WHERE extract(date from t.created_at) = '{date}'
+                WHERE {sql_date_filter(date, 't.created_at')}
             )
 
             SELECT DISTINCT
@@ -1302,15 +1826,21 @@ class BigQueryService():
             sql += f" AND tweet_count >= {int(tweet_min)};"
         if limit:
             sql += f" LIMIT {int(limit)};"
+        if arrow_batch_size:
+            return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
         return self.execute_query(sql)
 
-    def fetch_daily_active_user_friends(self, date, tweet_min=None, limit=None):
+    def fetch_daily_active_user_friends(self, date, tweet_min=None, limit=None, arrow_batch_size=None):
+        """
+        Params:
+            arrow_batch_size (int) optionally stream the results as columnar record batches of this many rows, instead of row by row
+        """
         sql = f"""
             SELECT dau.user_id, dau.rate, uf.screen_name ,uf.friend_count, uf.friend_names
             FROM (
                 SELECT cast(user_id as INT64) as user_id, count(distinct status_id) as rate
                 FROM `{self.dataset_address}.tweets` t
-                WHERE EXTRACT(DATE from t.created_at) = '{date}'
+                WHERE {sql_date_filter(date, 't.created_at')}
                 GROUP BY 1
             ) dau
             JOIN `{self.dataset_address}.active_user_friends` uf ON uf.user_id = dau.user_id
@@ -1319,9 +1849,15 @@ class BigQueryService():
             sql += f" WHERE dau.rate >= {int(tweet_min)};"
         if limit:
             sql += f" LIMIT {int(limit)};"
+        if arrow_batch_size:
+            return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
         return self.execute_query(sql)
 
-    def fetch_daily_active_edge_friends(self, date, tweet_min=2, limit=None):
+    def fetch_daily_active_edge_friends(self, date, tweet_min=2, limit=None, arrow_batch_size=None):
+        """
+        Params:
+            arrow_batch_size (int) optionally stream the results as columnar record batches of this many rows, instead of row by row
+        """
         sql = f"""
             WITH dau AS (
                 SELECT
@@ -1329,7 +1865,7 @@ class BigQueryService():
                     ,upper(user_screen_name) as screen_name
                     ,count(distinct status_id) as rate
                 FROM `{self.dataset_address}.tweets`
-                WHERE EXTRACT(DATE FROM created_at) = '{date}'
+                WHERE {sql_date_filter(date)}
                 GROUP BY 1,2
                 HAVING count(distinct status_id) >= {int(tweet_min)}
             )
@@ -1347,9 +1883,15 @@ class BigQueryService():
         """
         if limit:
             sql += f" LIMIT {int(limit)};"
+        if arrow_batch_size:
+            return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
         return self.execute_query(sql)
 
-    def fetch_daily_active_edge_friends_for_csv(self, date, tweet_min=2, limit=None):
+    def fetch_daily_active_edge_friends_for_csv(self, date, tweet_min=2, limit=None, arrow_batch_size=None):
+        """
+        Params:
+            arrow_batch_size (int) optionally stream the results as columnar record batches of this many rows, instead of row by row
+        """
         sql = f"""
             WITH dau AS (
                 SELECT
@@ -1357,7 +1899,7 @@ class BigQueryService():
                     ,upper(user_screen_name) as screen_name
                     ,count(distinct status_id) as rate
                 FROM `{self.dataset_address}.tweets`
-                WHERE EXTRACT(DATE FROM created_at) = '{date}'
+                WHERE {sql_date_filter(date)}
                 GROUP BY 1,2
                 HAVING count(distinct status_id) >= {int(tweet_min)}
             )
@@ -1375,6 +1917,8 @@ class BigQueryService():
         """
         if limit:
             sql += f" LIMIT {int(limit)};"
+        if arrow_batch_size:
+            return self.execute_query_in_batches(sql, arrow_batch_size=arrow_batch_size)
         return self.execute_query(sql)
 
 
@@ -1386,7 +1930,7 @@ class BigQueryService():
             WITH daily_tweets as (
                 SELECT user_id ,screen_name ,status_id ,status_text ,created_at ,score_lr ,score_nb
                 FROM `{self.dataset_address}.nlp_v2_predictions_combined` p
-                WHERE extract(date from created_at) = '{date}'
+                WHERE {sql_date_filter(date)}
                     AND score_lr is not null and score_nb is not null -- there are 30,000 total null lr scores. drop for now
             )
 
@@ -1431,7 +1975,7 @@ class BigQueryService():
                     ,screen_name
                     ,count(distinct status_id) as rate
                 FROM `{self.dataset_address}.nlp_v2_predictions_combined` p
-                WHERE extract(date from created_at) = '{date}'
+                WHERE {sql_date_filter(date)}
                     AND score_lr is not null and score_nb is not null -- there are 30,000 total null lr scores. drop for now
                 GROUP BY 1,2
             )
@@ -1521,7 +2065,7 @@ class BigQueryService():
             LIMIT 1
         """
         job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("screen_name", "STRING", screen_name)])
-        return self.client.query(sql, job_config=job_config)
+        return self.execute_query(sql, job_config=job_config)
 
     def fetch_user_tweets_api_v0(self, screen_name="politico"):
         # TODO: create some temporary tables maybe, to make the query faster
@@ -1535,8 +2079,8 @@ class BigQueryService():
             LEFT JOIN `{self.dataset_address}.2_community_predictions` p ON p.status_id = cast(t.status_id as int64)
             WHERE upper(t.user_screen_name) = upper(@screen_name)
         """
-        job_config = QueryJobConfig(query_parameters=[ScalarQueryParameter("screen_name", "STRING", screen_name)])
-        return self.client.query(sql, job_config=job_config)
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("screen_name", "STRING", screen_name)])
+        return self.execute_query(sql, job_config=job_config)
 
     def fetch_users_most_retweeted_api_v0(self, metric=None, limit=None):
         """
@@ -1562,11 +2106,11 @@ class BigQueryService():
                 LIMIT @limit
             )
         """
-        job_config = QueryJobConfig(query_parameters=[
-            ScalarQueryParameter("metric", "STRING", metric),
-            ScalarQueryParameter("limit", "INT64", int(limit)),
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("metric", "STRING", metric),
+            bigquery.ScalarQueryParameter("limit", "INT64", int(limit)),
         ])
-        return self.client.query(sql, job_config=job_config)
+        return self.execute_query(sql, job_config=job_config)
 
     def fetch_statuses_most_retweeted_api_v0(self, metric=None, limit=None):
         """
@@ -1592,11 +2136,11 @@ class BigQueryService():
                 LIMIT @limit
             )
         """
-        job_config = QueryJobConfig(query_parameters=[
-            ScalarQueryParameter("metric", "STRING", metric),
-            ScalarQueryParameter("limit", "INT64", int(limit)),
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("metric", "STRING", metric),
+            bigquery.ScalarQueryParameter("limit", "INT64", int(limit)),
         ])
-        return self.client.query(sql, job_config=job_config)
+        return self.execute_query(sql, job_config=job_config)
 
     def fetch_top_profile_tokens_api_v0(self, limit=None):
         """
@@ -1619,8 +2163,8 @@ class BigQueryService():
                 LIMIT @limit
             )
         """
-        job_config = QueryJobConfig(query_parameters=[ScalarQueryParameter("limit", "INT64", int(limit))])
-        return self.client.query(sql, job_config=job_config)
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("limit", "INT64", int(limit))])
+        return self.execute_query(sql, job_config=job_config)
 
     def fetch_top_profile_tags_api_v0(self, limit=None):
         """
@@ -1643,8 +2187,8 @@ class BigQueryService():
                 LIMIT @limit
             )
         """
-        job_config = QueryJobConfig(query_parameters=[ScalarQueryParameter("limit", "INT64", int(limit))])
-        return self.client.query(sql, job_config=job_config)
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("limit", "INT64", int(limit))])
+        return self.execute_query(sql, job_config=job_config)
 
     def fetch_top_status_tokens_api_v0(self, limit=None):
         """
@@ -1667,8 +2211,8 @@ class BigQueryService():
                 LIMIT @limit
             )
         """
-        job_config = QueryJobConfig(query_parameters=[ScalarQueryParameter("limit", "INT64", int(limit))])
-        return self.client.query(sql, job_config=job_config)
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("limit", "INT64", int(limit))])
+        return self.execute_query(sql, job_config=job_config)
 
     def fetch_top_status_tags_api_v0(self, limit=None):
         """
@@ -1691,8 +2235,8 @@ class BigQueryService():
                 LIMIT @limit
             )
         """
-        job_config = QueryJobConfig(query_parameters=[ScalarQueryParameter("limit", "INT64", int(limit))])
-        return self.client.query(sql, job_config=job_config)
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("limit", "INT64", int(limit))])
+        return self.execute_query(sql, job_config=job_config)
 
     #
     # API - V1
@@ -1710,8 +2254,8 @@ class BigQueryService():
             FROM `{self.dataset_address}.nlp_v2_predictions_combined` p
             WHERE upper(screen_name) = upper(@screen_name)
         """
-        job_config = QueryJobConfig(query_parameters=[ScalarQueryParameter("screen_name", "STRING", screen_name)])
-        return self.client.query(sql, job_config=job_config)
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("screen_name", "STRING", screen_name)])
+        return self.execute_query(sql, job_config=job_config)
 
 
     def fetch_users_most_followed_api_v1(self, limit=None):
@@ -1729,8 +2273,8 @@ class BigQueryService():
             ORDER BY follower_count DESC
             LIMIT @limit
         """
-        job_config = QueryJobConfig(query_parameters=[ScalarQueryParameter("limit", "INT64", int(limit))])
-        return self.client.query(sql, job_config=job_config)
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("limit", "INT64", int(limit))])
+        return self.execute_query(sql, job_config=job_config)
 
 if __name__ == "__main__":
 
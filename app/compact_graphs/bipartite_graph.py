@@ -0,0 +1,205 @@
+from pprint import pprint
+
+import numpy as np
+import pyarrow.compute as pc
+from scipy.sparse import csr_matrix
+
+from app.decorators.number_decorators import fmt_n
+from app.compact_graphs.compact_graph import CompactGraph, DegreeView, node_index
+from app.compact_graphs.edge_buffer import NodeIndex, to_array
+from app.compact_graphs.friend_graph_builder import to_list_array, dictionary_encode, segments_to_csr
+
+def positions(sorted_ids, ids):
+    """Returns the position of each of the given ids in the sorted ids, skipping any which aren't there."""
+    ids = np.atleast_1d(to_array(ids))
+    if len(sorted_ids) == 0:
+        return np.array([], dtype=np.int64)
+    found = np.searchsorted(sorted_ids, ids)
+    found[found == len(sorted_ids)] = 0
+    return found[sorted_ids[found] == ids]
+
+class BipartiteGraph:
+    def __init__(self, bot_ids, follower_ids, followers):
+        """
+        The followers of each bot, as a sparse (bots x followers) matrix, instead of a generic graph with an edge per follower.
+
+        Each bot is indexed by its position in the sorted bot ids, and each follower by its position in the sorted follower ids,
+            so set operations on followers become operations on the rows of the matrix:
+            the followers of any set of bots, the bots any user follows, and the followers any two bots have in common (via a sparse product).
+
+        Params:
+            bot_ids (numpy array) the sorted, unique bot ids
+            follower_ids (numpy array) the sorted, unique follower ids
+            followers (scipy.sparse.csr_matrix) where row i holds a one for each follower of bot i
+        """
+        self.bot_ids = bot_ids
+        self.follower_ids = follower_ids
+        self.followers = followers
+        self.reverse_followers = None
+
+    @classmethod
+    def from_lists(cls, bot_ids, follower_id_lists):
+        builder = BipartiteGraphBuilder()
+        builder.append_lists(bot_ids, follower_id_lists)
+        return builder.to_bipartite_graph()
+
+    #
+    # STORAGE
+    #
+
+    def save(self, filepath):
+        """Writes the ids and the matrix structure to a (.npz) file (the values are all ones, so don't need storing)."""
+        np.savez(filepath, bot_ids=self.bot_ids, follower_ids=self.follower_ids, indptr=self.followers.indptr, indices=self.followers.indices)
+
+    @classmethod
+    def load(cls, filepath):
+        with np.load(filepath) as arrays:
+            indices = arrays["indices"]
+            shape = (len(arrays["bot_ids"]), len(arrays["follower_ids"]))
+            followers = csr_matrix((np.ones(len(indices), dtype=np.int32), indices, arrays["indptr"]), shape=shape)
+            return cls(bot_ids=arrays["bot_ids"], follower_ids=arrays["follower_ids"], followers=followers)
+
+    #
+    # QUERIES
+    #
+
+    @property
+    def followed_bots(self):
+        """The reverse matrix (followers x bots), where row j holds a one for each bot follower j follows. Only built if needed."""
+        if self.reverse_followers is None:
+            self.reverse_followers = self.followers.transpose().tocsr()
+        return self.reverse_followers
+
+    @property
+    def follower_counts(self):
+        """The number of followers of each bot."""
+        return DegreeView(self.bot_ids, np.diff(self.followers.indptr))
+
+    @property
+    def followed_bot_counts(self):
+        """The number of bots each follower follows."""
+        return DegreeView(self.follower_ids, np.diff(self.followed_bots.indptr))
+
+    def followers_of(self, bots):
+        """
+        Returns the ids of all the users who follow any of the given bots.
+
+        Param: bots (array-like) bot ids (any which aren't in the graph are ignored)
+        """
+        rows = self.followers[positions(self.bot_ids, bots)]
+        return self.follower_ids[np.unique(rows.indices)]
+
+    def bots_followed_by(self, user):
+        """Returns the ids of the bots the given user follows (or raises a KeyError if they don't follow any)."""
+        i = node_index(self.follower_ids, user)
+        followed_bots = self.followed_bots
+        return self.bot_ids[np.sort(followed_bots.indices[followed_bots.indptr[i]:followed_bots.indptr[i + 1]])]
+
+    def follower_overlap(self, bots=None):
+        """
+        Returns the number of followers each pair of bots have in common, as a sparse (bots x bots) matrix
+            (where the diagonal holds each bot's number of followers), along with the ids of its rows and columns.
+
+        Param: bots (array-like) optionally, only for these bot ids
+        """
+        if bots is None:
+            bot_ids, rows = self.bot_ids, self.followers
+        else:
+            bot_positions = np.unique(positions(self.bot_ids, bots))
+            bot_ids, rows = self.bot_ids[bot_positions], self.followers[bot_positions]
+        return bot_ids, (rows @ rows.transpose()).tocsr()
+
+    def shared_followers(self, bot_a, bot_b):
+        """Returns the number of followers two bots have in common."""
+        i = node_index(self.bot_ids, bot_a)
+        j = node_index(self.bot_ids, bot_b)
+        return int(self.followers[i].multiply(self.followers[j]).sum())
+
+    #
+    # CONVERSION
+    #
+
+    def to_compact_graph(self, weight_attr=None):
+        """A generic graph, with an edge from each follower to each bot they follow."""
+        edges = self.followers.tocoo()
+        return CompactGraph.from_edges(sources=self.follower_ids[edges.col], targets=self.bot_ids[edges.row], weight_attr=weight_attr)
+
+    def to_networkx(self):
+        return self.to_compact_graph().to_networkx()
+
+    def number_of_nodes(self):
+        return len(np.union1d(self.bot_ids, self.follower_ids))
+
+    def number_of_edges(self):
+        return self.followers.nnz
+
+    @property
+    def nbytes(self):
+        arrays = [self.bot_ids, self.follower_ids, self.followers.indptr, self.followers.indices]
+        return sum([array.nbytes for array in arrays])
+
+    @property
+    def metadata(self):
+        return {"bots": len(self.bot_ids), "followers": len(self.follower_ids), "edges": self.number_of_edges(), "nbytes": self.nbytes}
+
+class BipartiteGraphBuilder:
+    def __init__(self):
+        """
+        Assembles a bipartite graph from columns of follower lists, like the "follower_ids" column of bot follower query results,
+            without creating any python objects per edge (see FriendGraphBuilder).
+        """
+        self.bot_index = NodeIndex()
+        self.follower_index = NodeIndex()
+        self.bots = [] # the bot index of each row, per batch
+        self.lengths = [] # the number of followers in each row, per batch
+        self.followers = [] # the follower index of each of those followers, per batch
+        self.edge_count = 0 # including any duplicates
+
+    @property
+    def metadata(self):
+        return {"bots": len(self.bot_index), "followers": len(self.follower_index), "edges": self.edge_count}
+
+    def append_lists(self, bot_ids, follower_id_lists):
+        """
+        Params:
+            bot_ids (numpy array, pyarrow.Array, or list) like the "bot_id" column
+            follower_id_lists (pyarrow.ListArray, or list of lists) like the "follower_ids" column
+        """
+        follower_id_lists = to_list_array(follower_id_lists)
+        if len(follower_id_lists) == 0:
+            return
+
+        self.bots.append(self.bot_index.encode(bot_ids))
+        self.lengths.append(to_array(pc.fill_null(pc.list_value_length(follower_id_lists), 0)).astype(np.int64))
+        flat_ids = pc.list_flatten(follower_id_lists)
+        if len(flat_ids) > 0:
+            unique_ids, codes = dictionary_encode(flat_ids)
+            self.followers.append(self.follower_index.encode(unique_ids)[codes])
+        self.edge_count += len(flat_ids)
+
+    def append_record_batch(self, record_batch, bot_column="bot_id", followers_column="follower_ids"):
+        """Param: record_batch (pyarrow.RecordBatch)"""
+        self.append_lists(record_batch.column(bot_column), record_batch.column(followers_column))
+
+    def to_bipartite_graph(self):
+        bot_ranks = self.bot_index.ranks
+        follower_ranks = self.follower_index.ranks
+        bots = bot_ranks[np.concatenate(self.bots)] if self.bots else np.array([], dtype=np.int32)
+        lengths = np.concatenate(self.lengths) if self.lengths else np.array([], dtype=np.int64)
+        followers = follower_ranks[np.concatenate(self.followers)] if self.followers else np.array([], dtype=np.int32)
+
+        matrix = segments_to_csr(bots, lengths, followers, shape=(len(bot_ranks), len(follower_ranks)), dtype=np.int32)
+        matrix.data[:] = 1 # following a bot twice is still following it
+        return BipartiteGraph(bot_ids=self.bot_index.sorted_ids, follower_ids=self.follower_index.sorted_ids, followers=matrix)
+
+
+if __name__ == "__main__":
+
+    graph = BipartiteGraph.from_lists([1, 2, 3], [[10, 11, 12], [11, 12], [13]])
+    pprint(graph.metadata)
+    print("FOLLOWERS OF BOTS 1 AND 3:", graph.followers_of([1, 3]).tolist())
+    print("BOTS FOLLOWED BY USER 11:", graph.bots_followed_by(11).tolist())
+    bot_ids, overlap = graph.follower_overlap()
+    print("FOLLOWER OVERLAP:", bot_ids.tolist())
+    print(overlap.toarray())
+    print("SHARED FOLLOWERS OF BOTS 1 AND 2:", fmt_n(graph.shared_followers(1, 2)))
@@ -0,0 +1,297 @@
+from pprint import pprint
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from networkx import DiGraph
+
+from app.decorators.number_decorators import fmt_n
+
+class DegreeView:
+    def __init__(self, node_ids, values):
+        """
+        The degree of each node, which can be iterated over or looked up by node like a networkx DegreeView.
+
+        Params:
+            node_ids (numpy array) the sorted node ids
+            values (numpy array) the degree of each node, in the same order
+        """
+        self.node_ids = node_ids
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return zip(self.node_ids.tolist(), self.values.tolist())
+
+    def __getitem__(self, node):
+        return self.values[node_index(self.node_ids, node)].item()
+
+def node_index(node_ids, node):
+    """Returns the position of the given node in the sorted node ids, or raises a KeyError."""
+    i = np.searchsorted(node_ids, node)
+    if i >= len(node_ids) or node_ids[i] != node:
+        raise KeyError(node)
+    return int(i)
+
+def attribute_array(values):
+    """Converts node attribute values to a numeric, boolean, or string array (which can all be saved without pickling)."""
+    values = np.asarray(values)
+    if values.dtype.kind == "u":
+        return values.astype(np.int64)
+    if values.dtype.kind not in ["f", "i", "b"]:
+        return values.astype(str)
+    return values
+
+def missing_value(dtype):
+    """The value of a node attribute for nodes which weren't given one."""
+    if dtype.kind == "f":
+        return np.nan
+    if dtype.kind == "i":
+        return -1
+    if dtype.kind == "b":
+        return False
+    return ""
+
+ATTRIBUTE_PREFIX = "node_attribute:" # distinguishes the node attribute arrays in a saved graph
+
+def save_arrays(filepath, node_ids, indptr, indices, weights, weight_attr="weight", user_indices=None, node_attributes=None, attributed=None):
+    """
+    Writes the arrays of a compact graph to a (.npz) file.
+    Accepts memory-mapped arrays, which get written in chunks (see app/compact_graphs/external_sort.py).
+    """
+    arrays = {"node_ids": node_ids, "indptr": indptr, "indices": indices, "weights": weights}
+    if user_indices is not None:
+        arrays["user_indices"] = user_indices
+    if node_attributes:
+        arrays["attributed"] = attributed
+        for name, values in node_attributes.items():
+            arrays[ATTRIBUTE_PREFIX + name] = values
+    np.savez(filepath, weight_attr=weight_attr or "", **arrays)
+
+class CompactGraph:
+    def __init__(self, node_ids, out_edges, weight_attr="weight"):
+        """
+        A weighted directed graph stored as integer-indexed arrays, which takes a small fraction of the memory of a networkx DiGraph.
+
+        Each user id is interned as its position in the sorted array of node ids (an int32),
+            and the edges are stored in compressed sparse row (CSR) format, so each edge costs an int32 index and a float32 weight.
+
+        Use CompactGraph.from_edges() to construct one, or CompactGraph.from_networkx() to convert an existing graph.
+
+        Params:
+            node_ids (numpy array) the sorted, unique user ids (ints or strings)
+            out_edges (scipy.sparse.csr_matrix) where row i holds the weights of the edges from node i
+            weight_attr (str) the name of the edge weight attribute, for conversion to networkx (or None for unweighted graphs)
+        """
+        self.node_ids = node_ids
+        self.out_edges = out_edges
+        self.weight_attr = weight_attr
+        self.reverse_edges = None
+        self.user_indices = None # the index of each node in the shared user dictionary (see app/compact_graphs/user_dictionary.py), once assigned
+        self.node_attributes = {} # arrays of attribute values (like each user's tweet rate), in the same order as the node ids
+        self.attributed = None # whether each node was given attributes (see set_node_attributes())
+
+    @classmethod
+    def from_edges(cls, sources, targets, weights=None, nodes=None, weight_attr="weight"):
+        """
+        Params:
+            sources (array-like) the user id of each edge's source (like the retweeter)
+            targets (array-like) the user id of each edge's target (like the retweeted user)
+            weights (array-like) optional, defaults to a weight of one for each edge
+            nodes (array-like) optional, any additional user ids to include, even if they don't have any edges
+
+        Duplicate edges get combined, and their weights summed.
+        """
+        sources = np.asarray(sources)
+        targets = np.asarray(targets)
+        weights = np.ones(len(sources), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+
+        node_ids = np.unique(np.concatenate([sources, targets] + ([np.asarray(nodes)] if nodes is not None else [])))
+        n = len(node_ids)
+        rows = np.searchsorted(node_ids, sources).astype(np.int32)
+        cols = np.searchsorted(node_ids, targets).astype(np.int32)
+        out_edges = csr_matrix((weights, (rows, cols)), shape=(n, n), dtype=np.float32) # sums the weights of any duplicate edges
+        return cls(node_ids=node_ids, out_edges=out_edges, weight_attr=weight_attr)
+
+    @classmethod
+    def from_networkx(cls, graph, weight_attr="weight"):
+        """Param: graph (networkx.DiGraph)"""
+        edges = list(graph.edges(data=(weight_attr or False), default=1))
+        return cls.from_edges(
+            sources=[edge[0] for edge in edges],
+            targets=[edge[1] for edge in edges],
+            weights=[edge[2] for edge in edges] if weight_attr else None,
+            nodes=list(graph.nodes),
+            weight_attr=weight_attr
+        )
+
+    def to_networkx(self):
+        """For any code which still needs a networkx DiGraph."""
+        graph = DiGraph()
+        graph.add_nodes_from(self.node_ids.tolist())
+        if self.node_attributes:
+            names = list(self.node_attributes.keys())
+            columns = [self.node_attributes[name][self.attributed].tolist() for name in names]
+            graph.add_nodes_from(zip(self.node_ids[self.attributed].tolist(), [dict(zip(names, values)) for values in zip(*columns)]))
+        sources, targets, weights = self.edge_arrays()
+        if self.weight_attr:
+            graph.add_weighted_edges_from(zip(self.node_ids[sources].tolist(), self.node_ids[targets].tolist(), weights.tolist()), weight=self.weight_attr)
+        else:
+            graph.add_edges_from(zip(self.node_ids[sources].tolist(), self.node_ids[targets].tolist()))
+        return graph
+
+    #
+    # STORAGE
+    #
+
+    def save(self, filepath):
+        """Writes the arrays to a (.npz) file, which loads much faster than a pickled networkx graph."""
+        save_arrays(filepath, node_ids=self.node_ids, indptr=self.out_edges.indptr, indices=self.out_edges.indices, weights=self.out_edges.data,
+            weight_attr=self.weight_attr, user_indices=self.user_indices, node_attributes=self.node_attributes, attributed=self.attributed)
+
+    @classmethod
+    def load(cls, filepath):
+        with np.load(filepath) as arrays:
+            n = len(arrays["node_ids"])
+            out_edges = csr_matrix((arrays["weights"], arrays["indices"], arrays["indptr"]), shape=(n, n))
+            graph = cls(node_ids=arrays["node_ids"], out_edges=out_edges, weight_attr=str(arrays["weight_attr"]) or None)
+            if "user_indices" in arrays:
+                graph.user_indices = arrays["user_indices"]
+            if "attributed" in arrays:
+                graph.attributed = arrays["attributed"]
+                graph.node_attributes = {key[len(ATTRIBUTE_PREFIX):]: arrays[key] for key in arrays.files if key.startswith(ATTRIBUTE_PREFIX)}
+            return graph
+
+    #
+    # NETWORKX-LIKE INTERFACE
+    #
+
+    def __len__(self):
+        return self.number_of_nodes()
+
+    def __contains__(self, node):
+        try:
+            node_index(self.node_ids, node)
+            return True
+        except KeyError:
+            return False
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        return self.out_edges.nnz
+
+    def nodes(self):
+        return self.node_ids.tolist()
+
+    def edges(self):
+        """Yields each edge, like (source id, target id, weight)."""
+        sources, targets, weights = self.edge_arrays()
+        yield from zip(self.node_ids[sources].tolist(), self.node_ids[targets].tolist(), weights.tolist())
+
+    def has_edge(self, source, target):
+        return (source in self and target in self and
+            self.out_edges[node_index(self.node_ids, source), node_index(self.node_ids, target)] != 0)
+
+    def successors(self, node):
+        i = node_index(self.node_ids, node)
+        return self.node_ids[self.out_edges.indices[self.out_edges.indptr[i]:self.out_edges.indptr[i+1]]].tolist()
+
+    def predecessors(self, node):
+        i = node_index(self.node_ids, node)
+        return self.node_ids[self.in_edges.indices[self.in_edges.indptr[i]:self.in_edges.indptr[i+1]]].tolist()
+
+    def out_degree(self, weight=None):
+        """Param: weight (str) if given, sums the edge weights (like networkx) instead of counting the edges"""
+        if weight:
+            return DegreeView(self.node_ids, np.asarray(self.out_edges.sum(axis=1, dtype=np.float64)).ravel())
+        return DegreeView(self.node_ids, np.diff(self.out_edges.indptr))
+
+    def in_degree(self, weight=None):
+        """Param: weight (str) if given, sums the edge weights (like networkx) instead of counting the edges"""
+        if weight:
+            return DegreeView(self.node_ids, np.bincount(self.out_edges.indices, weights=self.out_edges.data.astype(np.float64), minlength=len(self.node_ids)))
+        return DegreeView(self.node_ids, np.bincount(self.out_edges.indices, minlength=len(self.node_ids)))
+
+    #
+    # NODE ATTRIBUTES
+    #
+
+    def set_node_attributes(self, nodes, **attributes):
+        """
+        Stores attributes for the given nodes as arrays in the same order as the node ids, instead of as a dict per node.
+        Nodes without attributes get a missing value (NaN, -1, False, or "", depending on the type).
+
+        Params:
+            nodes (array-like) the ids of the nodes to set attributes for
+            attributes (array-like) the values of each attribute, in the same order as the nodes, like rate=[3, 1]
+        """
+        nodes = np.asarray(nodes)
+        positions = np.searchsorted(self.node_ids, nodes)
+        found = (positions < len(self.node_ids))
+        found[found] = (self.node_ids[positions[found]] == nodes[found])
+        if not found.all():
+            raise KeyError(nodes[~found][0])
+
+        if self.attributed is None:
+            self.attributed = np.zeros(len(self.node_ids), dtype=bool)
+        self.attributed[positions] = True
+
+        for name, values in attributes.items():
+            values = attribute_array(values)
+            if name not in self.node_attributes:
+                self.node_attributes[name] = np.full(len(self.node_ids), missing_value(values.dtype), dtype=values.dtype)
+            elif values.dtype.kind == "U" and values.dtype.itemsize > self.node_attributes[name].dtype.itemsize:
+                self.node_attributes[name] = self.node_attributes[name].astype(values.dtype) # so longer strings don't get truncated
+            self.node_attributes[name][positions] = values
+
+    def node_attribute(self, name, node):
+        """Returns the value of the given attribute for the given node (like graph.nodes[node][name] in networkx)."""
+        return self.node_attributes[name][node_index(self.node_ids, node)].item()
+
+    #
+    # ARRAYS
+    #
+
+    @property
+    def in_edges(self):
+        """The reverse CSR, where row i holds the weights of the edges into node i. Only built if needed."""
+        if self.reverse_edges is None:
+            self.reverse_edges = self.out_edges.transpose().tocsr()
+        return self.reverse_edges
+
+    def edge_arrays(self):
+        """Returns the source index, target index, and weight of each edge, as arrays."""
+        sources = np.repeat(np.arange(len(self.node_ids), dtype=np.int32), np.diff(self.out_edges.indptr))
+        return sources, self.out_edges.indices, self.out_edges.data
+
+    def user_edge_arrays(self):
+        """
+        Returns the edges in terms of the shared user dictionary indices (instead of this graph's own node indices),
+            so the edges of graphs from different periods can be compared directly.
+        """
+        if self.user_indices is None:
+            raise ValueError("EXPECTING USER INDICES. PLEASE SAVE THE GRAPH FIRST, OR ASSIGN THEM VIA UserDictionary.commit()")
+        sources, targets, weights = self.edge_arrays()
+        return self.user_indices[sources], self.user_indices[targets], weights
+
+    @property
+    def nbytes(self):
+        arrays = [self.node_ids, self.out_edges.indptr, self.out_edges.indices, self.out_edges.data]
+        return sum([array.nbytes for array in arrays])
+
+    @property
+    def metadata(self):
+        return {"nodes": self.number_of_nodes(), "edges": self.number_of_edges(), "nbytes": self.nbytes}
+
+
+if __name__ == "__main__":
+
+    from conftest import compile_mock_rt_graph
+
+    graph = CompactGraph.from_networkx(compile_mock_rt_graph(), weight_attr="rt_count")
+    pprint(graph.metadata)
+    for source, target, weight in graph.edges():
+        print(source, "->", target, "|", fmt_n(weight))
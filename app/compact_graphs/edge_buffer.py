@@ -0,0 +1,235 @@
+from pprint import pprint
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from scipy.sparse import csr_matrix
+
+from app.decorators.number_decorators import fmt_n
+from app.compact_graphs.compact_graph import CompactGraph
+
+INITIAL_CAPACITY = 1_000_000
+
+def to_array(values):
+    """Converts an arrow array (or list) to a numpy array, without copying where possible."""
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = values.to_numpy(zero_copy_only=False)
+    values = np.asarray(values)
+    if values.dtype == object:
+        return values.astype(str) # fixed-width strings sort and search much faster than python string objects
+    return values
+
+def flatten_lists(lists):
+    """
+    Returns the flattened values of a list column, and the length of each list.
+
+    Param: lists (pyarrow.ListArray, or list of lists) like the "friend_names" or "follower_ids" column
+    """
+    if isinstance(lists, pa.ChunkedArray):
+        lists = lists.combine_chunks()
+    if isinstance(lists, pa.Array):
+        lengths = pc.fill_null(pc.list_value_length(lists), 0)
+        return to_array(pc.list_flatten(lists)), to_array(lengths)
+    lengths = np.fromiter((len(values or []) for values in lists), dtype=np.int64, count=len(lists))
+    flat_values = [value for values in lists for value in (values or [])]
+    return to_array(flat_values), lengths
+
+def merge_sorted(ids, indices, other_ids, other_indices):
+    """Merges two sorted runs of (distinct) ids, and their indices, in a single pass over the longer run."""
+    if len(ids) == 0:
+        return other_ids, other_indices
+    positions = np.searchsorted(ids, other_ids) + np.arange(len(other_ids)) # where each of the other ids ends up
+    others = np.zeros(len(ids) + len(other_ids), dtype=bool)
+    others[positions] = True
+
+    merged_ids = np.empty(len(others), dtype=np.result_type(ids, other_ids))
+    merged_ids[positions] = other_ids
+    merged_ids[~others] = ids
+    merged_indices = np.empty(len(others), dtype=np.int32)
+    merged_indices[positions] = other_indices
+    merged_indices[~others] = indices
+    return merged_ids, merged_indices
+
+class NodeIndex:
+    def __init__(self):
+        """
+        Assigns each user id (or screen name) a dense integer index, in the order they were first seen.
+
+        Looks up whole arrays of ids at once, by binary search over sorted copies of the ids, instead of one dict lookup per id.
+
+        The new ids from each batch get added as a sorted run of their own, and runs get merged whenever the newest run
+            is at least half as long as the one before it (like a binary counter), so each id only gets merged a logarithmic number of times,
+            instead of the whole index getting re-sorted for every batch with a new id.
+        """
+        self.runs = [] # pairs of sorted ids and their indices, from longest to shortest
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def compact(self):
+        """Merges all the runs into one."""
+        while len(self.runs) > 1:
+            self.runs.append(merge_sorted(*self.runs.pop(-2), *self.runs.pop()))
+
+    def reset(self, sorted_ids, sorted_indices):
+        """Replaces the contents with the given sorted ids and their indices (like ones loaded from a file)."""
+        self.runs = [(sorted_ids, sorted_indices)] if len(sorted_ids) else []
+        self.count = len(sorted_ids)
+
+    @property
+    def sorted_ids(self):
+        self.compact()
+        return self.runs[0][0] if self.runs else np.array([], dtype=np.int64)
+
+    @property
+    def sorted_indices(self):
+        """The index of each of the sorted ids."""
+        self.compact()
+        return self.runs[0][1] if self.runs else np.array([], dtype=np.int32)
+
+    @property
+    def node_ids(self):
+        """The ids, in index order."""
+        sorted_ids = self.sorted_ids
+        node_ids = np.empty(len(sorted_ids), dtype=sorted_ids.dtype)
+        node_ids[self.sorted_indices] = sorted_ids
+        return node_ids
+
+    @property
+    def ranks(self):
+        """The position of each index's id among the sorted ids (which is how compact graphs index their nodes)."""
+        ranks = np.empty(len(self), dtype=np.int32)
+        ranks[self.sorted_indices] = np.arange(len(self), dtype=np.int32)
+        return ranks
+
+    def lookup(self, ids):
+        """Returns the index of each of the given ids, or -1 for ids which haven't been seen."""
+        ids = to_array(ids)
+        indices = np.full(len(ids), -1, dtype=np.int32)
+        for run_ids, run_indices in self.runs:
+            positions = np.searchsorted(run_ids, ids)
+            positions[positions == len(run_ids)] = 0
+            found = run_ids[positions] == ids
+            indices[found] = run_indices[positions[found]]
+        return indices
+
+    def encode(self, ids):
+        """Returns the index of each of the given ids, assigning new indices to any which haven't been seen."""
+        ids = to_array(ids)
+        unique_ids, first_positions, inverse = np.unique(ids, return_index=True, return_inverse=True)
+        unique_indices = self.lookup(unique_ids)
+
+        new = np.flatnonzero(unique_indices == -1)
+        if len(new):
+            first_seen = new[np.argsort(first_positions[new], kind="stable")]
+            unique_indices[first_seen] = np.arange(self.count, self.count + len(new), dtype=np.int32)
+            self.runs.append((unique_ids[new], unique_indices[new])) # already sorted
+            self.count += len(new)
+            while len(self.runs) > 1 and len(self.runs[-2][0]) < 2 * len(self.runs[-1][0]):
+                self.runs.append(merge_sorted(*self.runs.pop(-2), *self.runs.pop()))
+
+        return unique_indices[inverse.ravel()]
+
+class EdgeBuffer:
+    def __init__(self, node_index=None, capacity=INITIAL_CAPACITY):
+        """
+        Accumulates edges from whole columns of query results at a time, for assembling a graph in one shot at the end.
+
+        Stores each edge as a pair of int32 node indices and a float32 weight, in arrays which double in size as needed.
+
+        Params:
+            node_index (NodeIndex) optional, for sharing node indices with another buffer
+            capacity (int) the initial number of edges to make room for
+        """
+        self.node_index = node_index or NodeIndex()
+        self.sources = np.empty(int(capacity), dtype=np.int32)
+        self.targets = np.empty(int(capacity), dtype=np.int32)
+        self.weights = np.empty(int(capacity), dtype=np.float32)
+        self.edge_count = 0
+
+    @property
+    def node_count(self):
+        return len(self.node_index)
+
+    @property
+    def metadata(self):
+        return {"nodes": self.node_count, "edges": self.edge_count}
+
+    def reserve(self, n):
+        """Grows the arrays (at least doubling them) if there isn't room for another n edges."""
+        required = self.edge_count + n
+        if required <= len(self.sources):
+            return
+        capacity = max(required, len(self.sources) * 2)
+        for attr in ["sources", "targets", "weights"]:
+            grown = np.empty(capacity, dtype=getattr(self, attr).dtype)
+            grown[0:self.edge_count] = getattr(self, attr)[0:self.edge_count]
+            setattr(self, attr, grown)
+
+    def append(self, sources, targets, weights=None):
+        """
+        Params:
+            sources (numpy array, pyarrow.Array, or list) the id of each edge's source
+            targets (numpy array, pyarrow.Array, or list) the id of each edge's target
+            weights (numpy array, pyarrow.Array, or list) optional, defaults to a weight of one for each edge
+        """
+        sources = to_array(sources)
+        targets = to_array(targets)
+        n = len(sources)
+        if n == 0:
+            return
+
+        indices = self.node_index.encode(np.concatenate([sources, targets]))
+        self.reserve(n)
+        self.sources[self.edge_count:self.edge_count + n] = indices[0:n]
+        self.targets[self.edge_count:self.edge_count + n] = indices[n:]
+        self.weights[self.edge_count:self.edge_count + n] = 1 if weights is None else to_array(weights)
+        self.edge_count += n
+
+    def append_lists(self, ids, id_lists, reverse=False):
+        """
+        Adds an edge from each id to each of the ids in its corresponding list.
+
+        Params:
+            ids (numpy array, pyarrow.Array, or list) like the "screen_name" column
+            id_lists (pyarrow.ListArray, or list of lists) like the "friend_names" column
+            reverse (bool) whether the edges point from each id in the list instead (like from each follower to the bot)
+        """
+        flat_ids, lengths = flatten_lists(id_lists)
+        repeated_ids = np.repeat(to_array(ids), lengths)
+        if reverse:
+            self.append(flat_ids, repeated_ids)
+        else:
+            self.append(repeated_ids, flat_ids)
+
+    def append_record_batch(self, record_batch, source_column, target_column, weight_column=None):
+        """Param: record_batch (pyarrow.RecordBatch)"""
+        weights = record_batch.column(weight_column) if weight_column else None
+        self.append(record_batch.column(source_column), record_batch.column(target_column), weights)
+
+    def to_compact_graph(self, weight_attr="weight"):
+        """Assembles the buffered edges into a graph (summing the weights of any duplicate edges)."""
+        # the compact graph indexes nodes by their sorted position, rather than the order they were first seen:
+        n = len(self.node_index)
+        ranks = self.node_index.ranks
+
+        sources = ranks[self.sources[0:self.edge_count]]
+        targets = ranks[self.targets[0:self.edge_count]]
+        out_edges = csr_matrix((self.weights[0:self.edge_count], (sources, targets)), shape=(n, n), dtype=np.float32)
+        return CompactGraph(node_ids=self.node_index.sorted_ids, out_edges=out_edges, weight_attr=weight_attr)
+
+    def to_networkx(self, weight_attr="weight"):
+        """For graphers which still store networkx graphs."""
+        return self.to_compact_graph(weight_attr=weight_attr).to_networkx()
+
+
+if __name__ == "__main__":
+
+    buffer = EdgeBuffer()
+    buffer.append_lists(["A", "B", "C", "D", "E"], [["B", "C", "D"], ["C", "D"], ["D"], ["C"], ["F"]])
+    pprint(buffer.metadata)
+
+    graph = buffer.to_compact_graph()
+    for source, target, weight in graph.edges():
+        print(source, "->", target, "|", fmt_n(weight))
@@ -0,0 +1,233 @@
+import os
+import shutil
+import tempfile
+from pprint import pprint
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app import DATA_DIR
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+from app.compact_graphs.edge_buffer import NodeIndex, flatten_lists, to_array
+from app.compact_graphs.compact_graph import save_arrays
+
+load_dotenv()
+
+EXTERNAL_SORT_MEMORY_MB = int(os.getenv("EXTERNAL_SORT_MEMORY_MB", default="1024")) # the approximate peak memory to use for edges (excludes the node ids)
+EXTERNAL_SORT_DIRPATH = os.getenv("EXTERNAL_SORT_DIRPATH", default=os.path.join(DATA_DIR, "external_sort")) # where to write the temporary sorted runs
+
+KEY_BYTES = 16 # each edge is stored as an int64 key, and sorting needs a copy
+
+def edge_keys(sources, targets):
+    """Packs each pair of int32 node indices into a single int64 key, which sorts by source then target."""
+    return (sources.astype(np.int64) << 32) | targets.astype(np.int64)
+
+def merge_sorted_runs(runs, block_size):
+    """
+    Merges any number of sorted, deduplicated arrays (like memory-mapped runs) into a single sorted stream, without duplicates.
+    Reads a block of each run at a time, so memory is bounded by len(runs) * block_size.
+
+    Yields sorted arrays of keys.
+
+    Params:
+        runs (list of numpy array)
+        block_size (int) the number of keys to read from each run at a time
+    """
+    positions = [0] * len(runs)
+    last_key = None
+    while True:
+        blocks = [(i, run[positions[i]:positions[i] + block_size]) for i, run in enumerate(runs) if positions[i] < len(run)]
+        if not blocks:
+            break
+
+        # everything up to the smallest of the blocks' largest keys is safe to emit, since any smaller keys would have been in those blocks:
+        cutoff = min([block[-1] for _, block in blocks])
+        merged = []
+        for i, block in blocks:
+            n = int(np.searchsorted(block, cutoff, side="right"))
+            merged.append(np.asarray(block[0:n]))
+            positions[i] += n
+
+        keys = np.unique(np.concatenate(merged))
+        if last_key is not None and len(keys) and keys[0] == last_key:
+            keys = keys[1:]
+        if len(keys):
+            last_key = keys[-1]
+            yield keys
+
+class ExternalGraphBuilder:
+    def __init__(self, memory_mb=EXTERNAL_SORT_MEMORY_MB, tmp_dirpath=EXTERNAL_SORT_DIRPATH):
+        """
+        Builds a compact (CSR) graph from more edges than fit in memory, via an external sort:
+            1. buffers the edges (as int64 keys) until the memory limit, then writes them to disk as a sorted, deduplicated run
+            2. merges all the runs
+            3. writes the graph arrays as the merged edges stream by, without holding them all in memory at once
+
+        The node ids are kept in memory, since there are far fewer nodes than edges.
+        Duplicate edges are dropped (the graph is unweighted).
+
+        Params:
+            memory_mb (int or float) the approximate peak memory to use for edges
+            tmp_dirpath (str) where to write the sorted runs (which get removed after the build)
+        """
+        self.memory_mb = memory_mb
+        self.max_keys = max(1, int(self.memory_mb * 1024 * 1024) // KEY_BYTES)
+
+        if not os.path.exists(tmp_dirpath):
+            os.makedirs(tmp_dirpath)
+        self.runs_dirpath = tempfile.mkdtemp(dir=tmp_dirpath)
+
+        self.node_index = NodeIndex()
+        self.buffer = np.empty(self.max_keys, dtype=np.int64)
+        self.buffered = 0
+        self.run_filepaths = []
+        self.edge_count = 0 # including duplicates
+
+        print("-------------------------")
+        print("EXTERNAL GRAPH BUILDER...")
+        print("  MEMORY MB:", fmt_n(self.memory_mb))
+        print("  RUNS DIRPATH:", os.path.abspath(self.runs_dirpath))
+
+    @property
+    def node_count(self):
+        return len(self.node_index)
+
+    @property
+    def metadata(self):
+        return {"memory_mb": self.memory_mb, "nodes": self.node_count, "edges": self.edge_count, "runs": len(self.run_filepaths)}
+
+    #
+    # INGESTION
+    #
+
+    def append(self, sources, targets):
+        """
+        Params:
+            sources (numpy array, pyarrow.Array, or list) the id of each edge's source
+            targets (numpy array, pyarrow.Array, or list) the id of each edge's target
+        """
+        sources = to_array(sources)
+        targets = to_array(targets)
+        n = len(sources)
+        if n == 0:
+            return
+
+        indices = self.node_index.encode(np.concatenate([sources, targets]))
+        keys = edge_keys(indices[0:n], indices[n:])
+        self.edge_count += n
+
+        offset = 0
+        while offset < n:
+            chunk = keys[offset:offset + self.max_keys - self.buffered]
+            self.buffer[self.buffered:self.buffered + len(chunk)] = chunk
+            self.buffered += len(chunk)
+            offset += len(chunk)
+            if self.buffered == self.max_keys:
+                self.flush()
+
+    def append_lists(self, ids, id_lists):
+        """
+        Adds an edge from each id to each of the ids in its corresponding list.
+
+        Params:
+            ids (numpy array, pyarrow.Array, or list) like the "screen_name" column
+            id_lists (pyarrow.ListArray, or list of lists) like the "friend_names" column
+        """
+        flat_ids, lengths = flatten_lists(id_lists)
+        self.append(np.repeat(to_array(ids), lengths), flat_ids)
+
+    def flush(self):
+        """Writes the buffered edges to disk, as a sorted run without duplicates."""
+        if self.buffered == 0:
+            return
+        run = np.unique(self.buffer[0:self.buffered])
+        filepath = os.path.join(self.runs_dirpath, f"run_{len(self.run_filepaths)}.npy")
+        np.save(filepath, run)
+        self.run_filepaths.append(filepath)
+        self.buffered = 0
+        print(logstamp(), "WROTE RUN", len(self.run_filepaths), "|", fmt_n(len(run)), "EDGES")
+
+    #
+    # ASSEMBLY
+    #
+
+    def rekey_runs(self):
+        """
+        The graph indexes nodes by their sorted position, which isn't known until all the nodes have been seen,
+            so once they have, re-sorts each run (one at a time) in terms of those positions.
+        """
+        n = len(self.node_index)
+        ranks = np.empty(n, dtype=np.int64)
+        ranks[self.node_index.sorted_indices] = np.arange(n, dtype=np.int64)
+        for filepath in self.run_filepaths:
+            run = np.load(filepath)
+            run = np.sort((ranks[run >> 32] << 32) | ranks[run & 0xFFFFFFFF])
+            np.save(filepath, run)
+            del run
+
+    def build(self, filepath, weight_attr=None):
+        """
+        Writes the graph to a (.npz) file, which CompactGraph.load() can read.
+
+        Params:
+            filepath (str) like "data/graphs/friends/graph.npz"
+
+        Returns the number of (unique) edges.
+        """
+        self.flush()
+        self.buffer = None # frees the memory for the merge
+        print(logstamp(), "RE-KEYING", len(self.run_filepaths), "RUNS...")
+        self.rekey_runs()
+
+        print(logstamp(), "MERGING RUNS...")
+        n = len(self.node_index)
+        runs = [np.load(run_filepath, mmap_mode="r") for run_filepath in self.run_filepaths]
+        block_size = max(1, self.max_keys // (2 * max(1, len(runs))))
+        counts = np.zeros(n, dtype=np.int64)
+        indices_filepath = os.path.join(self.runs_dirpath, "indices.bin")
+        weights_filepath = os.path.join(self.runs_dirpath, "weights.bin")
+        edge_count = 0
+        with open(indices_filepath, "wb") as indices_file, open(weights_filepath, "wb") as weights_file:
+            for keys in merge_sorted_runs(runs, block_size=block_size):
+                sources = keys >> 32
+                counts += np.bincount(sources, minlength=n)
+                indices_file.write((keys & 0xFFFFFFFF).astype(np.int32).tobytes())
+                weights_file.write(np.ones(len(keys), dtype=np.float32).tobytes())
+                edge_count += len(keys)
+        del runs
+
+        print(logstamp(), "WRITING GRAPH...", fmt_n(n), "NODES |", fmt_n(edge_count), "EDGES")
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        if edge_count:
+            indices = np.memmap(indices_filepath, dtype=np.int32, mode="r", shape=(edge_count,))
+            weights = np.memmap(weights_filepath, dtype=np.float32, mode="r", shape=(edge_count,))
+        else:
+            indices = np.array([], dtype=np.int32)
+            weights = np.array([], dtype=np.float32)
+        save_arrays(filepath, node_ids=self.node_index.sorted_ids, indptr=indptr, indices=indices, weights=weights, weight_attr=weight_attr)
+        del indices, weights
+
+        self.cleanup()
+        return edge_count
+
+    def cleanup(self):
+        shutil.rmtree(self.runs_dirpath, ignore_errors=True)
+        self.run_filepaths = []
+
+
+if __name__ == "__main__":
+
+    from conftest import TMP_DATA_DIR
+    from app.compact_graphs.compact_graph import CompactGraph
+
+    builder = ExternalGraphBuilder(memory_mb=1)
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        builder.append(rng.integers(0, 100_000, 100_000), rng.integers(0, 100_000, 100_000))
+    pprint(builder.metadata)
+
+    filepath = os.path.join(TMP_DATA_DIR, "external_graph.npz")
+    builder.build(filepath)
+    pprint(CompactGraph.load(filepath).metadata)
+    os.remove(filepath)
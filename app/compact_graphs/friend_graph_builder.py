@@ -0,0 +1,166 @@
+from pprint import pprint
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from scipy.sparse import csr_matrix
+
+from app.decorators.number_decorators import fmt_n
+from app.compact_graphs.edge_buffer import NodeIndex, to_array
+from app.compact_graphs.compact_graph import CompactGraph
+
+def to_list_array(id_lists):
+    """Param: id_lists (pyarrow.ListArray, or list of lists) like the "friend_names" column"""
+    if isinstance(id_lists, pa.ChunkedArray):
+        return id_lists.combine_chunks()
+    if isinstance(id_lists, pa.Array):
+        return id_lists
+    return pa.array([values or [] for values in id_lists])
+
+def dictionary_encode(values):
+    """
+    Returns the unique values (as a numpy array), and the position of each value in them.
+    So any further work on the values (like looking up their node indices) only happens once per unique value.
+
+    Param: values (pyarrow.Array)
+    """
+    encoded = pc.dictionary_encode(values)
+    return to_array(encoded.dictionary), encoded.indices.to_numpy(zero_copy_only=False)
+
+def segments_to_csr(rows, lengths, columns, shape, dtype=np.float32):
+    """
+    Assembles a sparse matrix from segments of column indices, like each user's list of friends,
+        by moving each segment into the position of its row (instead of sorting every entry).
+    Any segments for the same row get combined, and any duplicate entries summed.
+
+    Params:
+        rows (numpy array) the row index of each segment
+        lengths (numpy array) the number of entries in each segment
+        columns (numpy array) the column index of each entry, segment after segment
+        shape (tuple) the (rows, columns) of the matrix
+    """
+    order = np.argsort(rows, kind="stable")
+    previous_starts = np.cumsum(lengths) - lengths
+    ordered_lengths = lengths[order]
+    ordered_starts = np.cumsum(ordered_lengths) - ordered_lengths
+    positions = np.arange(len(columns), dtype=np.int64) + np.repeat(previous_starts[order] - ordered_starts, ordered_lengths)
+    indices = columns[positions]
+    del positions
+
+    counts = np.bincount(rows, weights=lengths, minlength=shape[0]).astype(np.int64)
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    matrix = csr_matrix((np.ones(len(indices), dtype=dtype), indices, indptr), shape=shape)
+    matrix.sum_duplicates()
+    return matrix
+
+class FriendGraphBuilder:
+    def __init__(self, nodes=None, restrict=False):
+        """
+        Assembles a (compact) friend graph directly from columns of friend lists, like the "friend_names" column of the user_friends table,
+            without creating any python objects per edge.
+
+        Each batch of friend lists gets flattened, and its screen names dictionary-encoded, so each distinct name only gets looked up once per batch.
+        Then each user's friends are kept together (as a segment of the flat array), so the rows of the CSR adjacency matrix can be laid out directly.
+
+        Params:
+            nodes (array-like) optionally, the ids of users to include in the graph, even if they don't have any friends
+            restrict (bool) whether to exclude all other users (and their edges), like for daily active user graphs
+        """
+        if restrict and nodes is None:
+            raise ValueError("EXPECTING NODES TO RESTRICT THE GRAPH TO")
+
+        self.node_index = NodeIndex()
+        if nodes is not None:
+            self.node_index.encode(nodes)
+        self.restrict = (restrict == True)
+
+        self.sources = [] # the node index of each user with friends, per batch
+        self.lengths = [] # the number of friends of each of those users, per batch
+        self.targets = [] # the node index of each of those friends, per batch
+        self.edge_count = 0 # including any duplicates
+
+    @property
+    def node_count(self):
+        return len(self.node_index)
+
+    @property
+    def metadata(self):
+        return {"nodes": self.node_count, "edges": self.edge_count, "restrict": self.restrict}
+
+    def encode(self, values):
+        """Returns the node index of each value (or -1 for those excluded by the restriction)."""
+        return self.node_index.lookup(values) if self.restrict else self.node_index.encode(values)
+
+    def append_lists(self, ids, id_lists):
+        """
+        Adds an edge from each user to each of their friends.
+
+        Params:
+            ids (numpy array, pyarrow.Array, or list) like the "screen_name" column
+            id_lists (pyarrow.ListArray, or list of lists) like the "friend_names" column
+        """
+        id_lists = to_list_array(id_lists)
+        if len(id_lists) == 0:
+            return
+
+        sources = self.encode(to_array(ids))
+        lengths = to_array(pc.fill_null(pc.list_value_length(id_lists), 0)).astype(np.int64)
+        flat_ids = pc.list_flatten(id_lists)
+        if len(flat_ids) > 0:
+            unique_ids, codes = dictionary_encode(flat_ids)
+            targets = self.encode(unique_ids)[codes]
+        else:
+            targets = np.array([], dtype=np.int32)
+
+        if self.restrict:
+            # drop the friends outside the subset, and all the friends of users outside it:
+            kept = (targets >= 0) & np.repeat(sources >= 0, lengths)
+            kept_counts = np.concatenate([[0], np.cumsum(kept)])
+            ends = np.cumsum(lengths)
+            lengths = kept_counts[ends] - kept_counts[ends - lengths]
+            targets = targets[kept]
+            rows = (sources >= 0) & (lengths > 0)
+            sources, lengths = sources[rows], lengths[rows]
+
+        self.sources.append(sources.astype(np.int32))
+        self.lengths.append(lengths)
+        self.targets.append(targets.astype(np.int32))
+        self.edge_count += len(targets)
+
+    def append_record_batch(self, record_batch, id_column="screen_name", lists_column="friend_names"):
+        """Param: record_batch (pyarrow.RecordBatch)"""
+        self.append_lists(record_batch.column(id_column), record_batch.column(lists_column))
+
+    def to_compact_graph(self, weight_attr=None):
+        """
+        Lays out each user's friends as a row of the adjacency matrix (combining any rows for the same user, and any duplicate friends).
+        Friend graphs are unweighted by default.
+        """
+        # the compact graph indexes nodes by their sorted position, rather than the order they were first seen:
+        n = len(self.node_index)
+        ranks = self.node_index.ranks
+
+        sources = ranks[np.concatenate(self.sources)] if self.sources else np.array([], dtype=np.int32)
+        lengths = np.concatenate(self.lengths) if self.lengths else np.array([], dtype=np.int64)
+        targets = ranks[np.concatenate(self.targets)] if self.targets else np.array([], dtype=np.int32)
+
+        out_edges = segments_to_csr(sources, lengths, targets, shape=(n, n))
+        if not weight_attr:
+            out_edges.data[:] = 1 # a duplicate friend is still a single edge
+        return CompactGraph(node_ids=self.node_index.sorted_ids, out_edges=out_edges, weight_attr=weight_attr)
+
+    def to_networkx(self, weight_attr=None):
+        """For graphers which still store networkx graphs."""
+        return self.to_compact_graph(weight_attr=weight_attr).to_networkx()
+
+
+if __name__ == "__main__":
+
+    builder = FriendGraphBuilder(nodes=["A", "B", "C", "E"], restrict=True)
+    builder.append_lists(["A", "B", "C", "D", "E"], [["B", "C", "D"], ["C", "D"], ["D"], ["C"], ["F"]])
+    pprint(builder.metadata)
+
+    graph = builder.to_compact_graph()
+    print(graph.nodes())
+    for source, target, weight in graph.edges():
+        print(source, "->", target, "|", fmt_n(weight))
@@ -0,0 +1,144 @@
+import os
+import json
+from pprint import pprint
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from dotenv import load_dotenv
+
+from app.decorators.number_decorators import fmt_n
+from app.compact_graphs.compact_graph import CompactGraph, ATTRIBUTE_PREFIX
+
+load_dotenv()
+
+BINARY_GRAPHS = (os.getenv("BINARY_GRAPHS", default="true") == "true") # whether graphers also store each graph as a binary graph file, which gets loaded instead when present
+
+MAGIC = b"CGRAPH\r\n" # identifies graph files (and detects any newline conversion)
+VERSION = 1 # increment whenever the layout changes in a way older readers can't handle
+ALIGNMENT = 64 # the byte boundary of each array, so they can be memory-mapped with any dtype
+BINARY_GRAPH_FILENAME = "graph.bin"
+
+def aligned(n_bytes):
+    return -(-n_bytes // ALIGNMENT) * ALIGNMENT
+
+def file_array(array):
+    """Strings get stored as fixed-width unicode (which can be memory-mapped), instead of as python objects."""
+    array = np.asarray(array)
+    return array.astype(str) if array.dtype.kind == "O" else array
+
+def write_graph_file(filepath, graph):
+    """
+    Writes a compact graph to a single binary file:
+        a small JSON header (describing the graph and the dtype, shape, and position of each array),
+        followed by the node ids, and the CSR offsets, indices, and weights, each as raw array bytes.
+
+    Unlike a (.npz) file, any of the arrays can then be memory-mapped directly (see read_graph_file()).
+
+    Params:
+        filepath (str) like ".../graph.bin"
+        graph (CompactGraph)
+    """
+    arrays = {
+        "node_ids": file_array(graph.node_ids),
+        "indptr": graph.out_edges.indptr,
+        "indices": graph.out_edges.indices,
+        "weights": graph.out_edges.data
+    }
+    if graph.user_indices is not None:
+        arrays["user_indices"] = graph.user_indices
+    if graph.node_attributes:
+        arrays["attributed"] = graph.attributed
+        for name, values in graph.node_attributes.items():
+            arrays[ATTRIBUTE_PREFIX + name] = file_array(values)
+
+    array_headers = {}
+    offset = 0 # from the start of the data section
+    for name, array in arrays.items():
+        array_headers[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += aligned(array.nbytes)
+
+    header = {
+        "version": VERSION,
+        "weight_attr": graph.weight_attr,
+        "nodes": graph.number_of_nodes(),
+        "edges": graph.number_of_edges(),
+        "arrays": array_headers
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    with open(filepath, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, array in arrays.items():
+            np.ascontiguousarray(array).tofile(f)
+            f.write(b"\0" * (data_start + array_headers[name]["offset"] + aligned(array.nbytes) - f.tell()))
+
+def read_header(f):
+    """Returns the header, and the position of the data section, of an open graph file."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("NOT A GRAPH FILE")
+    header_length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+    header = json.loads(f.read(header_length).decode("utf-8"))
+    if header["version"] > VERSION:
+        raise ValueError(f"UNSUPPORTED GRAPH FILE VERSION: {header['version']} (PLEASE UPGRADE TO READ IT)")
+    return header, aligned(len(MAGIC) + 8 + header_length)
+
+def read_graph_header(filepath):
+    """Returns the description of the graph in the given file (like its number of nodes and edges), without reading any arrays."""
+    with open(filepath, "rb") as f:
+        header, _ = read_header(f)
+    return header
+
+def read_graph_file(filepath, mmap=True):
+    """
+    Returns the compact graph in the given file.
+
+    Params:
+        mmap (bool) whether to memory-map the arrays (read-only), so loading takes milliseconds regardless of the size of the graph,
+            and the operating system pages in only the parts of the file which get used (instead of reading it all into memory)
+    """
+    with open(filepath, "rb") as f:
+        header, data_start = read_header(f)
+
+        arrays = {}
+        for name, array_header in header["arrays"].items():
+            dtype = np.dtype(array_header["dtype"])
+            shape = tuple(array_header["shape"])
+            count = int(np.prod(shape))
+            if mmap and count > 0:
+                arrays[name] = np.memmap(filepath, dtype=dtype, mode="r", offset=data_start + array_header["offset"], shape=shape)
+            else:
+                f.seek(data_start + array_header["offset"])
+                arrays[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+
+    n = len(arrays["node_ids"])
+    out_edges = csr_matrix((arrays["weights"], arrays["indices"], arrays["indptr"]), shape=(n, n), copy=False)
+    graph = CompactGraph(node_ids=arrays["node_ids"], out_edges=out_edges, weight_attr=header["weight_attr"])
+    graph.user_indices = arrays.get("user_indices")
+    if "attributed" in arrays:
+        graph.attributed = arrays["attributed"]
+        graph.node_attributes = {name[len(ATTRIBUTE_PREFIX):]: values for name, values in arrays.items() if name.startswith(ATTRIBUTE_PREFIX)}
+    return graph
+
+
+if __name__ == "__main__":
+
+    import time
+    from app import DATA_DIR
+
+    n_nodes, n_edges = 1_000_000, 10_000_000
+    graph = CompactGraph.from_edges(sources=np.random.randint(0, n_nodes, n_edges), targets=np.random.randint(0, n_nodes, n_edges))
+    pprint(graph.metadata)
+
+    filepath = os.path.join(DATA_DIR, "example_graph.bin")
+    write_graph_file(filepath, graph)
+    pprint(read_graph_header(filepath))
+
+    start = time.perf_counter()
+    graph = read_graph_file(filepath)
+    print("LOADED IN", fmt_n(round((time.perf_counter() - start) * 1000, 1)), "MS")
+    print("NODES:", fmt_n(graph.number_of_nodes()), "| EDGES:", fmt_n(graph.number_of_edges()))
+    os.remove(filepath)
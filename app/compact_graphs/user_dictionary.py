@@ -0,0 +1,244 @@
+import os
+import json
+import fcntl
+from uuid import uuid4
+from contextlib import contextmanager
+from pprint import pprint
+
+import numpy as np
+from dotenv import load_dotenv
+from google.api_core.exceptions import PreconditionFailed
+
+from app import DATA_DIR
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+from app.compact_graphs.edge_buffer import NodeIndex, to_array
+
+load_dotenv()
+
+USER_DICTIONARY_DIRPATH = os.getenv("USER_DICTIONARY_DIRPATH", default=os.path.join(DATA_DIR, "user_dictionaries"))
+USER_DICTIONARY_SYNC_RETRIES = int(os.getenv("USER_DICTIONARY_SYNC_RETRIES", default="10")) # the max number of times to retry a commit which conflicts with another machine's
+
+ARRAY_NAMES = ["ids", "sorted_ids", "sorted_indices"]
+
+class DictionaryConflict(Exception):
+    pass
+
+class UserDictionary(NodeIndex):
+    def __init__(self, name="user_ids", dirpath=None, gcs_service=None):
+        """
+        A persistent, append-only mapping of user ids (or screen names) to dense integer indices, shared by all graphs.
+
+        Once a user is assigned an index it never changes, so graphs from different days (or topics)
+            can be merged, diffed and joined by their user indices, as array operations.
+
+        The arrays get memory-mapped on load, so looking up indices doesn't require reading the whole dictionary into memory.
+
+        Given a storage service, the dictionary gets stored alongside the graphs (under "storage/data/user_dictionaries"),
+            so graphs built on different machines share the same indices:
+            each commit pulls the latest version first, and pushes its new users as a new (immutable) version,
+            then points "latest.json" at it, only if no other machine has pushed a version in the meantime (otherwise retries from the latest).
+
+        Params:
+            name (str) "user_ids" or "screen_names", since some graphs are keyed on one and some on the other
+            dirpath (str) the directory containing all the dictionaries (defaults to USER_DICTIONARY_DIRPATH)
+            gcs_service (GoogleCloudStorageService) optionally, for syncing the dictionary (otherwise it's local only)
+        """
+        super().__init__()
+        self.name = name
+        self.local_dirpath = os.path.join(dirpath or USER_DICTIONARY_DIRPATH, name)
+        if not os.path.exists(self.local_dirpath):
+            os.makedirs(self.local_dirpath)
+
+        self.gcs_service = gcs_service
+        self.gcs_dirpath = f"storage/data/user_dictionaries/{name}"
+        self.version = None # the remote version which this dictionary is a copy of (or an extension of, until pushed)
+        self.synced_users = 0 # the number of users in that version
+
+        self.ids = self.sorted_ids # in index order
+        self.load()
+
+    @classmethod
+    def for_ids(cls, ids, **kwargs):
+        """Returns the dictionary for the given kind of ids (strings are screen names)."""
+        name = "screen_names" if to_array(ids).dtype.kind in ["U", "S"] else "user_ids"
+        return cls(name=name, **kwargs)
+
+    @property
+    def metadata(self):
+        return {"name": self.name, "users": len(self), "version": self.version, "synced_users": self.synced_users}
+
+    def filepath(self, array_name):
+        return os.path.join(self.local_dirpath, f"{array_name}.npy")
+
+    @property
+    def metadata_filepath(self):
+        return os.path.join(self.local_dirpath, "metadata.json")
+
+    @property
+    def lock_filepath(self):
+        return os.path.join(self.local_dirpath, "dictionary.lock")
+
+    @contextmanager
+    def locked(self):
+        """Prevents multiple processes (like parallel daily graph builds) from committing at the same time."""
+        with open(self.lock_filepath, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        """Memory-maps the latest saved version, if any."""
+        if not os.path.isfile(self.filepath("ids")):
+            return
+        self.ids = np.load(self.filepath("ids"), mmap_mode="r")
+        self.reset(np.load(self.filepath("sorted_ids"), mmap_mode="r"), np.load(self.filepath("sorted_indices"), mmap_mode="r"))
+        if os.path.isfile(self.metadata_filepath):
+            with open(self.metadata_filepath) as f:
+                metadata = json.load(f)
+            self.version = metadata.get("version")
+            self.synced_users = metadata.get("synced_users", 0)
+
+    def save(self):
+        self.ids = self.node_ids
+        for array_name in ARRAY_NAMES:
+            tmp_filepath = self.filepath(array_name) + f".{os.getpid()}.tmp.npy"
+            np.save(tmp_filepath, getattr(self, array_name))
+            os.replace(tmp_filepath, self.filepath(array_name))
+        self.save_metadata()
+
+    def save_metadata(self):
+        tmp_filepath = self.metadata_filepath + f".{os.getpid()}.tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump(self.metadata, f)
+        os.replace(tmp_filepath, self.metadata_filepath)
+
+    #
+    # SYNCING
+    #
+
+    @property
+    def gcs_latest_filepath(self):
+        return f"{self.gcs_dirpath}/latest.json"
+
+    def gcs_filepath(self, version, array_name):
+        return f"{self.gcs_dirpath}/versions/{version}/{array_name}.npy"
+
+    def read_latest(self):
+        """Returns the latest remote version's metadata, and the generation of the "latest.json" blob (0 if there isn't one yet)."""
+        blob = self.gcs_service.bucket.get_blob(self.gcs_latest_filepath)
+        if blob is None:
+            return None, 0
+        return json.loads(blob.download_as_bytes()), blob.generation
+
+    def pull(self, latest, discard=False):
+        """
+        Replaces the local copy with the given remote version.
+
+        Params:
+            latest (dict) the remote version's metadata (see read_latest())
+            discard (bool) whether to discard any local users which haven't been pushed
+                (otherwise raises, because graphs may have been saved with their indices)
+        """
+        if len(self) > self.synced_users and not discard:
+            raise DictionaryConflict(f"OOPS, THE LOCAL '{self.name.upper()}' DICTIONARY HAS {fmt_n(len(self) - self.synced_users)} USERS WHICH WERE NEVER PUSHED, BUT ANOTHER MACHINE HAS PUSHED VERSION '{latest['version']}' SINCE")
+
+        print(logstamp(), "USER DICTIONARY:", self.name.upper(), "| PULLING VERSION", latest["version"], "|", fmt_n(latest["users"]), "USERS")
+        for array_name in ARRAY_NAMES:
+            tmp_filepath = self.filepath(array_name) + f".{os.getpid()}.tmp.npy"
+            self.gcs_service.download(self.gcs_filepath(latest["version"], array_name), tmp_filepath)
+            os.replace(tmp_filepath, self.filepath(array_name))
+        self.load()
+        self.version = latest["version"]
+        self.synced_users = latest["users"]
+        self.save_metadata()
+
+    def push(self, generation):
+        """Uploads the local copy as a new version, and points "latest.json" at it, unless the remote version has changed since it was read."""
+        version = f"{len(self)}-{uuid4().hex[0:8]}" # unique, even if another machine pushes the same number of users
+        for array_name in ARRAY_NAMES:
+            self.gcs_service.upload(self.filepath(array_name), self.gcs_filepath(version, array_name))
+
+        latest = {"name": self.name, "users": len(self), "version": version}
+        blob = self.gcs_service.bucket.blob(self.gcs_latest_filepath)
+        blob.upload_from_string(json.dumps(latest), content_type="application/json", if_generation_match=generation) # raises PreconditionFailed
+        print(logstamp(), "USER DICTIONARY:", self.name.upper(), "| PUSHED VERSION", version)
+        self.version = version
+        self.synced_users = len(self)
+        self.save_metadata()
+
+    def sync(self, discard=False):
+        """Pulls the latest remote version (if it's different), or pushes any local users which haven't been pushed yet."""
+        latest, generation = self.read_latest()
+        if latest and latest["version"] != self.version:
+            self.pull(latest, discard=discard)
+        elif len(self) > (latest["users"] if latest else 0):
+            self.push(generation)
+
+    #
+    # INDEXING
+    #
+
+    def commit(self, ids):
+        """
+        Returns the index of each of the given ids, assigning and saving new indices for any users not yet in the dictionary.
+
+        Param: ids (array-like) like the node ids of a graph
+        """
+        with self.locked():
+            for attempt in range(0, USER_DICTIONARY_SYNC_RETRIES):
+                self.load() # another process may have committed since this one loaded
+                latest, generation = self.read_latest() if self.gcs_service else (None, 0)
+                if latest and latest["version"] != self.version:
+                    self.pull(latest) # another machine may have committed too
+
+                previous_count = len(self)
+                indices = self.encode(ids)
+                if len(self) > previous_count:
+                    print("USER DICTIONARY:", self.name.upper(), "| NEW USERS:", fmt_n(len(self) - previous_count))
+                    self.save()
+                if not self.gcs_service or len(self) == (latest["users"] if latest else 0):
+                    return indices
+
+                try:
+                    self.push(generation)
+                    return indices
+                except PreconditionFailed:
+                    print(logstamp(), "USER DICTIONARY:", self.name.upper(), "| ANOTHER MACHINE PUSHED FIRST. RETRYING...")
+                    self.pull(self.read_latest()[0], discard=True) # none of the new indices have been returned yet
+        raise DictionaryConflict(f"OOPS, COULDN'T PUSH THE '{self.name.upper()}' DICTIONARY AFTER {USER_DICTIONARY_SYNC_RETRIES} ATTEMPTS")
+
+    def index_graph(self, graph):
+        """
+        Assigns the graph's user indices from its node ids (for graphs which were saved without any).
+
+        Param: graph (CompactGraph)
+        """
+        graph.user_indices = self.commit(graph.node_ids)
+        return graph
+
+    def require(self, indices):
+        """Makes sure the dictionary includes the given user indices (like those of a graph built on another machine), pulling the latest version if not."""
+        indices = np.asarray(indices)
+        if len(indices) == 0 or int(indices.max()) < len(self):
+            return
+        if self.gcs_service:
+            with self.locked():
+                self.load()
+                self.sync()
+        if int(indices.max()) >= len(self):
+            raise ValueError(f"OOPS, USER INDEX {int(indices.max())} ISN'T IN THE '{self.name.upper()}' DICTIONARY ({fmt_n(len(self))} USERS). WAS THE GRAPH'S DICTIONARY PUSHED?")
+
+    def decode(self, indices):
+        """Returns the id of each of the given user indices."""
+        ids = self.ids if len(self.ids) == len(self) else self.node_ids # includes any uncommitted users
+        return np.asarray(ids)[np.asarray(indices)]
+
+
+if __name__ == "__main__":
+
+    for name in ["user_ids", "screen_names"]:
+        dictionary = UserDictionary(name=name)
+        pprint(dictionary.metadata)
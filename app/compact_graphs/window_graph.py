@@ -0,0 +1,120 @@
+from pprint import pprint
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from app.decorators.number_decorators import fmt_n
+from app.compact_graphs.compact_graph import CompactGraph
+from app.compact_graphs.user_dictionary import UserDictionary
+
+class WindowGraph:
+    def __init__(self, user_dictionary=None, weight_attr="weight", gcs_service=None):
+        """
+        The sum of any number of (daily) graphs, like the retweets over a k-day window.
+
+        Holds the summed edge weights in terms of the shared user dictionary indices, which every saved compact graph has,
+            so graphs get added (and subtracted) as sparse matrices, without matching up any user ids.
+        Graphs built on other machines may include users this machine's copy of the dictionary doesn't have yet, in which case it pulls the latest version.
+
+        A sliding window only needs to add the new days and subtract the expired ones (see slide_to()).
+
+        Params:
+            user_dictionary (UserDictionary) optional, for decoding user indices (defaults to the dictionary for the first graph's kind of ids)
+            weight_attr (str) the name of the edge weight attribute for the assembled graphs
+            gcs_service (GoogleCloudStorageService) optionally, for syncing the default dictionary (see UserDictionary)
+        """
+        self.user_dictionary = user_dictionary
+        self.gcs_service = gcs_service
+        self.weight_attr = weight_attr
+        self.edges = csr_matrix((0, 0), dtype=np.float32)
+        self.graphs = {} # the edge arrays of each graph in the window, so they can be subtracted later
+
+    @property
+    def keys(self):
+        return sorted(self.graphs.keys())
+
+    @property
+    def metadata(self):
+        return {"keys": self.keys, "users": self.edges.shape[0], "edges": self.edges.nnz}
+
+    def edge_matrix(self, sources, targets, weights):
+        n = max(self.edges.shape[0], int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1)
+        if n > self.edges.shape[0]:
+            self.edges.resize((n, n)) # the dictionary has grown since the earlier graphs were saved
+        return csr_matrix((weights, (sources, targets)), shape=(n, n), dtype=np.float32)
+
+    def add(self, key, graph):
+        """
+        Params:
+            key (str) identifies the graph, like its date
+            graph (CompactGraph or networkx.DiGraph)
+        """
+        if key in self.graphs:
+            raise ValueError(f"EXPECTING A NEW GRAPH, BUT '{key}' IS ALREADY IN THE WINDOW")
+        if not isinstance(graph, CompactGraph):
+            graph = CompactGraph.from_networkx(graph, weight_attr=self.weight_attr)
+        if self.user_dictionary is None:
+            self.user_dictionary = UserDictionary.for_ids(graph.node_ids, gcs_service=self.gcs_service)
+
+        if graph.user_indices is None:
+            self.user_dictionary.index_graph(graph)
+        else:
+            self.user_dictionary.require(graph.user_indices)
+        self.graphs[key] = graph.user_edge_arrays()
+        self.edges = self.edges + self.edge_matrix(*self.graphs[key])
+
+    def subtract(self, key):
+        """Param: key (str) identifies a graph which was previously added"""
+        self.edges = self.edges - self.edge_matrix(*self.graphs.pop(key))
+        self.edges.eliminate_zeros() # drops the edges which only existed in that graph
+
+    def slide_to(self, keys, load_graph):
+        """
+        Updates the window to include exactly the given graphs, by subtracting any which aren't included
+            and loading and adding any which aren't yet.
+
+        Params:
+            keys (list of str) like the dates in the new window
+            load_graph (function) loads the graph for a given key
+        """
+        for key in self.keys:
+            if key not in keys:
+                self.subtract(key)
+        for key in keys:
+            if key not in self.graphs:
+                self.add(key, load_graph(key))
+
+    def to_compact_graph(self):
+        """Assembles the summed edges into a graph of only the users who have any, in terms of their ids."""
+        edges = self.edges.tocoo()
+        user_indices = np.unique(np.concatenate([edges.row, edges.col]))
+        node_ids = self.user_dictionary.decode(user_indices)
+
+        order = np.argsort(node_ids, kind="stable") # the compact graph indexes nodes by their sorted position
+        ranks = np.empty(len(order), dtype=np.int32)
+        ranks[order] = np.arange(len(order), dtype=np.int32)
+        rows = ranks[np.searchsorted(user_indices, edges.row)]
+        cols = ranks[np.searchsorted(user_indices, edges.col)]
+
+        n = len(node_ids)
+        out_edges = csr_matrix((edges.data, (rows, cols)), shape=(n, n), dtype=np.float32)
+        graph = CompactGraph(node_ids=node_ids[order], out_edges=out_edges, weight_attr=self.weight_attr)
+        graph.user_indices = user_indices[order]
+        return graph
+
+
+if __name__ == "__main__":
+
+    import os
+    from conftest import compile_mock_rt_graph, TMP_DATA_DIR
+
+    graph = CompactGraph.from_networkx(compile_mock_rt_graph(), weight_attr="rt_count")
+    user_dictionary = UserDictionary.for_ids(graph.node_ids, dirpath=os.path.join(TMP_DATA_DIR, "user_dictionaries"))
+    graph.user_indices = user_dictionary.commit(graph.node_ids)
+
+    window = WindowGraph(user_dictionary=user_dictionary)
+    window.add("day_1", graph)
+    window.add("day_2", graph)
+    pprint(window.metadata)
+    for source, target, weight in window.to_compact_graph().edges():
+        print(source, "->", target, "|", fmt_n(weight))
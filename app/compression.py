@@ -0,0 +1,63 @@
+import os
+import gzip
+import shutil
+from pprint import pprint
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COMPRESSION = os.getenv("COMPRESSION", default="gzip") # how to compress files in transit to and from cloud storage ("gzip", "zstd", or "none")
+COMPRESSION_LEVEL = os.getenv("COMPRESSION_LEVEL") # optionally, the compression level (higher is smaller and slower), otherwise the encoding's default
+COMPRESSION_CHUNK_SIZE = 1024 * 1024 # the number of bytes to compress or decompress at a time
+
+ENCODINGS = ["gzip", "zstd"]
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+INCOMPRESSIBLE_EXTENSIONS = [".gz", ".zst", ".zip", ".bz2", ".xz", ".png", ".jpg", ".jpeg", ".gif"] # already compressed, so not worth compressing again
+
+def validate_encoding(encoding):
+    if encoding not in ENCODINGS:
+        raise ValueError(f"OOPS, EXPECTING ONE OF {ENCODINGS}, BUT GOT '{encoding}'")
+
+def is_compressible(filepath):
+    return os.path.splitext(filepath)[-1].lower() not in INCOMPRESSIBLE_EXTENSIONS
+
+def compress_file(source_filepath, destination_filepath, encoding="gzip", level=None):
+    """
+    Compresses a file into another, a chunk at a time (so the file never needs to fit in memory).
+
+    Params:
+        encoding (str) "gzip" or "zstd"
+        level (int) optionally, the compression level
+    """
+    validate_encoding(encoding)
+    level = int(level or DEFAULT_LEVELS[encoding])
+    with open(source_filepath, "rb") as source, open(destination_filepath, "wb") as destination:
+        if encoding == "gzip":
+            with gzip.GzipFile(fileobj=destination, mode="wb", compresslevel=level, mtime=0) as compressor:
+                shutil.copyfileobj(source, compressor, COMPRESSION_CHUNK_SIZE)
+        else:
+            import zstandard # optional, only needed for the "zstd" encoding
+            zstandard.ZstdCompressor(level=level).copy_stream(source, destination, read_size=COMPRESSION_CHUNK_SIZE)
+
+def decompress_file(source_filepath, destination_filepath, encoding="gzip"):
+    """Decompresses a file into another, a chunk at a time."""
+    validate_encoding(encoding)
+    with open(source_filepath, "rb") as source, open(destination_filepath, "wb") as destination:
+        if encoding == "gzip":
+            with gzip.GzipFile(fileobj=source, mode="rb") as decompressor:
+                shutil.copyfileobj(decompressor, destination, COMPRESSION_CHUNK_SIZE)
+        else:
+            import zstandard # optional, only needed for the "zstd" encoding
+            zstandard.ZstdDecompressor().copy_stream(source, destination, read_size=COMPRESSION_CHUNK_SIZE)
+
+
+if __name__ == "__main__":
+
+    from conftest import TEST_DATA_DIR, TMP_DATA_DIR
+
+    source_filepath = os.path.join(TEST_DATA_DIR, "mock_network.csv")
+    compressed_filepath = os.path.join(TMP_DATA_DIR, "mock_network.csv.compressed")
+    compress_file(source_filepath, compressed_filepath, encoding=COMPRESSION, level=COMPRESSION_LEVEL)
+    pprint({"encoding": COMPRESSION, "bytes": os.path.getsize(source_filepath), "compressed_bytes": os.path.getsize(compressed_filepath)})
+    os.remove(compressed_filepath)
@@ -63,3 +63,9 @@ class FileStorage:
     def download_file(self, remote_filepath, local_filepath):
         print(logstamp(), "DOWNLOADING FILE...", remote_filepath)
         self.gcs_service.download(remote_filepath, local_filepath)
+
+    def is_stale(self, local_filepath, remote_filepath):
+        """Whether the local file is missing, or (when online) is an outdated copy of the remote file."""
+        if not os.path.isfile(local_filepath):
+            return True
+        return self.wifi and self.gcs_service.is_stale(remote_filepath, local_filepath)
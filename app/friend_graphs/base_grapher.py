@@ -13,6 +13,10 @@ from app import APP_ENV, DATA_DIR
 from app.decorators.datetime_decorators import logstamp
 from app.decorators.number_decorators import fmt_n
 from app.gcs_service import GoogleCloudStorageService
+from app.resource_monitor import MONITOR
+from app.compact_graphs.compact_graph import CompactGraph
+from app.compact_graphs.user_dictionary import UserDictionary
+from app.compact_graphs.graph_file import write_graph_file, BINARY_GRAPH_FILENAME, BINARY_GRAPHS
 
 load_dotenv()
 
@@ -38,6 +42,8 @@ class BaseGrapher():
         grapher.report()
     """
 
+    weight_attr = None # friend graphs are unweighted, but child classes which build weighted graphs should name their edge weight attribute
+
     def __init__(self, dry_run=DRY_RUN, batch_size=BATCH_SIZE, users_limit=USERS_LIMIT, gcs_service=None, job_id=None):
         """
         Params:
@@ -71,6 +77,7 @@ class BaseGrapher():
         self.local_results_filepath = os.path.join(self.local_dirpath, "results.csv")
         self.local_edges_filepath = os.path.join(self.local_dirpath, "edges.gpickle")
         self.local_graph_filepath = os.path.join(self.local_dirpath, "graph.gpickle")
+        self.local_binary_graph_filepath = os.path.join(self.local_dirpath, BINARY_GRAPH_FILENAME)
 
         self.gcs_service = (gcs_service or GoogleCloudStorageService())
         self.gcs_dirpath = os.path.join("storage", "data", "archived", self.job_id)
@@ -78,6 +85,7 @@ class BaseGrapher():
         self.gcs_results_filepath = os.path.join(self.gcs_dirpath, "results.csv")
         self.gcs_edges_filepath = os.path.join(self.gcs_dirpath, "edges.gpickle")
         self.gcs_graph_filepath = os.path.join(self.gcs_dirpath, "graph.gpickle")
+        self.gcs_binary_graph_filepath = os.path.join(self.gcs_dirpath, BINARY_GRAPH_FILENAME)
 
     @classmethod
     def cautiously_initialized(cls):
@@ -102,7 +110,10 @@ class BaseGrapher():
 
     @property
     def metadata(self):
-        return {"app_env": APP_ENV, "job_id": self.job_id, "dry_run": self.dry_run, "batch_size": self.batch_size}
+        meta = {"app_env": APP_ENV, "job_id": self.job_id, "dry_run": self.dry_run, "batch_size": self.batch_size}
+        if MONITOR.enabled:
+            meta["resources"] = MONITOR.metadata
+        return meta
 
     def start(self):
         print("-----------------")
@@ -137,6 +148,8 @@ class BaseGrapher():
         print(logstamp(), "WRITING RESULTS...")
         df = DataFrame(self.running_results)
         df.to_csv(results_filepath)
+        if MONITOR.enabled:
+            self.write_metadata_to_file() # again, now that it includes the resource usage of the run
 
     def write_edges_to_file(self, edges_filepath=None):
         edges_filepath = edges_filepath or self.local_edges_filepath
@@ -145,10 +158,21 @@ class BaseGrapher():
             pickle.dump(self.edges, pickle_file)
 
     def write_graph_to_file(self, graph_filepath=None):
+        if BINARY_GRAPHS and not graph_filepath:
+            self.write_binary_graph_to_file()
         graph_filepath = graph_filepath or self.local_graph_filepath
         print(logstamp(), "WRITING GRAPH...")
         write_gpickle(self.graph, graph_filepath)
 
+    def write_binary_graph_to_file(self, binary_graph_filepath=None):
+        """Also writes the graph as a memory-mappable binary graph file (see app/compact_graphs/graph_file.py), which the GraphAnalyzer prefers for compact callers."""
+        binary_graph_filepath = binary_graph_filepath or self.local_binary_graph_filepath
+        print(logstamp(), "WRITING BINARY GRAPH...")
+        graph = self.graph if isinstance(self.graph, CompactGraph) else CompactGraph.from_networkx(self.graph, weight_attr=self.weight_attr)
+        if graph.user_indices is None: # so graphs from different jobs (and machines) share user indices
+            UserDictionary.for_ids(graph.node_ids, gcs_service=self.gcs_service).index_graph(graph)
+        write_graph_file(binary_graph_filepath, graph)
+
     def upload_metadata(self):
         print(logstamp(), "UPLOADING JOB METADATA...", self.gcs_metadata_filepath)
         blob = self.gcs_service.upload(self.local_metadata_filepath, self.gcs_metadata_filepath)
@@ -168,6 +192,10 @@ class BaseGrapher():
         print(logstamp(), "UPLOADING GRAPH...", self.gcs_graph_filepath)
         blob = self.gcs_service.upload(self.local_graph_filepath, self.gcs_graph_filepath)
         print(logstamp(), blob)
+        if os.path.isfile(self.local_binary_graph_filepath):
+            print(logstamp(), "UPLOADING BINARY GRAPH...", self.gcs_binary_graph_filepath)
+            blob = self.gcs_service.upload(self.local_binary_graph_filepath, self.gcs_binary_graph_filepath)
+            print(logstamp(), blob)
 
     def sleep(self):
         if APP_ENV == "production":
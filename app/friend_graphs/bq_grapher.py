@@ -1,11 +1,11 @@
 
-from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 
-from app.bq_service import BigQueryService
+from app.bq_service import BigQueryService, ARROW_BATCH_SIZE
 from app.decorators.datetime_decorators import logstamp
 from app.decorators.number_decorators import fmt_n
 from app.friend_graphs.base_grapher import BaseGrapher
+from app.compact_graphs.friend_graph_builder import FriendGraphBuilder
 
 class BigQueryGrapher(BaseGrapher):
 
@@ -20,22 +20,27 @@ class BigQueryGrapher(BaseGrapher):
         #return meta
         return {**super().metadata, **self.bq_service.metadata} # merges dicts
 
-    @profile
+    @monitored
     def perform(self):
-        self.graph = DiGraph()
+        self.graph = None
         self.running_results = []
+        edges = FriendGraphBuilder()
 
-        for row in self.bq_service.fetch_user_friends_in_batches():
-            self.counter += 1
+        for batch in self.bq_service.fetch_user_friends_in_batches(arrow_batch_size=ARROW_BATCH_SIZE):
+            previous_counter = self.counter
+            self.counter += batch.num_rows
 
             if not self.dry_run:
-                self.graph.add_edges_from([(row["screen_name"], friend) for friend in row["friend_names"]])
+                edges.append_lists(batch.column("screen_name"), batch.column("friend_names"))
 
-            if self.counter % self.batch_size == 0:
-                rr = {"ts": logstamp(), "counter": self.counter, "nodes": len(self.graph.nodes), "edges": len(self.graph.edges)}
+            if self.counter // self.batch_size > previous_counter // self.batch_size:
+                rr = {"ts": logstamp(), "counter": self.counter, "nodes": edges.node_count, "edges": edges.edge_count, **MONITOR.snapshot}
                 print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["nodes"]), "|", fmt_n(rr["edges"]))
                 self.running_results.append(rr)
 
+        print(logstamp(), "ASSEMBLING GRAPH...")
+        self.graph = edges.to_networkx(weight_attr=None) # friend graphs are unweighted
+
 if __name__ == "__main__":
 
     grapher = BigQueryGrapher.cautiously_initialized()
@@ -2,7 +2,7 @@
 import pickle
 
 from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 
 from app.decorators.datetime_decorators import logstamp
 from app.decorators.number_decorators import fmt_n
@@ -10,7 +10,7 @@ from app.friend_graphs.bq_grapher import BigQueryGrapher
 
 class BigQueryListGrapher(BigQueryGrapher):
 
-    @profile
+    @monitored
     def perform(self):
         self.start()
         self.write_metadata_to_file()
@@ -25,7 +25,7 @@ class BigQueryListGrapher(BigQueryGrapher):
                 self.edges += [(row["screen_name"], friend) for friend in row["friend_names"]]
 
             if self.counter % self.batch_size == 0:
-                rr = {"ts": logstamp(), "counter": self.counter, "edges": len(self.edges)}
+                rr = {"ts": logstamp(), "counter": self.counter, "edges": len(self.edges), **MONITOR.snapshot}
                 print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["edges"]))
                 self.running_results.append(rr)
 
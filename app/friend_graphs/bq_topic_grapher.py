@@ -2,7 +2,7 @@
 import os
 
 from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 from dotenv import load_dotenv
 
 from app.decorators.datetime_decorators import logstamp
@@ -41,7 +41,7 @@ class BigQueryTopicGrapher(BigQueryGrapher):
             "end_at": self.convo_end_at,
         }}} # merges dicts
 
-    @profile
+    @monitored
     def perform(self):
         self.write_metadata_to_file()
         self.upload_metadata()
@@ -62,7 +62,7 @@ class BigQueryTopicGrapher(BigQueryGrapher):
                 self.graph.add_edges_from([(row["screen_name"], friend) for friend in row["friend_names"]])
 
             if self.counter % self.batch_size == 0:
-                rr = {"ts": logstamp(), "counter": self.counter, "nodes": len(self.graph.nodes), "edges": len(self.graph.edges)}
+                rr = {"ts": logstamp(), "counter": self.counter, "nodes": len(self.graph.nodes), "edges": len(self.graph.edges), **MONITOR.snapshot}
                 print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["nodes"]), "|", fmt_n(rr["edges"]))
                 self.running_results.append(rr)
 
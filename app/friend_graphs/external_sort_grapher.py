@@ -0,0 +1,81 @@
+
+import os
+
+from app.resource_monitor import monitored, MONITOR
+
+from app.bq_service import ARROW_BATCH_SIZE
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+from app.friend_graphs.bq_grapher import BigQueryGrapher
+from app.compact_graphs.external_sort import ExternalGraphBuilder, EXTERNAL_SORT_MEMORY_MB
+from app.compact_graphs.compact_graph import CompactGraph
+
+class ExternalSortGrapher(BigQueryGrapher):
+    """
+    Builds the friend graph for the entire user_friends table, even if all the edges don't fit in memory at once,
+        by sorting them on disk (see app/compact_graphs/external_sort.py).
+
+    Writes a compact graph (graph.npz) instead of a pickled networkx graph.
+    """
+
+    def __init__(self, bq_service=None, gcs_service=None, memory_mb=EXTERNAL_SORT_MEMORY_MB):
+        super().__init__(bq_service=bq_service, gcs_service=gcs_service)
+        self.memory_mb = memory_mb
+        self.local_graph_filepath = os.path.join(self.local_dirpath, "graph.npz")
+        self.gcs_graph_filepath = os.path.join(self.gcs_dirpath, "graph.npz")
+
+    @property
+    def metadata(self):
+        return {**super().metadata, **{"memory_mb": self.memory_mb}}
+
+    @monitored
+    def perform(self):
+        self.graph = None
+        self.running_results = []
+        self.builder = ExternalGraphBuilder(memory_mb=self.memory_mb)
+
+        for batch in self.bq_service.fetch_user_friends_in_batches(arrow_batch_size=ARROW_BATCH_SIZE):
+            previous_counter = self.counter
+            self.counter += batch.num_rows
+
+            if not self.dry_run:
+                self.builder.append_lists(batch.column("screen_name"), batch.column("friend_names"))
+
+            if self.counter // self.batch_size > previous_counter // self.batch_size:
+                rr = {"ts": logstamp(), "counter": self.counter, "nodes": self.builder.node_count, "edges": self.builder.edge_count, **MONITOR.snapshot}
+                print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["nodes"]), "|", fmt_n(rr["edges"]))
+                self.running_results.append(rr)
+
+    def report(self):
+        print("NODES:", fmt_n(self.builder.node_count))
+        print("EDGES (INCLUDING DUPLICATES):", fmt_n(self.builder.edge_count))
+        print("SORTED RUNS:", fmt_n(len(self.builder.run_filepaths) + (1 if self.builder.buffered else 0)))
+
+    def write_graph_to_file(self, graph_filepath=None):
+        """Merges the sorted runs directly into the graph file, without assembling the graph in memory."""
+        graph_filepath = graph_filepath or self.local_graph_filepath
+        print(logstamp(), "WRITING GRAPH...")
+        edge_count = self.builder.build(graph_filepath) # friend graphs are unweighted
+        print(logstamp(), "UNIQUE EDGES:", fmt_n(edge_count))
+
+    def load_graph(self, graph_filepath=None):
+        return CompactGraph.load(graph_filepath or self.local_graph_filepath)
+
+if __name__ == "__main__":
+
+    grapher = ExternalSortGrapher.cautiously_initialized()
+    grapher.write_metadata_to_file()
+    grapher.upload_metadata()
+
+    grapher.start()
+    grapher.perform()
+    grapher.end()
+    grapher.report()
+
+    grapher.write_results_to_file()
+    grapher.upload_results()
+
+    grapher.write_graph_to_file()
+    grapher.upload_graph()
+
+    grapher.sleep()
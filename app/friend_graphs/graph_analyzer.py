@@ -5,11 +5,12 @@ from functools import lru_cache
 
 from networkx import read_gpickle, DiGraph
 from dotenv import load_dotenv
-from memory_profiler import profile
+from app.resource_monitor import monitored
 
 from app import DATA_DIR
 from app.decorators.number_decorators import fmt_n
 from app.friend_graphs.base_grapher import BaseGrapher
+from app.compact_graphs.graph_file import read_graph_file
 
 load_dotenv()
 
@@ -17,7 +18,7 @@ JOB_ID = os.getenv("JOB_ID", default="2020-05-30-0338")
 STORAGE_MODE = os.getenv("STORAGE_MODE", default="local")
 
 class GraphAnalyzer():
-    def __init__(self, job_id=JOB_ID, storage_mode=STORAGE_MODE):
+    def __init__(self, job_id=JOB_ID, storage_mode=STORAGE_MODE, compact=False):
         """
 
         DEPRECATE ME IN FAVOR OF NEW GRAPH STORAGE SERVICE
@@ -27,8 +28,11 @@ class GraphAnalyzer():
             job_id (str) the identifier of a completed job which has produced a corresponding graph object
 
             storage_mode (str) where the graph object file has been stored ("local" or "remote")
+
+            compact (bool) whether the caller can handle a CompactGraph, in which case the binary graph file gets preferred (see load_graph())
         """
         self.storage_mode = storage_mode
+        self.compact = (compact == True)
         self.job_id = job_id
         self.job = BaseGrapher(job_id=self.job_id)
 
@@ -42,25 +46,48 @@ class GraphAnalyzer():
     def graph(self):
         return self.load_graph()
 
-    #@profile
-    def load_graph(self):
+    @monitored
+    def load_graph(self, compact=None):
+        """
+        Prefers the binary graph file, if the job produced one, which loads as a memory-mapped CompactGraph,
+            but only for callers which can handle a CompactGraph (otherwise loads the networkx graph).
+
+        Params:
+            compact (bool) whether a CompactGraph is acceptable (defaults to the analyzer's compact setting)
+        """
+        compact = self.compact if compact is None else compact
         if not os.path.isdir(self.job.local_dirpath):
             print("PREPARING LOCAL DOWNLOAD DIR...")
             os.mkdir(self.job.local_dirpath)
 
-        if self.storage_mode == "local" or os.path.isfile(self.job.local_graph_filepath):
+        if compact and os.path.isfile(self.job.local_binary_graph_filepath):
+            print("LOADING BINARY GRAPH FROM LOCAL FILE...")
+            return read_graph_file(self.job.local_binary_graph_filepath)
+
+        if compact and self.storage_mode == "remote" and self.job.gcs_service.file_exists(self.job.gcs_binary_graph_filepath):
+            print("LOADING BINARY GRAPH FROM REMOTE STORAGE...")
+            self.job.gcs_service.download(self.job.gcs_binary_graph_filepath, self.job.local_binary_graph_filepath)
+            return read_graph_file(self.job.local_binary_graph_filepath)
+
+        if os.path.isfile(self.job.local_graph_filepath):
             print("LOADING GRAPH FROM LOCAL FILE...")
             return read_gpickle(self.job.local_graph_filepath)
 
-        elif self.storage_mode == "remote":
+        if self.storage_mode == "remote":
             print("LOADING GRAPH FROM REMOTE STORAGE...")
             self.job.gcs_service.download(self.job.gcs_graph_filepath, self.job.local_graph_filepath)
             return read_gpickle(self.job.local_graph_filepath)
 
+        if os.path.isfile(self.job.local_binary_graph_filepath):
+            print("LOADING BINARY GRAPH FROM LOCAL FILE (AS NETWORKX)...")
+            return read_graph_file(self.job.local_binary_graph_filepath).to_networkx()
+
+        return read_gpickle(self.job.local_graph_filepath) # raises a FileNotFoundError, like before
+
     def report(self):
         print("GRAPH:", type(self.graph))
-        print("NODES:", fmt_n(len(self.graph.nodes))) # self.graph.number_of_nodes()
-        print("EDGES:", fmt_n(len(self.graph.edges))) # self.graph.number_of_edges()
+        print("NODES:", fmt_n(self.graph.number_of_nodes()))
+        print("EDGES:", fmt_n(self.graph.number_of_edges()))
         #print("SIZE:", fmt_n(self.graph.size())) # same as edges
 
 if __name__ == "__main__":
@@ -1,15 +1,15 @@
 
-from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored
 
 from app.friend_graphs.psycopg_grapher import PsycopgGrapher
+from app.compact_graphs.friend_graph_builder import FriendGraphBuilder
 
 class Grapher(PsycopgGrapher):
 
-    @profile
+    @monitored
     def perform(self):
         self.start()
-        self.graph = DiGraph()
+        edges = FriendGraphBuilder()
         self.cursor.execute(self.sql)
         while True:
             results = self.cursor.fetchmany(size=self.batch_size)
@@ -17,12 +17,8 @@ class Grapher(PsycopgGrapher):
             self.counter += len(results)
             print(self.generate_timestamp(), self.counter)
             if not self.dry_run:
-                for row in results:
-                    user = row["screen_name"]
-                    friends = row["friend_names"]
-                    self.graph.add_node(user)
-                    self.graph.add_nodes_from(friends)
-                    self.graph.add_edges_from([(user, friend) for friend in friends])
+                edges.append_lists([row["screen_name"] for row in results], [row["friend_names"] for row in results])
+        self.graph = edges.to_networkx() # friend graphs are unweighted
         self.end()
 
 
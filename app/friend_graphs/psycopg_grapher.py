@@ -1,13 +1,13 @@
 
 import psycopg2
-from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 
 from app import APP_ENV
 from app.pg_pipeline.models import DATABASE_URL, USER_FRIENDS_TABLE_NAME
 from app.decorators.datetime_decorators import logstamp
 from app.decorators.number_decorators import fmt_n
 from app.friend_graphs.base_grapher import BaseGrapher, DRY_RUN, BATCH_SIZE, USERS_LIMIT
+from app.compact_graphs.friend_graph_builder import FriendGraphBuilder
 
 class PsycopgGrapher(BaseGrapher):
     def __init__(self, dry_run=DRY_RUN, batch_size=BATCH_SIZE, users_limit=USERS_LIMIT,
@@ -29,15 +29,15 @@ class PsycopgGrapher(BaseGrapher):
             query += f"LIMIT {self.users_limit};"
         return query
 
-    @profile
+    @monitored
     def perform(self):
         self.start()
         self.write_metadata_to_file()
         self.upload_metadata()
 
         print(logstamp(), "CONSTRUCTING GRAPH OBJECT...")
-        self.graph = DiGraph()
         self.running_results = []
+        edges = FriendGraphBuilder()
         self.cursor.execute(self.sql)
         while True:
             batch = self.cursor.fetchmany(size=self.batch_size)
@@ -45,15 +45,15 @@ class PsycopgGrapher(BaseGrapher):
             self.counter += len(batch)
 
             if not self.dry_run:
-                for row in batch:
-                    self.graph.add_edges_from([(row["screen_name"], friend) for friend in row["friend_names"]])
+                edges.append_lists([row["screen_name"] for row in batch], [row["friend_names"] for row in batch])
 
-            rr = {"ts": logstamp(), "counter": self.counter, "nodes": len(self.graph.nodes), "edges": len(self.graph.edges)}
+            rr = {"ts": logstamp(), "counter": self.counter, "nodes": edges.node_count, "edges": edges.edge_count, **MONITOR.snapshot}
             print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["nodes"]), "|", fmt_n(rr["edges"]))
             self.running_results.append(rr)
 
         self.cursor.close()
         self.connection.close()
+        self.graph = edges.to_networkx(weight_attr=None) # friend graphs are unweighted
         print(logstamp(), "GRAPH CONSTRUCTED!")
         self.report()
 
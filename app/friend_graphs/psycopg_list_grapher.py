@@ -1,6 +1,6 @@
 
 from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 
 from app.decorators.datetime_decorators import logstamp
 from app.decorators.number_decorators import fmt_n
@@ -9,7 +9,7 @@ from app.friend_graphs.psycopg_grapher import PsycopgGrapher
 
 class Grapher(PsycopgGrapher):
 
-    @profile
+    @monitored
     def perform(self):
         self.edges = []
         self.running_results = []
@@ -25,7 +25,7 @@ class Grapher(PsycopgGrapher):
                 for row in batch:
                     self.edges += [(row["screen_name"], friend) for friend in row["friend_names"]]
 
-            rr = {"ts": logstamp(), "counter": self.counter, "edges": len(self.edges)}
+            rr = {"ts": logstamp(), "counter": self.counter, "edges": len(self.edges), **MONITOR.snapshot}
             print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["edges"]))
             self.running_results.append(rr)
 
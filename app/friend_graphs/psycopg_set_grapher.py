@@ -1,12 +1,12 @@
 
 from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 
 from app.friend_graphs.psycopg_grapher import PsycopgGrapher
 
 class Grapher(PsycopgGrapher):
 
-    @profile
+    @monitored
     def perform(self):
         self.edges = set() # set prevents duplicates
         self.running_results = []
@@ -23,7 +23,7 @@ class Grapher(PsycopgGrapher):
                     friends = row["friend_names"]
                     self.edges.update([(user, friend) for friend in friends])
 
-            rr = {"ts": self.generate_timestamp(), "counter": self.counter, "edges": len(self.edges)}
+            rr = {"ts": self.generate_timestamp(), "counter": self.counter, "edges": len(self.edges), **MONITOR.snapshot}
             print(rr["ts"], "|", self.fmt(rr["counter"]), "|", self.fmt(rr["edges"]))
             self.running_results.append(rr)
 
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import hashlib
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+from app import DATA_DIR
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+
+load_dotenv()
+
+GCS_MANIFEST_DIRPATH = os.getenv("GCS_MANIFEST_DIRPATH", default=os.path.join(DATA_DIR, "gcs_manifests"))
+GCS_MANIFEST_MAX_AGE_MINUTES = float(os.getenv("GCS_MANIFEST_MAX_AGE_MINUTES", default="60")) # older manifests get listed again
+
+ManifestBlob = namedtuple("ManifestBlob", ["name", "size", "generation", "md5_hash", "crc32c", "content_encoding", "updated"])
+
+def compile_entry(blob):
+    updated = getattr(blob, "updated", None)
+    return {
+        "size": blob.size,
+        "generation": blob.generation,
+        "md5_hash": blob.md5_hash,
+        "crc32c": blob.crc32c,
+        "content_encoding": blob.content_encoding,
+        "updated": updated.isoformat() if updated else None,
+    }
+
+class BucketManifest:
+    def __init__(self, bucket, prefix, dirpath=GCS_MANIFEST_DIRPATH, max_age_minutes=GCS_MANIFEST_MAX_AGE_MINUTES):
+        """
+        A local index of the blobs under a prefix (like all the periods of a k-days run), listed in a single request,
+            so checking whether many files exist (or are stale) costs no further requests.
+
+        Gets saved locally (one file per bucket and prefix), so later runs reuse it until it's older than the max age.
+        Uploads through the GoogleCloudStorageService get recorded in it as they happen (see GoogleCloudStorageService.use_manifest()).
+
+        Params:
+            bucket (google.cloud.storage.Bucket or LocalBucket)
+            prefix (str) like "storage/data/retweet_graphs_v2/k_days/3/"
+            dirpath (str) where to save the manifests
+            max_age_minutes (float) lists the blobs again if the saved manifest is older than this
+        """
+        self.bucket = bucket
+        self.prefix = prefix
+        self.dirpath = dirpath
+        self.max_age_seconds = float(max_age_minutes) * 60
+        self.blobs = {}
+        self.refreshed_at = None
+
+        if not os.path.exists(self.dirpath):
+            os.makedirs(self.dirpath)
+
+        self.load()
+        if self.refreshed_at is None or (time.time() - self.refreshed_at) > self.max_age_seconds:
+            self.refresh()
+
+    @property
+    def metadata(self):
+        return {"prefix": self.prefix, "blobs": len(self.blobs), "refreshed_at": self.refreshed_at}
+
+    @property
+    def filepath(self):
+        key = hashlib.sha256(f"{self.bucket.name}/{self.prefix}".encode("utf-8")).hexdigest()
+        return os.path.join(self.dirpath, f"{key}.json")
+
+    def load(self):
+        try:
+            with open(self.filepath, "r") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.blobs = manifest["blobs"]
+        self.refreshed_at = manifest["refreshed_at"]
+
+    def save(self):
+        tmp_filepath = self.filepath + f".{os.getpid()}.tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump({"bucket_name": self.bucket.name, "prefix": self.prefix, "refreshed_at": self.refreshed_at, "blobs": self.blobs}, f)
+        os.replace(tmp_filepath, self.filepath) # atomic
+
+    #
+    # UPDATING
+    #
+
+    def refresh(self, prefix=None):
+        """
+        Lists the blobs under the prefix, replacing any previous entries.
+        Pass a narrower prefix (like a single period's dir) to refresh only part of the manifest.
+        """
+        prefix = prefix or self.prefix
+        listed = {blob.name: compile_entry(blob) for blob in self.bucket.list_blobs(prefix=prefix)}
+        self.blobs = {**{name: entry for name, entry in self.blobs.items() if not name.startswith(prefix)}, **listed}
+        if prefix == self.prefix:
+            self.refreshed_at = time.time()
+        self.save()
+        print(logstamp(), "MANIFEST:", fmt_n(len(listed)), "BLOBS UNDER", prefix)
+
+    def record(self, blob):
+        """Adds or updates a blob (like one which just got uploaded)."""
+        self.blobs[blob.name] = compile_entry(blob)
+        self.save()
+
+    #
+    # LOOKUPS
+    #
+
+    def covers(self, name):
+        return name.startswith(self.prefix)
+
+    def exists(self, name):
+        return name in self.blobs
+
+    def size(self, name):
+        """The number of bytes stored (which are compressed, if the blob has a content encoding), or None if the blob doesn't exist."""
+        entry = self.blobs.get(name)
+        return entry["size"] if entry else None
+
+    def get_blob(self, name):
+        """Returns the blob's properties (like its checksums), or None if it doesn't exist."""
+        entry = self.blobs.get(name)
+        return ManifestBlob(name=name, **entry) if entry else None
+
+    def is_stale(self, name, local_filepath, cache=None):
+        """
+        Whether the local file needs to be downloaded (again), like GoogleCloudStorageService.is_stale(), but without any requests.
+
+        Params:
+            cache (ArtifactCache) optionally, which knows which blob each local file is a copy of.
+                Without it, any existing local file gets trusted.
+        """
+        if not os.path.isfile(local_filepath):
+            return True
+        blob = self.get_blob(name)
+        if blob is None or cache is None:
+            return False
+        return not cache.is_fresh(blob, local_filepath)
@@ -1,67 +1,150 @@
 
 
 import os
+import mimetypes
 from pprint import pprint
 
 from google.cloud import storage
 from dotenv import load_dotenv
 
 from conftest import TEST_DATA_DIR, TMP_DATA_DIR
+from app.compression import COMPRESSION, COMPRESSION_LEVEL, ENCODINGS, is_compressible, compress_file, decompress_file
+from app.gcs_transfer import ChunkedTransfer
+from app.local_bucket import LocalBucket
+from app.artifact_cache import ARTIFACT_CACHE, ArtifactCache
+from app.gcs_manifest import BucketManifest
 
 load_dotenv()
 
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", default="google-credentials.json")
 GCS_BUCKET_NAME=os.getenv("GCS_BUCKET_NAME", default="my-bucket") # "gs://my-bucket"
+GCS_BUCKET_DIRPATH = os.getenv("GCS_BUCKET_DIRPATH") # optionally, a local directory to use instead of the bucket, for offline runs
 
 class GoogleCloudStorageService:
-    def __init__(self, bucket_name=GCS_BUCKET_NAME):
-        self.client = storage.Client() # implicit check for GOOGLE_APPLICATION_CREDENTIALS
+    def __init__(self, bucket_name=GCS_BUCKET_NAME, compression=COMPRESSION, compression_level=COMPRESSION_LEVEL,
+                        bucket_dirpath=GCS_BUCKET_DIRPATH, cache=None):
+        """
+        Params:
+            bucket_dirpath (str) optionally, a local directory to use instead of the bucket (see app/local_bucket.py),
+                in which case no cloud storage client gets constructed.
+
+            compression (str) how to compress uploads ("gzip", "zstd", or "none"), see app/compression.py.
+                Each compressed blob gets a content encoding, so downloads get decompressed accordingly (and any uncompressed blobs download as-is).
+                Gzipped blobs also get decompressed by cloud storage itself, for clients which don't accept gzip (like browsers and other tools).
+
+            compression_level (int) optionally, the compression level
+
+            cache (ArtifactCache) optionally, a local cache of downloaded files (see app/artifact_cache.py),
+                otherwise one gets used if the ARTIFACT_CACHE env var is "true".
+
+        Large files get transferred as many parts in parallel, with checksum verification and resumption (see app/gcs_transfer.py).
+        """
+        self.bucket_dirpath = bucket_dirpath
+        self.client = None if bucket_dirpath else storage.Client() # implicit check for GOOGLE_APPLICATION_CREDENTIALS
         self.bucket_name = bucket_name
         self.bucket = self.get_bucket()
+        self.compression = compression if compression in ENCODINGS else None
+        self.compression_level = compression_level
+        self.transfer = ChunkedTransfer(self.bucket)
+        self.cache = cache or (ArtifactCache() if ARTIFACT_CACHE else None)
+        self.manifests = []
 
     @property
     def metadata(self):
-        return {"bucket_name": self.bucket_name}
+        return {
+            "bucket_name": self.bucket_name,
+            "bucket_dirpath": self.bucket_dirpath,
+            "compression": self.compression,
+            "transfer": self.transfer.metadata,
+            "cache": self.cache.metadata if self.cache else None,
+            "manifests": [manifest.prefix for manifest in self.manifests]
+        }
 
     def get_bucket(self):
+        if self.bucket_dirpath:
+            return LocalBucket(self.bucket_dirpath)
         return self.client.bucket(self.bucket_name)
 
-    def upload(self, local_filepath, remote_filepath):
-        blob = self.bucket.blob(remote_filepath)
+    def use_manifest(self, prefix, **kwargs):
+        """
+        Lists the blobs under the prefix once (see app/gcs_manifest.py),
+            so existence and staleness checks for any files under it don't make any further requests.
+
+        Param: prefix (str) like "storage/data/retweet_graphs_v2/k_days/3/"
+        """
+        manifest = BucketManifest(self.bucket, prefix, **kwargs)
+        self.manifests.append(manifest)
+        return manifest
 
-        # avoid timeout errors when uploading a large file
-        # h/t: https://github.com/googleapis/python-storage/issues/74
-        #
-        # https://googleapis.dev/python/storage/latest/blobs.html
-        # chunk_size (int) – (Optional) The size of a chunk of data whenever iterating (in bytes).
-        # This must be a multiple of 256 KB per the API specification.
-        #
-        max_chunk_size = 5 * 1024 * 1024  # 5 MB
-        blob.chunk_size = max_chunk_size
-        blob._MAX_MULTIPART_SIZE = max_chunk_size
-
-        blob.upload_from_filename(local_filepath)
+    def manifest_for(self, remote_filepath):
+        return next((manifest for manifest in self.manifests if manifest.covers(remote_filepath)), None)
+
+    def upload(self, local_filepath, remote_filepath):
+        blob = self.upload_blob(local_filepath, remote_filepath)
+        if self.cache:
+            self.cache.record(blob, local_filepath) # so the local file counts as a fresh copy
+        manifest = self.manifest_for(remote_filepath)
+        if manifest:
+            manifest.record(blob)
         return blob
 
-    def download(self, remote_filepath, local_filepath):
-        blob = self.bucket.blob(remote_filepath)
+    def upload_blob(self, local_filepath, remote_filepath):
+        content_type = mimetypes.guess_type(local_filepath)[0] or "application/octet-stream"
+        if not self.compression or not is_compressible(local_filepath):
+            return self.transfer.upload(local_filepath, remote_filepath, content_type=content_type)
+
+        compressed_filepath = f"{local_filepath}.{self.compression}.tmp"
+        try:
+            compress_file(local_filepath, compressed_filepath, encoding=self.compression, level=self.compression_level)
+            return self.transfer.upload(compressed_filepath, remote_filepath, content_type=content_type, content_encoding=self.compression)
+        finally:
+            if os.path.isfile(compressed_filepath):
+                os.remove(compressed_filepath)
 
-        ## avoid timeout errors when uploading a large file
-        ## h/t: https://github.com/googleapis/python-storage/issues/74
-        ##
-        ## https://googleapis.dev/python/storage/latest/blobs.html
-        ## chunk_size (int) – (Optional) The size of a chunk of data whenever iterating (in bytes).
-        ## This must be a multiple of 256 KB per the API specification.
-        ##
-        #max_chunk_size = 5 * 1024 * 1024  # 5 MB
-        #blob.chunk_size = max_chunk_size
-        #blob._MAX_MULTIPART_SIZE = max_chunk_size
-
-        blob.download_to_filename(local_filepath)
+    def download(self, remote_filepath, local_filepath):
+        """Downloads via the artifact cache (if enabled), which skips blobs the local file is already a fresh copy of."""
+        blob = self.bucket.get_blob(remote_filepath) or self.bucket.blob(remote_filepath) # fetches the size, checksums and content encoding (if the blob exists)
+        if self.cache and blob.size is not None:
+            return self.cache.fetch(blob, local_filepath, lambda filepath: self.download_blob(blob, filepath))
+        return self.download_blob(blob, local_filepath)
+
+    def download_blob(self, blob, local_filepath):
+        """Decompresses any compressed blob."""
+        if blob.content_encoding not in ENCODINGS:
+            return self.transfer.download(blob, local_filepath)
+
+        compressed_filepath = f"{local_filepath}.{blob.content_encoding}.tmp"
+        try:
+            self.transfer.download(blob, compressed_filepath)
+            decompress_file(compressed_filepath, local_filepath, encoding=blob.content_encoding)
+        finally:
+            if os.path.isfile(compressed_filepath):
+                os.remove(compressed_filepath)
         return blob
 
+    def is_stale(self, remote_filepath, local_filepath):
+        """
+        Whether the local file needs to be downloaded (again).
+        Without the artifact cache, any existing local file gets trusted (which avoids a request).
+        With it, an existing local file gets compared to the blob, unless there is no blob (like a file which hasn't been uploaded).
+        Files under a manifest's prefix get checked without any requests.
+        """
+        manifest = self.manifest_for(remote_filepath)
+        if manifest:
+            return manifest.is_stale(remote_filepath, local_filepath, cache=self.cache)
+
+        if not os.path.isfile(local_filepath):
+            return True
+        if not self.cache:
+            return False
+        blob = self.bucket.get_blob(remote_filepath)
+        return blob is not None and not self.cache.is_fresh(blob, local_filepath)
+
     def file_exists(self, remote_filepath):
         print("FILE EXISTS?", remote_filepath)
+        manifest = self.manifest_for(remote_filepath)
+        if manifest:
+            return manifest.exists(remote_filepath)
         blob = self.bucket.blob(remote_filepath)
         return blob.exists()
 
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import base64
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import google_crc32c
+from dotenv import load_dotenv
+from google.api_core.exceptions import ServerError, TooManyRequests
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from urllib3.exceptions import ProtocolError
+
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+
+load_dotenv()
+
+GCS_CHUNK_SIZE = int(os.getenv("GCS_CHUNK_SIZE", default=str(32 * 1024 * 1024))) # the number of bytes in each parallel part (a multiple of 256 KB)
+GCS_PARALLEL_MIN_SIZE = int(os.getenv("GCS_PARALLEL_MIN_SIZE", default=str(128 * 1024 * 1024))) # smaller files get transferred in a single stream
+GCS_MAX_WORKERS = int(os.getenv("GCS_MAX_WORKERS", default="8")) # the max number of parts in flight at once
+GCS_MAX_RETRIES = int(os.getenv("GCS_MAX_RETRIES", default="5"))
+
+STREAM_CHUNK_SIZE = 5 * 1024 * 1024 # avoids timeout errors when uploading a large file in a single stream (h/t: https://github.com/googleapis/python-storage/issues/74)
+MAX_COMPOSE_SOURCES = 32 # see: https://cloud.google.com/storage/docs/composing-objects
+
+class IntegrityError(Exception):
+    """A transferred file's checksum doesn't match the blob's."""
+
+RETRYABLE_ERRORS = (ServerError, TooManyRequests, ConnectionError, TimeoutError, RequestsConnectionError, ProtocolError, IntegrityError)
+
+def crc32c(data):
+    """The base64-encoded CRC32C checksum of some bytes, in the same format as Blob.crc32c."""
+    return base64.b64encode(google_crc32c.Checksum(data).digest()).decode("utf-8")
+
+def file_crc32c(filepath, chunk_size=STREAM_CHUNK_SIZE):
+    """The base64-encoded CRC32C checksum of a file, read a chunk at a time."""
+    checksum = google_crc32c.Checksum()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            checksum.update(chunk)
+    return base64.b64encode(checksum.digest()).decode("utf-8")
+
+def chunk_ranges(size, chunk_size):
+    """Splits a number of bytes into a list of (start, end) byte ranges, where the end is exclusive."""
+    return [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+def read_range(filepath, start, end):
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+class ChunkedTransfer:
+    def __init__(self, bucket, chunk_size=GCS_CHUNK_SIZE, parallel_min_size=GCS_PARALLEL_MIN_SIZE,
+                        max_workers=GCS_MAX_WORKERS, max_retries=GCS_MAX_RETRIES):
+        """
+        Transfers large files to and from a Google Cloud Storage bucket as many parts in parallel, and verifies their checksums.
+
+        Uploads get split into part blobs, which get composed into the destination blob server-side.
+            Part blobs are named after the file's checksum, so an interrupted upload of the same file resumes where it left off.
+
+        Downloads get fetched as byte ranges into a partial file, which records its progress alongside,
+            so an interrupted download of the same blob generation resumes where it left off.
+
+        Params:
+            bucket (google.cloud.storage.Bucket)
+            chunk_size (int) the number of bytes in each part (a multiple of 256 KB)
+            parallel_min_size (int) files smaller than this get transferred in a single stream instead
+            max_workers (int) the max number of parts in flight at once
+            max_retries (int) the number of times to retry a failed part, with exponential backoff
+        """
+        self.bucket = bucket
+        self.chunk_size = int(chunk_size)
+        self.parallel_min_size = int(parallel_min_size)
+        self.max_workers = int(max_workers)
+        self.max_retries = int(max_retries)
+
+    @property
+    def metadata(self):
+        return {
+            "chunk_size": self.chunk_size,
+            "parallel_min_size": self.parallel_min_size,
+            "max_workers": self.max_workers,
+            "max_retries": self.max_retries
+        }
+
+    def with_retries(self, func, *args):
+        for attempt in range(0, self.max_retries + 1):
+            try:
+                return func(*args)
+            except RETRYABLE_ERRORS as err:
+                if attempt == self.max_retries:
+                    raise
+                delay = (2 ** attempt) + random.random() # with a little jitter, so the workers don't retry in lockstep
+                print(logstamp(), "RETRYING PART IN", round(delay, 1), "SECONDS...", type(err).__name__)
+                time.sleep(delay)
+
+    #
+    # UPLOADS
+    #
+
+    def upload(self, local_filepath, remote_filepath, content_type=None, content_encoding=None):
+        """
+        Params:
+            content_type (str) optionally, the blob's content type
+            content_encoding (str) optionally, the blob's content encoding (if the file is compressed)
+
+        Returns the uploaded blob.
+        """
+        size = os.path.getsize(local_filepath)
+        if size < self.parallel_min_size:
+            blob = self.bucket.blob(remote_filepath)
+            blob.chunk_size = STREAM_CHUNK_SIZE
+            blob._MAX_MULTIPART_SIZE = STREAM_CHUNK_SIZE
+            blob.content_encoding = content_encoding
+            blob.upload_from_filename(local_filepath, content_type=content_type, checksum="crc32c")
+            return blob
+
+        checksum = file_crc32c(local_filepath)
+        parts_prefix = f"{remote_filepath}.parts/{checksum.replace('/', '_').replace('+', '-').rstrip('=')}/"
+        ranges = chunk_ranges(size, self.chunk_size)
+        existing_parts = {blob.name: blob for blob in self.bucket.list_blobs(prefix=parts_prefix)}
+        print(logstamp(), "UPLOADING", fmt_n(len(ranges)), "PARTS", f"({fmt_n(len(existing_parts))} ALREADY UPLOADED)...")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.with_retries, self.upload_part, local_filepath, f"{parts_prefix}{i:05}", start, end, existing_parts)
+                        for i, (start, end) in enumerate(ranges)]
+            parts = [future.result() for future in futures]
+
+        blob = self.bucket.blob(remote_filepath)
+        blob.content_type = content_type
+        blob.content_encoding = content_encoding
+        intermediates = self.compose(blob, parts, parts_prefix)
+        if blob.crc32c != checksum:
+            raise IntegrityError(f"OOPS, EXPECTING CHECKSUM {checksum} FOR '{remote_filepath}', BUT GOT {blob.crc32c}")
+
+        self.bucket.delete_blobs(parts + intermediates)
+        return blob
+
+    def upload_part(self, local_filepath, part_name, start, end, existing_parts=None):
+        data = read_range(local_filepath, start, end)
+        checksum = crc32c(data)
+        part = (existing_parts or {}).get(part_name)
+        if part is not None and part.size == len(data) and part.crc32c == checksum:
+            return part # already uploaded before an interruption
+
+        part = self.bucket.blob(part_name)
+        part.upload_from_string(data, content_type="application/octet-stream")
+        if part.crc32c != checksum:
+            raise IntegrityError(f"OOPS, EXPECTING CHECKSUM {checksum} FOR PART '{part_name}', BUT GOT {part.crc32c}")
+        return part
+
+    def compose(self, blob, parts, parts_prefix):
+        """
+        Composes the parts into the blob, in tiers if there are more parts than can be composed at once.
+        Returns the intermediate blobs, for cleanup.
+        """
+        intermediates = []
+        tier = 0
+        while len(parts) > MAX_COMPOSE_SOURCES:
+            composed = []
+            for i in range(0, len(parts), MAX_COMPOSE_SOURCES):
+                intermediate = self.bucket.blob(f"{parts_prefix}tier-{tier}-{i // MAX_COMPOSE_SOURCES:05}")
+                intermediate.compose(parts[i : i + MAX_COMPOSE_SOURCES])
+                composed.append(intermediate)
+            intermediates += composed
+            parts = composed
+            tier += 1
+        blob.compose(parts)
+        return intermediates
+
+    #
+    # DOWNLOADS
+    #
+
+    def download(self, blob, local_filepath):
+        """
+        Downloads the blob's stored bytes as-is (without decoding any content encoding), and verifies its checksum.
+
+        Params:
+            blob (google.cloud.storage.Blob) with its properties already fetched (see Bucket.get_blob())
+        """
+        if blob.size is None or blob.size < self.parallel_min_size:
+            blob.download_to_filename(local_filepath, raw_download=True, checksum="crc32c")
+            return blob
+
+        partial_filepath = f"{local_filepath}.part"
+        progress_filepath = f"{local_filepath}.part.json"
+        ranges = chunk_ranges(blob.size, self.chunk_size)
+
+        completed = set()
+        if os.path.isfile(partial_filepath) and os.path.isfile(progress_filepath):
+            with open(progress_filepath) as f:
+                progress = json.load(f)
+            if progress["generation"] == blob.generation and progress["size"] == blob.size:
+                completed = set(progress["completed"]) # resumes where an interrupted download of the same generation left off
+        if not completed:
+            with open(partial_filepath, "wb") as f:
+                f.truncate(blob.size)
+        print(logstamp(), "DOWNLOADING", fmt_n(len(ranges)), "PARTS", f"({fmt_n(len(completed))} ALREADY DOWNLOADED)...")
+
+        lock = threading.Lock()
+        with open(partial_filepath, "r+b") as f, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def download_part(i, start, end):
+                data = blob.download_as_bytes(start=start, end=end - 1, raw_download=True, checksum=None, if_generation_match=blob.generation)
+                if len(data) != end - start:
+                    raise IntegrityError(f"OOPS, EXPECTING {end - start} BYTES FOR PART {i}, BUT GOT {len(data)}")
+                with lock:
+                    f.seek(start)
+                    f.write(data)
+                    f.flush()
+                    completed.add(i)
+                    with open(progress_filepath, "w") as progress_file:
+                        json.dump({"generation": blob.generation, "size": blob.size, "completed": sorted(completed)}, progress_file)
+
+            futures = [executor.submit(self.with_retries, download_part, i, start, end)
+                        for i, (start, end) in enumerate(ranges) if i not in completed]
+            for future in futures:
+                future.result()
+
+        checksum = file_crc32c(partial_filepath)
+        os.remove(progress_filepath)
+        if checksum != blob.crc32c:
+            os.remove(partial_filepath)
+            raise IntegrityError(f"OOPS, EXPECTING CHECKSUM {blob.crc32c} FOR '{blob.name}', BUT GOT {checksum}")
+        os.replace(partial_filepath, local_filepath)
+        return blob
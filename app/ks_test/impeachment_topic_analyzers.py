@@ -4,7 +4,9 @@ from pprint import pprint
 
 from pandas import read_csv
 
+from app.bq_service import BigQueryService
 from app.ks_test.topic_analyzer import TopicAnalyzer, RESULTS_CSV_FILEPATH
+from app.ks_test.topic_matrix import TopicMatrix
 from app.ks_test.impeachment_topics import IMPEACHMENT_TOPICS # todo: allow customization of topics list via CSV file
 
 if __name__ == "__main__":
@@ -18,12 +20,18 @@ if __name__ == "__main__":
     topics = IMPEACHMENT_TOPICS # todo: topic customization
     print(f"DETECTED {len(topics)} TOPICS...")
 
-    analyzers = [TopicAnalyzer(topic=topic) for topic in topics]
+    bq_service = BigQueryService()
+    analyzers = [TopicAnalyzer(bq=bq_service, topic=topic) for topic in topics]
     analyzers = [analyzer for analyzer in analyzers if analyzer.row_id not in existing_ids]
 
     print(f"OF WHICH {len(analyzers)} NEED TESTING..." )
+    if analyzers:
+        # fetches the counts for all topics in a single scan, instead of one scan per topic
+        matrix = TopicMatrix.fetch(bq_service, [analyzer.topic for analyzer in analyzers])
+
     for i, analyzer in enumerate(analyzers):
         print("-----------------------------")
         print(f"TESTING TOPIC {i+1} OF {len(analyzers)}: '{analyzer.row_id.upper()}'")
+        analyzer.x, analyzer.y = matrix.xy(analyzer.topic)
         pprint(analyzer.report)
         analyzer.append_results_to_csv(RESULTS_CSV_FILEPATH)
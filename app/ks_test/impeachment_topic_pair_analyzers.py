@@ -5,7 +5,9 @@ from itertools import combinations
 
 from pandas import read_csv
 
+from app.bq_service import BigQueryService
 from app.ks_test.topic_pair_analyzer import TopicPairAnalyzer, RESULTS_CSV_FILEPATH
+from app.ks_test.topic_matrix import TopicMatrix
 from app.ks_test.impeachment_topics import IMPEACHMENT_TOPICS # todo: allow customization of topics list via CSV file
 
 if __name__ == "__main__":
@@ -22,12 +24,19 @@ if __name__ == "__main__":
     topic_pairs = list(combinations(topics, 2))
     print(f"COMBINED INTO {len(topic_pairs)} TOPIC PAIRS...")
 
-    analyzers = [TopicPairAnalyzer(x_topic=xt, y_topic=yt) for xt, yt in topic_pairs]
+    bq_service = BigQueryService()
+    analyzers = [TopicPairAnalyzer(bq=bq_service, x_topic=xt, y_topic=yt) for xt, yt in topic_pairs]
     analyzers = [analyzer for analyzer in analyzers if analyzer.row_id not in existing_ids]
 
     print(f"OF WHICH {len(analyzers)} NEED TESTING..." )
+    if analyzers:
+        # fetches the counts for all topics in a single scan, instead of one scan per topic pair
+        pair_topics = sorted(set([analyzer.x_topic for analyzer in analyzers] + [analyzer.y_topic for analyzer in analyzers]))
+        matrix = TopicMatrix.fetch(bq_service, pair_topics)
+
     for i, analyzer in enumerate(analyzers):
         print("-----------------------------")
         print(f"TESTING TOPIC PAIR {i+1} OF {len(analyzers)} - {analyzer.row_id.upper()}")
+        analyzer.x, analyzer.y = matrix.xy_pair(analyzer.x_topic, analyzer.y_topic)
         pprint(analyzer.report)
         analyzer.append_results_to_csv()
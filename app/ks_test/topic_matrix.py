@@ -0,0 +1,105 @@
+
+from pprint import pprint
+
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from app.decorators.datetime_decorators import logstamp, fmt_date
+from app.decorators.number_decorators import fmt_n
+from app.bq_service import BigQueryService
+from app.ks_test.impeachment_topics import IMPEACHMENT_TOPICS
+
+class TopicMatrix:
+    def __init__(self, topics, user_ids, user_created_ts, counts):
+        """
+        A user x topic matrix of retweet counts, from which the KS-test populations for any topic (or pair of topics) can be built,
+            without issuing another query.
+
+        Params:
+            topics (list of str) the topics, in the order of the matrix columns
+            user_ids (numpy array) the user ids, in the order of the matrix rows
+            user_created_ts (numpy array of float) the user creation timestamps (seconds since epoch), in the order of the matrix rows
+            counts (scipy.sparse.csc_matrix) the number of times each user was retweeting about each topic
+        """
+        self.topics = [topic.upper() for topic in topics]
+        self.user_ids = user_ids
+        self.user_created_ts = user_created_ts
+        self.counts = counts
+
+    @classmethod
+    def from_record_batches(cls, topics, record_batches):
+        """
+        Params:
+            topics (list of str)
+            record_batches (iterable of pyarrow.RecordBatch) the results of BigQueryService.fetch_retweeter_topic_counts()
+        """
+        user_ids = []
+        user_created_ts = []
+        rows, cols, values = [], [], []
+        row_offset = 0
+        for record_batch in record_batches:
+            user_ids.append(record_batch.column("user_id").to_numpy(zero_copy_only=False))
+            # the timestamps arrive in microseconds (with or without a timezone, depending on the backend)
+            created_at = record_batch.column("user_created_at").cast("timestamp[us]").cast("int64")
+            user_created_ts.append(created_at.to_numpy(zero_copy_only=False) / 1_000_000)
+            for j in range(0, len(topics)):
+                topic_counts = record_batch.column(f"topic_{j}").to_numpy(zero_copy_only=False)
+                nonzero = np.flatnonzero(topic_counts) # most users never talk about most topics, so only store the non-zero counts
+                rows.append(nonzero + row_offset)
+                cols.append(np.full(len(nonzero), j))
+                values.append(topic_counts[nonzero])
+            row_offset += record_batch.num_rows
+            print(logstamp(), "LOADED", fmt_n(row_offset), "RETWEETERS")
+
+        user_ids = np.concatenate(user_ids) if user_ids else np.array([])
+        user_created_ts = np.concatenate(user_created_ts) if user_created_ts else np.array([])
+        counts = coo_matrix((
+            np.concatenate(values) if values else np.array([]),
+            (np.concatenate(rows) if rows else np.array([]), np.concatenate(cols) if cols else np.array([]))
+        ), shape=(row_offset, len(topics))).tocsc() # column-oriented, for fast slicing by topic
+        return cls(topics=topics, user_ids=user_ids, user_created_ts=user_created_ts, counts=counts)
+
+    @classmethod
+    def fetch(cls, bq_service, topics):
+        """Fetches the counts for all topics in a single query. Param: bq_service (BigQueryService)"""
+        print(logstamp(), "FETCHING RETWEETER TOPIC COUNTS...", len(topics), "TOPICS")
+        return cls.from_record_batches(topics, bq_service.fetch_retweeter_topic_counts(topics))
+
+    @property
+    def metadata(self):
+        return {"topics": self.topics, "users": len(self.user_ids), "nonzero_counts": self.counts.nnz}
+
+    def topic_counts(self, topic):
+        """Returns a dense array of the number of times each user was talking about the given topic."""
+        j = self.topics.index(topic.upper())
+        return self.counts[:, j].toarray().ravel()
+
+    def xy(self, topic):
+        """
+        Returns the user creation timestamps of those talking about the given topic (x) and those not (y).
+        Equivalent to TopicAnalyzer.fetch_xy()
+        """
+        counts = self.topic_counts(topic)
+        x = self.user_created_ts[counts > 0]
+        y = self.user_created_ts[counts == 0]
+        return x.tolist(), y.tolist()
+
+    def xy_pair(self, x_topic, y_topic):
+        """
+        Returns the user creation timestamps of those talking about topic x and not y (x), and those talking about topic y and not x (y).
+        Equivalent to TopicPairAnalyzer.fetch_xy()
+        """
+        x_counts = self.topic_counts(x_topic)
+        y_counts = self.topic_counts(y_topic)
+        x = self.user_created_ts[(x_counts > 0) & (y_counts == 0)]
+        y = self.user_created_ts[(x_counts == 0) & (y_counts > 0)]
+        return x.tolist(), y.tolist()
+
+
+if __name__ == "__main__":
+
+    matrix = TopicMatrix.fetch(BigQueryService(), IMPEACHMENT_TOPICS)
+    pprint(matrix.metadata)
+    for topic in matrix.topics:
+        x, y = matrix.xy(topic)
+        print(topic, "|", fmt_n(len(x)), "RETWEETERS", "|", fmt_date(np.mean(x)) if x else None)
@@ -23,8 +23,8 @@ class TopicPairAnalyzer(TopicAnalyzer):
     The other sample is for users talking about topic y and not x.
     """
 
-    def __init__(self, x_topic=X_TOPIC, y_topic=Y_TOPIC, results_csv_filepath=RESULTS_CSV_FILEPATH):
-        super().__init__(results_csv_filepath=RESULTS_CSV_FILEPATH, topic=None) # topic None feels hacky, but its ok, we'll remove it from reporting
+    def __init__(self, bq=None, x_topic=X_TOPIC, y_topic=Y_TOPIC, results_csv_filepath=RESULTS_CSV_FILEPATH):
+        super().__init__(bq=bq, results_csv_filepath=RESULTS_CSV_FILEPATH, topic=None) # topic None feels hacky, but its ok, we'll remove it from reporting
         self.x_topic = x_topic
         self.y_topic = y_topic
 
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import base64
+import shutil
+import hashlib
+
+import google_crc32c
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from app.gcs_transfer import STREAM_CHUNK_SIZE
+
+METADATA_DIRNAME = ".metadata"
+
+def read_chunks(filepath, chunk_size=STREAM_CHUNK_SIZE):
+    with open(filepath, "rb") as f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        """A file in a LocalBucket, with the subset of the google.cloud.storage.Blob interface which this app uses."""
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.content_encoding = None
+        self.chunk_size = None
+        self.generation = None
+        self.size = None
+        self.md5_hash = None
+        self.crc32c = None
+
+    def __repr__(self):
+        return f"<LocalBlob: {self.bucket.name}, {self.name}, {self.generation}>"
+
+    @property
+    def filepath(self):
+        return os.path.join(self.bucket.dirpath, self.name)
+
+    @property
+    def metadata_filepath(self):
+        return os.path.join(self.bucket.dirpath, METADATA_DIRNAME, f"{self.name}.json")
+
+    def reload(self):
+        with open(self.metadata_filepath) as f:
+            for attr, value in json.load(f).items():
+                setattr(self, attr, value)
+
+    def exists(self):
+        return os.path.isfile(self.filepath)
+
+    #
+    # WRITING
+    #
+
+    def save(self, chunks):
+        """Writes the contents (an iterable of bytes) and the metadata, each atomically, with a new generation."""
+        for dirpath in [os.path.dirname(self.filepath), os.path.dirname(self.metadata_filepath)]:
+            os.makedirs(dirpath, exist_ok=True)
+
+        md5 = hashlib.md5()
+        checksum = google_crc32c.Checksum()
+        size = 0
+        tmp_filepath = f"{self.filepath}.{os.getpid()}.tmp"
+        with open(tmp_filepath, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                md5.update(chunk)
+                checksum.update(chunk)
+                size += len(chunk)
+        os.replace(tmp_filepath, self.filepath)
+
+        self.generation = time.time_ns()
+        self.size = size
+        self.md5_hash = base64.b64encode(md5.digest()).decode("utf-8")
+        self.crc32c = base64.b64encode(checksum.digest()).decode("utf-8")
+        metadata = {attr: getattr(self, attr) for attr in ["content_type", "content_encoding", "generation", "size", "md5_hash", "crc32c"]}
+        tmp_filepath = f"{self.metadata_filepath}.{os.getpid()}.tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_filepath, self.metadata_filepath)
+
+    def check_generation(self, if_generation_match=None):
+        """Like the real blob's preconditions, where a generation of 0 means the blob must not exist yet."""
+        if if_generation_match is None:
+            return
+        generation = self.bucket.load_blob(self.name).generation if self.exists() else 0
+        if generation != if_generation_match:
+            raise PreconditionFailed(f"OOPS, BLOB '{self.name}' IS AT GENERATION {generation}, NOT {if_generation_match}")
+
+    def upload_from_filename(self, filepath, content_type=None, checksum=None, if_generation_match=None):
+        self.check_generation(if_generation_match)
+        self.content_type = content_type or self.content_type
+        self.save(read_chunks(filepath))
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        self.check_generation(if_generation_match)
+        self.content_type = content_type or self.content_type
+        self.save([data.encode("utf-8") if isinstance(data, str) else data])
+
+    def compose(self, sources):
+        self.save(chunk for source in sources for chunk in read_chunks(source.filepath))
+
+    #
+    # READING
+    #
+
+    def download_as_bytes(self, start=None, end=None, raw_download=False, checksum=None, if_generation_match=None):
+        """Params: start, end (int) an inclusive byte range, like the real blob's"""
+        with open(self.filepath, "rb") as f:
+            f.seek(start or 0)
+            return f.read() if end is None else f.read(end + 1 - (start or 0))
+
+    def download_to_filename(self, filepath, raw_download=False, checksum=None):
+        if not self.exists():
+            raise NotFound(f"OOPS, BLOB '{self.name}' NOT FOUND IN '{self.bucket.dirpath}'")
+        shutil.copyfile(self.filepath, filepath)
+
+class LocalBucket:
+    def __init__(self, dirpath):
+        """
+        A directory which stands in for a Google Cloud Storage bucket, for offline runs (see GCS_BUCKET_DIRPATH).
+
+        Each blob is a file at its name's path, and its metadata (like the content encoding and checksums)
+            gets stored alongside, in a hidden directory.
+
+        Params:
+            dirpath (str) the directory, like "data/offline_bucket"
+        """
+        self.dirpath = dirpath
+        self.name = os.path.basename(os.path.abspath(dirpath))
+        os.makedirs(os.path.join(self.dirpath, METADATA_DIRNAME), exist_ok=True)
+
+    def __repr__(self):
+        return f"<LocalBucket: {self.dirpath}>"
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def get_blob(self, name):
+        """Returns the blob with its metadata, or None if it doesn't exist."""
+        return self.load_blob(name)
+
+    def load_blob(self, name):
+        blob = self.blob(name)
+        if not blob.exists():
+            return None
+        if not os.path.isfile(blob.metadata_filepath):
+            blob.save(read_chunks(blob.filepath)) # adopts a file which got copied into the directory by hand
+        blob.reload()
+        return blob
+
+    def list_blobs(self, prefix=None):
+        blobs = []
+        for dirpath, dirnames, filenames in os.walk(self.dirpath):
+            dirnames[:] = sorted([dirname for dirname in dirnames if dirname != METADATA_DIRNAME])
+            for filename in sorted(filenames):
+                name = os.path.relpath(os.path.join(dirpath, filename), self.dirpath).replace(os.sep, "/")
+                if filename.endswith(".tmp") or (prefix and not name.startswith(prefix)):
+                    continue
+                blob = self.load_blob(name) # like a real listing, which includes each blob's metadata
+                if blob:
+                    blobs.append(blob)
+        return blobs
+
+    def delete_blobs(self, blobs):
+        for blob in blobs:
+            for filepath in [blob.filepath, blob.metadata_filepath]:
+                if os.path.isfile(filepath):
+                    os.remove(filepath)
+
+    def copy_blob(self, blob, destination_bucket=None, new_name=None):
+        new_blob = (destination_bucket or self).blob(new_name or blob.name)
+        new_blob.content_type = blob.content_type
+        new_blob.content_encoding = blob.content_encoding
+        new_blob.save(read_chunks(blob.filepath))
+        return new_blob
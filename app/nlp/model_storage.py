@@ -4,7 +4,7 @@ import json
 from pprint import pprint
 from shutil import copytree
 
-from memory_profiler import profile
+from app.resource_monitor import monitored
 
 from app import DATA_DIR, seek_confirmation
 from app.file_storage import FileStorage
@@ -64,13 +64,13 @@ class ModelStorage(FileStorage):
         self.upload_file(self.local_model_filepath, self.gcs_model_filepath)
 
     def download_model(self):
-        self.upload_file(self.gcs_model_filepath, self.local_model_filepath)
+        self.download_file(self.gcs_model_filepath, self.local_model_filepath)
 
     def upload_vectorizer(self):
         self.upload_file(self.local_vectorizer_filepath, self.gcs_vectorizer_filepath)
 
     def download_vectorizer(self):
-        self.upload_file(self.gcs_vectorizer_filepath, self.local_vectorizer_filepath)
+        self.download_file(self.gcs_vectorizer_filepath, self.local_vectorizer_filepath)
 
     def upload_scores(self):
         self.upload_file(self.local_scores_filepath, self.gcs_scores_filepath)
@@ -84,10 +84,10 @@ class ModelStorage(FileStorage):
         if self.wifi:
             self.upload_model()
 
-    #@profile
+    @monitored
     def load_model(self):
         """Assumes the model already exists and is saved locally or remotely"""
-        if not os.path.isfile(self.local_model_filepath):
+        if self.is_stale(self.local_model_filepath, self.gcs_model_filepath):
             self.download_model()
         return self.read_model()
 
@@ -96,10 +96,10 @@ class ModelStorage(FileStorage):
         if self.wifi:
             self.upload_vectorizer()
 
-    #@profile
+    @monitored
     def load_vectorizer(self):
         """Assumes the vectorizer already exists and is saved locally or remotely"""
-        if not os.path.isfile(self.local_vectorizer_filepath):
+        if self.is_stale(self.local_vectorizer_filepath, self.gcs_vectorizer_filepath):
             self.download_vectorizer()
         return self.read_vectorizer()
 
@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import resource
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from pprint import pprint
+
+import psutil
+from dotenv import load_dotenv
+from pandas import DataFrame
+
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+
+load_dotenv()
+
+RESOURCE_MONITOR = (os.getenv("RESOURCE_MONITOR", default="false") == "true") # opt-in to sampling the memory and cpu usage of long-running jobs
+RESOURCE_MONITOR_INTERVAL = float(os.getenv("RESOURCE_MONITOR_INTERVAL", default="1.0")) # the number of seconds between samples
+
+def to_mb(n_bytes):
+    return round(n_bytes / (1024 * 1024), 1)
+
+def max_rss():
+    """The peak memory of this process so far (in bytes), as tracked by the operating system, so it includes any spikes between samples."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024 # linux reports kilobytes
+
+class ResourceMonitor:
+    def __init__(self, enabled=RESOURCE_MONITOR, interval=RESOURCE_MONITOR_INTERVAL):
+        """
+        Samples the memory (RSS) and cpu usage of this process in a background thread, and times each stage of a job (see monitored()).
+
+        Unlike memory_profiler's line-by-line tracing, it doesn't slow down the code being measured,
+            so it can be left enabled on production runs.
+
+        Params:
+            enabled (bool) whether to take any measurements (when disabled, stages cost a single attribute check)
+            interval (float) the number of seconds between samples
+        """
+        self.enabled = (enabled == True)
+        self.interval = float(interval)
+        self.process = psutil.Process()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+
+        self.samples = [] # dicts, for writing to CSV
+        self.stages = {} # the aggregate measurements for each stage, by name
+        self.active_stages = {} # the peak memory during each stage in progress, by name
+        self.peak_rss = 0
+
+    def start(self):
+        """Starts sampling in the background (if not already)."""
+        if not self.enabled or (self.thread and self.thread.is_alive()):
+            return
+        self.stopped.clear()
+        self.process.cpu_percent() # the first call only sets the baseline for the next one
+        self.thread = threading.Thread(target=self.run, name="resource-monitor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = self.process.memory_info().rss
+        cpu_percent = self.process.cpu_percent() # since the previous sample (can exceed 100 when using multiple cores)
+        with self.lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            for name in self.active_stages:
+                self.active_stages[name] = max(self.active_stages[name], rss)
+            self.samples.append({"ts": logstamp(), "rss_mb": to_mb(rss), "cpu_percent": cpu_percent, "stages": "|".join(self.active_stages.keys())})
+        return rss
+
+    @property
+    def snapshot(self):
+        """The current memory usage, for adding to a job's running results (or an empty dict if disabled)."""
+        if not self.enabled:
+            return {}
+        return {"rss_mb": to_mb(self.process.memory_info().rss), "peak_rss_mb": to_mb(max_rss())}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measures the duration and memory usage of the code within.
+
+        Param: name (str) like "RetweetGrapher.perform" (calls with the same name get aggregated)
+        """
+        if not self.enabled:
+            yield
+            return
+
+        self.start()
+        start_rss = self.sample()
+        with self.lock:
+            self.active_stages[name] = start_rss
+        start_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_at
+            end_rss = self.sample()
+            with self.lock:
+                stage_peak_rss = self.active_stages.pop(name)
+                stage = self.stages.setdefault(name, {"calls": 0, "seconds": 0, "start_rss_mb": to_mb(start_rss), "peak_rss_mb": 0})
+                stage["calls"] += 1
+                stage["seconds"] = round(stage["seconds"] + seconds, 3)
+                stage["end_rss_mb"] = to_mb(end_rss)
+                stage["peak_rss_mb"] = max(stage["peak_rss_mb"], to_mb(stage_peak_rss))
+            print(logstamp(), "STAGE:", name, "|", fmt_n(round(seconds, 1)), "SECONDS | RSS:", fmt_n(to_mb(end_rss)), "MB | PEAK:", fmt_n(to_mb(stage_peak_rss)), "MB")
+
+    @property
+    def metadata(self):
+        with self.lock:
+            return {
+                "interval": self.interval,
+                "samples": len(self.samples),
+                "peak_rss_mb": max(to_mb(self.peak_rss), to_mb(max_rss())),
+                "stages": {name: dict(stage) for name, stage in self.stages.items()}
+            }
+
+    def write_samples_to_file(self, filepath):
+        with self.lock:
+            df = DataFrame(self.samples)
+        df.to_csv(filepath, index=False)
+
+MONITOR = ResourceMonitor() # shared by all the stages in this process
+
+def monitored(func):
+    """
+    Records each call of the decorated function as a stage of the shared resource monitor (if enabled).
+    A low-overhead replacement for memory_profiler's @profile decorator.
+    """
+    stage_name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with MONITOR.stage(stage_name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+if __name__ == "__main__":
+
+    import numpy as np
+
+    monitor = ResourceMonitor(enabled=True, interval=0.1)
+
+    with monitor.stage("allocation"):
+        arrays = [np.ones(10_000_000) for _ in range(5)]
+        time.sleep(0.5)
+        del arrays
+
+    monitor.stop()
+    pprint(monitor.metadata)
@@ -2,7 +2,7 @@
 import os
 
 from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 from dotenv import load_dotenv
 
 from app.decorators.datetime_decorators import logstamp
@@ -17,6 +17,8 @@ START_AT = os.getenv("START_AT", default="2020-01-01") # On 1/15, The House of R
 END_AT = os.getenv("END_AT", default="2020-01-30")
 
 class BigQueryRetweetGrapher(BigQueryGrapher):
+    weight_attr = "rt_count"
+
     def __init__(self, users_limit=USERS_LIMIT, topic=TOPIC, convo_start_at=START_AT, convo_end_at=END_AT, bq_service=None, gcs_service=None):
         super().__init__(bq_service=bq_service, gcs_service=gcs_service)
         self.users_limit = users_limit
@@ -44,7 +46,7 @@ class BigQueryRetweetGrapher(BigQueryGrapher):
             }
         }} # merges dicts
 
-    @profile
+    @monitored
     def perform(self):
         self.write_metadata_to_file()
         self.upload_metadata()
@@ -59,7 +61,7 @@ class BigQueryRetweetGrapher(BigQueryGrapher):
 
             self.counter += 1
             if self.counter % self.batch_size == 0:
-                rr = {"ts": logstamp(), "counter": self.counter, "nodes": len(self.graph.nodes), "edges": len(self.graph.edges)}
+                rr = {"ts": logstamp(), "counter": self.counter, "nodes": len(self.graph.nodes), "edges": len(self.graph.edges), **MONITOR.snapshot}
                 print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["nodes"]), "|", fmt_n(rr["edges"]))
                 self.running_results.append(rr)
 
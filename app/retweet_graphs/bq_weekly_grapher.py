@@ -2,13 +2,13 @@
 import os
 
 from dotenv import load_dotenv
-from networkx import DiGraph
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 
 from app import DATA_DIR, seek_confirmation
 from app.decorators.datetime_decorators import dt_to_s, logstamp, dt_to_date
 from app.decorators.number_decorators import fmt_n
-from app.bq_service import BigQueryService
+from app.bq_service import BigQueryService, ARROW_BATCH_SIZE
+from app.compact_graphs.edge_buffer import EdgeBuffer
 from retweet_graphs.bq_base_grapher import BigQueryBaseGrapher
 from app.retweet_graphs.graph_storage_service import GraphStorageService
 
@@ -95,30 +95,22 @@ class BigQueryWeeklyRetweetGrapher(BigQueryBaseGrapher):
             }
         }}
 
-    @profile
+    @monitored
     def perform(self):
         self.save_metadata()
 
         self.start()
         self.results = []
-        self.graph = DiGraph()
-
-        for row in self.bq_service.fetch_retweet_counts_in_batches(start_at=dt_to_s(self.tweets_start_at), end_at=dt_to_s(self.tweets_end_at)):
-
-            self.graph.add_edge(
-                row["user_screen_name"], # todo: user_id
-                row["retweet_user_screen_name"], # todo: retweet_user_id
-                weight=row["retweet_count"]
-            )
-
-            self.counter += 1
-            if self.counter % self.batch_size == 0:
-                rr = {
-                    "ts": logstamp(),
-                    "counter": self.counter,
-                    "nodes": self.graph.number_of_nodes(),
-                    "edges": self.graph.number_of_edges()
-                }
+        edges = EdgeBuffer()
+
+        batches = self.bq_service.fetch_retweet_counts_in_batches(start_at=dt_to_s(self.tweets_start_at), end_at=dt_to_s(self.tweets_end_at), arrow_batch_size=ARROW_BATCH_SIZE)
+        for batch in batches:
+            edges.append_record_batch(batch, "user_screen_name", "retweet_user_screen_name", "retweet_count") # todo: user_id, retweet_user_id
+
+            previous_counter = self.counter
+            self.counter += batch.num_rows
+            if self.counter // self.batch_size > previous_counter // self.batch_size:
+                rr = {"ts": logstamp(), "counter": self.counter, "nodes": edges.node_count, "edges": edges.edge_count, **MONITOR.snapshot}
                 print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["nodes"]), "|", fmt_n(rr["edges"]))
                 self.results.append(rr)
 
@@ -126,6 +118,9 @@ class BigQueryWeeklyRetweetGrapher(BigQueryBaseGrapher):
                 if self.users_limit and self.counter >= self.users_limit:
                     break
 
+        print(logstamp(), "ASSEMBLING GRAPH...")
+        self.graph = edges.to_networkx()
+
         self.end()
         self.report()
         self.save_results()
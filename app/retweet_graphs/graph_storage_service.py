@@ -2,7 +2,7 @@
 import os
 import json
 import pickle
-from memory_profiler import profile
+from app.resource_monitor import monitored
 
 from pandas import DataFrame
 from networkx import write_gpickle, read_gpickle
@@ -143,7 +143,7 @@ class GraphStorageService:
     # GRAPH LOADING AND ANALYSIS
     #
 
-    @profile
+    @monitored
     def load_graph(self):
         """Assumes the graph already exists and is saved locally or remotely"""
         if not os.path.isfile(self.local_graph_filepath):
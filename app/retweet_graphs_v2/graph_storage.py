@@ -3,7 +3,7 @@ import os
 import json
 import pickle
 from sys import getsizeof
-from memory_profiler import profile #, memory_usage
+from app.resource_monitor import monitored, MONITOR
 from pprint import pprint
 
 from pandas import DataFrame
@@ -15,7 +15,9 @@ from app import DATA_DIR, seek_confirmation
 from app.decorators.datetime_decorators import logstamp
 from app.decorators.number_decorators import fmt_n
 from app.gcs_service import GoogleCloudStorageService
-from conftest import compile_mock_rt_graph
+from app.compact_graphs.compact_graph import CompactGraph
+from app.compact_graphs.user_dictionary import UserDictionary
+from app.compact_graphs.graph_file import write_graph_file, read_graph_file, BINARY_GRAPH_FILENAME, BINARY_GRAPHS
 
 load_dotenv()
 
@@ -25,14 +27,19 @@ DRY_RUN = (os.getenv("DRY_RUN", default="false") == "true")
 
 WIFI_ENABLED = (os.getenv("WIFI_ENABLED", default="true") == "true")
 
+COMPACT_GRAPHS = (os.getenv("COMPACT_GRAPHS", default="false") == "true") # opt-in to storing graphs as compact arrays (see app/compact_graphs/compact_graph.py), instead of networkx
+
 class GraphStorage:
 
-    def __init__(self, dirpath=None, gcs_service=None):
+    def __init__(self, dirpath=None, gcs_service=None, compact=COMPACT_GRAPHS, binary=BINARY_GRAPHS):
         """
         Saves and loads artifacts from the networkx graph compilation process, using local storage and/or Google Cloud Storage.
 
         Params:
             dirpath (str) like "graphs/my_graph/123"
+            compact (bool) whether the graph is a CompactGraph (stored as "graph.npz") instead of a networkx graph (stored as "graph.gpickle")
+            binary (bool) whether to also store the graph as a memory-mappable binary file ("graph.bin"),
+                and prefer loading it when a CompactGraph will do (see load_graph())
 
         TODO: bot probability stuff only apples to bot retweet graphs, and should probably be moved into a child graph storage class
         """
@@ -42,6 +49,8 @@ class GraphStorage:
         self.dirpath = dirpath or DIRPATH
         self.gcs_dirpath = os.path.join("storage", "data", self.dirpath)
         self.local_dirpath = os.path.join(DATA_DIR, self.dirpath) # TODO: to make compatible on windows, split the dirpath on "/" and re-join using os.sep
+        self.compact = (compact == True)
+        self.binary = (binary == True)
 
         print("-------------------------")
         print("GRAPH STORAGE...")
@@ -49,6 +58,8 @@ class GraphStorage:
         print("   GCS DIRPATH:", self.gcs_dirpath)
         print("   LOCAL DIRPATH:", os.path.abspath(self.local_dirpath))
         print("   WIFI ENABLED:", WIFI_ENABLED)
+        print("   COMPACT GRAPHS:", self.compact)
+        print("   BINARY GRAPHS:", self.binary)
 
         seek_confirmation()
 
@@ -60,13 +71,18 @@ class GraphStorage:
 
     @property
     def metadata(self):
-        return {
+        meta = {
             "dirpath": self.dirpath,
             #"local_dirpath": os.path.abspath(self.local_dirpath),
             #"gcs_dirpath": self.gcs_dirpath,
             "gcs_service": self.gcs_service.metadata,
-            "wifi_enabled": WIFI_ENABLED
+            "wifi_enabled": WIFI_ENABLED,
+            "compact": self.compact,
+            "binary": self.binary
         }
+        if MONITOR.enabled:
+            meta["resources"] = MONITOR.metadata
+        return meta
 
     #
     # LOCAL STORAGE
@@ -80,9 +96,17 @@ class GraphStorage:
     def local_results_filepath(self):
         return os.path.join(self.local_dirpath, "results.csv")
 
+    @property
+    def graph_filename(self):
+        return "graph.npz" if self.compact else "graph.gpickle"
+
     @property
     def local_graph_filepath(self):
-        return os.path.join(self.local_dirpath, "graph.gpickle")
+        return os.path.join(self.local_dirpath, self.graph_filename)
+
+    @property
+    def local_binary_graph_filepath(self):
+        return os.path.join(self.local_dirpath, BINARY_GRAPH_FILENAME)
 
     @property
     def local_bot_probabilities_filepath(self):
@@ -106,12 +130,34 @@ class GraphStorage:
 
     def write_graph_to_file(self):
         print(logstamp(), "WRITING GRAPH...")
-        write_gpickle(self.graph, self.local_graph_filepath)
+        if self.compact or self.binary:
+            graph = self.graph if isinstance(self.graph, CompactGraph) else CompactGraph.from_networkx(self.graph)
+            if graph.user_indices is None: # so graphs from different periods (and machines) share user indices
+                self.user_dictionary(graph.node_ids).index_graph(graph)
+
+        if self.compact:
+            graph.save(self.local_graph_filepath)
+        else:
+            write_gpickle(self.graph, self.local_graph_filepath)
+
+        if self.binary:
+            print(logstamp(), "WRITING BINARY GRAPH...")
+            write_graph_file(self.local_binary_graph_filepath, graph)
+
+    def user_dictionary(self, ids):
+        """The shared user dictionary for the given kind of ids, which gets stored alongside the graphs (when online)."""
+        return UserDictionary.for_ids(ids, gcs_service=(self.gcs_service if WIFI_ENABLED else None))
 
     def read_graph_from_file(self):
         print(logstamp(), "READING GRAPH...")
+        if self.compact:
+            return CompactGraph.load(self.local_graph_filepath)
         return read_gpickle(self.local_graph_filepath)
 
+    def read_binary_graph_from_file(self):
+        print(logstamp(), "READING BINARY GRAPH...")
+        return read_graph_file(self.local_binary_graph_filepath)
+
     #
     # REMOTE STORAGE
     #
@@ -125,6 +171,12 @@ class GraphStorage:
         print(logstamp(), "DOWNLOADING FILE...", remote_filepath)
         self.gcs_service.download(remote_filepath, local_filepath)
 
+    def is_stale(self, local_filepath, remote_filepath):
+        """Whether the local file is missing, or (when online) is an outdated copy of the remote file."""
+        if not os.path.isfile(local_filepath):
+            return True
+        return WIFI_ENABLED and self.gcs_service.is_stale(remote_filepath, local_filepath)
+
     @property
     def gcs_metadata_filepath(self):
         return os.path.join(self.gcs_dirpath, "metadata.json")
@@ -135,7 +187,11 @@ class GraphStorage:
 
     @property
     def gcs_graph_filepath(self):
-        return os.path.join(self.gcs_dirpath, "graph.gpickle")
+        return os.path.join(self.gcs_dirpath, self.graph_filename)
+
+    @property
+    def gcs_binary_graph_filepath(self):
+        return os.path.join(self.gcs_dirpath, BINARY_GRAPH_FILENAME)
 
     @property
     def gcs_bot_probabilities_filepath(self):
@@ -153,6 +209,8 @@ class GraphStorage:
 
     def upload_graph(self):
         self.upload_file(self.local_graph_filepath, self.gcs_graph_filepath)
+        if self.binary:
+            self.upload_file(self.local_binary_graph_filepath, self.gcs_binary_graph_filepath)
 
     def upload_bot_probabilities(self):
         self.upload_file(self.local_bot_probabilities_filepath, self.gcs_bot_probabilities_filepath)
@@ -163,6 +221,9 @@ class GraphStorage:
     def download_graph(self):
         self.download_file(self.gcs_graph_filepath, self.local_graph_filepath)
 
+    def download_binary_graph(self):
+        self.download_file(self.gcs_binary_graph_filepath, self.local_binary_graph_filepath)
+
     def download_bot_probabilities(self):
         self.download_file(self.gcs_bot_probabilities_filepath, self.local_bot_probabilities_filepath)
 
@@ -182,6 +243,8 @@ class GraphStorage:
         self.write_results_to_file()
         if WIFI_ENABLED:
             self.upload_results()
+        if MONITOR.enabled:
+            self.save_metadata() # again, now that it includes the resource usage of the run
 
     def save_graph(self):
         self.write_graph_to_file()
@@ -192,10 +255,25 @@ class GraphStorage:
     # GRAPH LOADING AND ANALYSIS
     #
 
-    @profile
-    def load_graph(self):
-        """Assumes the graph already exists and is saved locally or remotely"""
-        if not os.path.isfile(self.local_graph_filepath):
+    @monitored
+    def load_graph(self, compact=None):
+        """
+        Assumes the graph already exists and is saved locally or remotely.
+        Prefers the binary graph file (if enabled and present), which loads as a memory-mapped CompactGraph,
+            but only for callers which can handle a CompactGraph (otherwise loads the networkx graph).
+        Re-downloads any stale local file (as determined by the artifact cache, if enabled).
+
+        Params:
+            compact (bool) whether a CompactGraph is acceptable (defaults to whether this storage's graphs are compact)
+        """
+        prefer_binary = self.binary and (self.compact if compact is None else compact)
+        if prefer_binary and not self.is_stale(self.local_binary_graph_filepath, self.gcs_binary_graph_filepath):
+            return self.read_binary_graph_from_file()
+
+        if self.is_stale(self.local_graph_filepath, self.gcs_graph_filepath):
+            if prefer_binary and WIFI_ENABLED and self.gcs_service.file_exists(self.gcs_binary_graph_filepath):
+                self.download_binary_graph()
+                return self.read_binary_graph_from_file()
             self.download_graph()
 
         return self.read_graph_from_file()
@@ -224,7 +302,8 @@ class GraphStorage:
             self.graph = self.load_graph()
 
         #memory_load = memory_usage(self.read_graph_from_file, interval=.2, timeout=1)
-        file_size = os.path.getsize(self.local_graph_filepath) # in bytes
+        graph_filepath = self.local_binary_graph_filepath if isinstance(self.graph, CompactGraph) and os.path.isfile(self.local_binary_graph_filepath) else self.local_graph_filepath
+        file_size = os.path.getsize(graph_filepath) # in bytes
         print("-------------------")
         print(type(self.graph))
         print("  NODES:", fmt_n(self.node_count))
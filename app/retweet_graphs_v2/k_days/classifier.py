@@ -10,6 +10,7 @@ from app.retweet_graphs_v2.graph_storage import GraphStorage
 from app.retweet_graphs_v2.k_days.generator import DateRangeGenerator
 from app.botcode_v2.classifier import NetworkClassifier as BotClassifier
 from app.bq_service import BigQueryService
+from app.gcs_service import GoogleCloudStorageService
 
 load_dotenv()
 
@@ -21,19 +22,23 @@ if __name__ == "__main__":
 
     gen = DateRangeGenerator()
 
+    # list all the periods' files once, instead of checking for each period's files separately
+    # ... at the start of each run (rather than reusing a saved listing), so files uploaded since the last run aren't treated as missing:
+    gcs_service = GoogleCloudStorageService()
+    gcs_service.use_manifest(f"storage/data/retweet_graphs_v2/k_days/{gen.k_days}/", max_age_minutes=0)
+
     for date_range in gen.date_ranges:
         storage_dirpath = f"retweet_graphs_v2/k_days/{gen.k_days}/{date_range.start_date}"
-        storage = GraphStorage(dirpath=storage_dirpath)
+        storage = GraphStorage(dirpath=storage_dirpath, gcs_service=gcs_service)
 
-        if SKIP_EXISTING and storage.gcs_service.file_exists(storage.gcs_bot_probabilities_histogram_filepath):
-            # would check for CSV file but it seems checking for larger file sometimes leads to
-            # urllib3.exceptions.ProtocolError: ('Connection aborted.', OSError(0, 'Error')),
-            # so check the smaller histogram file instead
+        if SKIP_EXISTING and gcs_service.file_exists(storage.gcs_bot_probabilities_histogram_filepath):
+            # the histogram gets uploaded last, so it only exists if the bot probabilities CSV does too
             print("FOUND EXISTING BOT PROBABILITIES. SKIPPING...")
             continue # skip to next date range
 
         print("PROCEEDING WITH CLASSIFICAITON...")
-        storage.report() # loads graph and provides size info
+        storage.graph = storage.load_graph(compact=True) # memory-mapped from the binary graph file, if present (the classifier handles CompactGraphs)
+        storage.report() # provides size info
         clf = BotClassifier(storage.graph, weight_attr="weight")
 
         # UPLOAD COMPLETE CSV TO GOOGLE CLOUD STORAGE
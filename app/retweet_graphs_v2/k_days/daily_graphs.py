@@ -0,0 +1,47 @@
+import os
+
+from app.retweet_graphs_v2.graph_storage import GraphStorage, WIFI_ENABLED
+from app.retweet_graphs_v2.retweet_grapher import RetweetGrapher
+
+DAILY_GRAPHS_DIRPATH = "retweet_graphs_v2/daily"
+
+class DailyGraphStorage(GraphStorage):
+    def __init__(self, date, gcs_service=None):
+        """
+        The retweet graph for a single day, which gets built once, and summed with other days into k-day windows
+            (see app/compact_graphs/window_graph.py), so changing the window doesn't require querying BigQuery again.
+
+        Always stored as a compact graph, so it has user indices for summing.
+
+        Param: date (str) like "2020-01-01"
+        """
+        self.date = date
+        super().__init__(dirpath=f"{DAILY_GRAPHS_DIRPATH}/{date}", gcs_service=gcs_service, compact=True)
+
+    @property
+    def graph_exists(self):
+        if os.path.isfile(self.local_graph_filepath):
+            return True
+        return WIFI_ENABLED and self.gcs_service.file_exists(self.gcs_graph_filepath)
+
+def build_daily_graph(day, bq_service=None, query_job_id=None, query_job_location=None):
+    """
+    Queries the day's retweets, and saves the graph.
+
+    Params:
+        day (DateRange) a one-day date range
+        query_job_id (str) optionally, the id of an already-submitted query for the day's retweets
+    """
+    grapher = RetweetGrapher(storage_dirpath=f"{DAILY_GRAPHS_DIRPATH}/{day.start_date}", bq_service=bq_service, compact=True,
+        tweets_start_at=day.start_at, tweets_end_at=day.end_at, query_job_id=query_job_id, query_job_location=query_job_location
+    )
+    grapher.save_metadata()
+    grapher.start()
+    grapher.perform()
+    grapher.end()
+    grapher.report()
+    grapher.save_results()
+    grapher.save_graph()
+
+def load_daily_graph(date):
+    return DailyGraphStorage(date).load_graph()
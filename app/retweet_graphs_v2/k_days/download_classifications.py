@@ -1,25 +1,32 @@
 
-import os
-
+from app.gcs_service import GoogleCloudStorageService
 from app.retweet_graphs_v2.graph_storage import GraphStorage
 from app.retweet_graphs_v2.k_days.generator import DateRangeGenerator
-from app.botcode_v2.classifier import NetworkClassifier as BotClassifier
 
 if __name__ == "__main__":
 
     gen = DateRangeGenerator()
 
+    # list all the periods' files once, instead of checking for each period's files separately
+    # ... at the start of each run (rather than reusing a saved listing), so files uploaded since the last run aren't treated as missing:
+    gcs_service = GoogleCloudStorageService()
+    gcs_service.use_manifest(f"storage/data/retweet_graphs_v2/k_days/{gen.k_days}/", max_age_minutes=0)
+
     for date_range in gen.date_ranges:
         print("----------")
         print("DATE:", date_range.start_date)
         storage_dirpath = f"retweet_graphs_v2/k_days/{gen.k_days}/{date_range.start_date}"
-        storage = GraphStorage(dirpath=storage_dirpath)
+        storage = GraphStorage(dirpath=storage_dirpath, gcs_service=gcs_service)
+
+        if not gcs_service.file_exists(storage.gcs_bot_probabilities_histogram_filepath):
+            print("NOT CLASSIFIED YET. SKIPPING...")
+            continue
 
         try:
-            if not os.path.isfile(storage.local_bot_probabilities_filepath):
+            if storage.is_stale(storage.local_bot_probabilities_filepath, storage.gcs_bot_probabilities_filepath):
                 storage.download_bot_probabilities()
 
-            if not os.path.isfile(storage.local_bot_probabilities_histogram_filepath):
+            if storage.is_stale(storage.local_bot_probabilities_histogram_filepath, storage.gcs_bot_probabilities_histogram_filepath):
                 storage.download_bot_probabilities_histogram()
 
         except Exception as err:
@@ -69,6 +69,12 @@ class DateRange:
     def metadata(self):
         return {"start_date": self.start_date, "end_date": self.end_date}
 
+    @property
+    def days(self):
+        """The one-day date range for each day in this range."""
+        n_days = (self.end_at - self.start_at).days + 1
+        return DateRangeGenerator.get_date_ranges(start_date=self.start_date, k_days=1, n_periods=n_days)
+
     @property
     def start_date(self):
         return dt_to_date(self.start_at)
@@ -1,31 +1,43 @@
-
 from app import server_sleep
 from app.bq_service import BigQueryService
-from app.retweet_graphs_v2.retweet_grapher import RetweetGrapher
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+from app.gcs_service import GoogleCloudStorageService
+from app.retweet_graphs_v2.graph_storage import GraphStorage, WIFI_ENABLED
 from app.retweet_graphs_v2.k_days.generator import DateRangeGenerator
+from app.retweet_graphs_v2.k_days.daily_graphs import load_daily_graph
+from app.retweet_graphs_v2.k_days.scheduler import DailyGraphScheduler
+from app.compact_graphs.window_graph import WindowGraph
 
 
 if __name__ == "__main__":
 
     gen = DateRangeGenerator()
 
-    bq_service = BigQueryService()
+    # only query the days which haven't been graphed yet (by any previous job, regardless of its k days), several at once:
+
+    days = {day.start_date: day for date_range in gen.date_ranges for day in date_range.days}
+    scheduler = DailyGraphScheduler(days=list(days.values()), bq_service=BigQueryService())
+    scheduler.perform()
+    scheduler.report()
+    if scheduler.failed_dates:
+        exit()
+
+    # then sum the daily graphs into each period, adding each new day and subtracting each expired one:
 
+    window = WindowGraph(weight_attr="weight", gcs_service=(GoogleCloudStorageService() if WIFI_ENABLED else None)) # for pulling the user dictionary, if the days were graphed elsewhere
     for date_range in gen.date_ranges:
-        storage_dirpath = f"retweet_graphs_v2/k_days/{gen.k_days}/{date_range.start_date}"
-
-        grapher = RetweetGrapher(storage_dirpath=storage_dirpath, bq_service=bq_service,
-            tweets_start_at=date_range.start_at, tweets_end_at=date_range.end_at
-        )
-        grapher.save_metadata()
-        grapher.start()
-        grapher.perform()
-        grapher.end()
-        grapher.report()
-        grapher.save_results()
-        grapher.save_graph()
-
-        del grapher # clearing graph from memory
+        print(logstamp(), "ASSEMBLING PERIOD...", date_range.start_date, "-", date_range.end_date)
+        window.slide_to([day.start_date for day in date_range.days], load_graph=load_daily_graph)
+
+        storage = GraphStorage(dirpath=f"retweet_graphs_v2/k_days/{gen.k_days}/{date_range.start_date}")
+        graph = window.to_compact_graph()
+        storage.graph = graph if storage.compact else graph.to_networkx()
+        print(logstamp(), "NODES:", fmt_n(graph.number_of_nodes()), "| EDGES:", fmt_n(graph.number_of_edges()))
+        storage.save_metadata()
+        storage.save_graph()
+
+        del storage, graph # clearing graph from memory
         print("\n\n\n\n")
 
     print("JOB COMPLETE!")
@@ -0,0 +1,105 @@
+from app.decorators.datetime_decorators import logstamp
+from app.decorators.number_decorators import fmt_n
+from app.bq_service import BigQueryService
+from app.gcs_service import GoogleCloudStorageService
+from app.retweet_graphs_v2.graph_storage import WIFI_ENABLED
+from app.retweet_graphs_v2.k_days.daily_graphs import DailyGraphStorage, build_daily_graph, DAILY_GRAPHS_DIRPATH
+from app.workers import worker_pool, GRAPH_WORKERS, WORKER_MEMORY_MB
+
+def build_daily_graph_from_job(day, job_id, job_location):
+    """Runs in a worker process, which streams the results of an already-submitted query job."""
+    build_daily_graph(day, bq_service=BigQueryService(), query_job_id=job_id, query_job_location=job_location)
+    return day.start_date
+
+class DailyGraphScheduler:
+    def __init__(self, days, bq_service=None, gcs_service=None, max_workers=GRAPH_WORKERS, worker_memory_mb=WORKER_MEMORY_MB):
+        """
+        Builds the daily retweet graphs for many days at once:
+            1. skips any days which already have a stored graph, so an interrupted run can be resumed
+                (checking them all with a single listing of the daily graphs dir)
+            2. submits all the remaining days' queries up front, so BigQuery runs them concurrently while the workers start
+            3. builds each day's graph in a pool of worker processes, as soon as a worker is available
+
+        Each worker handles a single day and then exits, so its memory gets returned to the system.
+
+        Params:
+            days (list of DateRange) one-day date ranges
+            max_workers (int) the number of days to graph at once (1 for graphing in this process)
+            worker_memory_mb (int) optionally, the max memory for each worker process
+        """
+        self.days = sorted(days, key=lambda day: day.start_date)
+        self.bq_service = bq_service or BigQueryService()
+        self.gcs_service = gcs_service or GoogleCloudStorageService()
+        self.max_workers = int(max_workers)
+        self.worker_memory_mb = int(worker_memory_mb) if worker_memory_mb else None
+
+        self.completed_dates = []
+        self.skipped_dates = []
+        self.failed_dates = {}
+
+        print("-------------------------")
+        print("DAILY GRAPH SCHEDULER...")
+        print("  DAYS:", len(self.days))
+        print("  MAX WORKERS:", self.max_workers)
+        print("  WORKER MEMORY MB:", self.worker_memory_mb)
+
+    @property
+    def metadata(self):
+        return {"days": len(self.days), "max_workers": self.max_workers, "worker_memory_mb": self.worker_memory_mb,
+            "completed": len(self.completed_dates), "skipped": len(self.skipped_dates), "failed": len(self.failed_dates)}
+
+    def remaining_days(self):
+        if WIFI_ENABLED and not self.gcs_service.manifest_for(f"storage/data/{DAILY_GRAPHS_DIRPATH}/"):
+            # always lists again, since the worker processes upload graphs this process' manifest doesn't know about
+            self.gcs_service.use_manifest(f"storage/data/{DAILY_GRAPHS_DIRPATH}/", max_age_minutes=0)
+
+        days = []
+        for day in self.days:
+            if DailyGraphStorage(day.start_date, gcs_service=self.gcs_service).graph_exists:
+                print("FOUND EXISTING DAILY GRAPH. SKIPPING...", day.start_date)
+                self.skipped_dates.append(day.start_date)
+            else:
+                days.append(day)
+        return days
+
+    def perform(self):
+        days = self.remaining_days()
+        if not days:
+            return
+
+        if self.max_workers == 1:
+            for day in days:
+                try:
+                    build_daily_graph(day, bq_service=self.bq_service)
+                    self.complete(day.start_date, len(days))
+                except Exception as err:
+                    self.fail(day.start_date, err)
+            return
+
+        print(logstamp(), "SUBMITTING", len(days), "QUERIES...")
+        jobs = [self.bq_service.submit_retweet_edges_v2(start_at=day.start_at, end_at=day.end_at) for day in days]
+
+        pool = worker_pool(max_workers=self.max_workers, worker_memory_mb=self.worker_memory_mb)
+        for day, job in zip(days, jobs):
+            pool.apply_async(build_daily_graph_from_job, (day, job.job_id, job.location),
+                callback=lambda date: self.complete(date, len(days)),
+                error_callback=lambda err, date=day.start_date: self.fail(date, err)
+            )
+        pool.close()
+        pool.join()
+
+    def complete(self, date, n_days):
+        self.completed_dates.append(date)
+        print(logstamp(), "COMPLETED DAY", date, "|", fmt_n(len(self.completed_dates)), "OF", fmt_n(n_days))
+
+    def fail(self, date, err):
+        print(logstamp(), "OOPS", date, err)
+        self.failed_dates[date] = str(err)
+
+    def report(self):
+        print("-------------------------")
+        print("DAYS COMPLETED:", fmt_n(len(self.completed_dates)))
+        print("DAYS SKIPPED:", fmt_n(len(self.skipped_dates)))
+        print("DAYS FAILED:", fmt_n(len(self.failed_dates)), sorted(self.failed_dates.keys()))
+        if self.failed_dates:
+            print("RE-RUN TO RETRY THE FAILED DAYS (THE OTHERS WILL BE SKIPPED)")
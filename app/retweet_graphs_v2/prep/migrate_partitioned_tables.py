@@ -0,0 +1,21 @@
+
+from app.decorators.datetime_decorators import logstamp
+from app.bq_service import BigQueryService
+
+# partitioned by date, and clustered by the columns the daily queries group and join on
+TABLES = {
+    "tweets": ["user_id"],
+    "retweets": ["user_id"],
+    "retweets_v2": ["user_id", "retweeted_user_id"],
+}
+
+if __name__ == "__main__":
+
+    bq_service = BigQueryService()
+
+    for table_name, cluster_by in TABLES.items():
+        print(logstamp())
+        bq_service.destructively_migrate_partitioned_table(table_name, cluster_by=cluster_by)
+    print(logstamp())
+
+    print("MIGRATION SUCCESSFUL!")
@@ -0,0 +1,25 @@
+
+import os
+
+from dotenv import load_dotenv
+
+from app.decorators.datetime_decorators import logstamp
+from app.bq_service import BigQueryService
+
+load_dotenv()
+
+TOPICS = os.getenv("TOPICS") # optionally index some additional topics, like "#MAGA,#ImpeachAndConvict"
+
+if __name__ == "__main__":
+
+    bq_service = BigQueryService()
+
+    print(logstamp())
+    bq_service.migrate_topic_memberships_table()
+    bq_service.refresh_topic_memberships() # indexes any retweets collected since the last run
+    if TOPICS:
+        bq_service.index_topics([topic.strip() for topic in TOPICS.split(",")])
+    print(logstamp())
+
+    print("INDEXED TOPICS:", bq_service.fetch_indexed_topics())
+    print("MIGRATION SUCCESSFUL!")
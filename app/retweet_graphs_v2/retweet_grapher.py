@@ -3,16 +3,16 @@ import os
 from datetime import datetime
 import time
 
-from memory_profiler import profile
+from app.resource_monitor import monitored, MONITOR
 from dotenv import load_dotenv
-from networkx import DiGraph
 
 from conftest import compile_mock_rt_graph
 from app import APP_ENV, DATA_DIR, SERVER_NAME, SERVER_DASHBOARD_URL, seek_confirmation
 from app.decorators.number_decorators import fmt_n
 from app.decorators.datetime_decorators import dt_to_s, logstamp
-from app.bq_service import BigQueryService
-from app.retweet_graphs_v2.graph_storage import GraphStorage
+from app.bq_service import BigQueryService, ARROW_BATCH_SIZE
+from app.retweet_graphs_v2.graph_storage import GraphStorage, COMPACT_GRAPHS
+from app.compact_graphs.edge_buffer import EdgeBuffer
 from app.retweet_graphs_v2.job import Job
 #from app.email_service import send_email
 
@@ -29,11 +29,11 @@ DRY_RUN = (os.getenv("DRY_RUN", default="false") == "true")
 class RetweetGrapher(GraphStorage, Job):
 
     def __init__(self, topic=TOPIC, tweets_start_at=TWEETS_START_AT, tweets_end_at=TWEETS_END_AT,
-                        users_limit=USERS_LIMIT, batch_size=BATCH_SIZE,
-                        storage_dirpath=None, bq_service=None):
+                        users_limit=USERS_LIMIT, batch_size=BATCH_SIZE, arrow_batch_size=ARROW_BATCH_SIZE,
+                        storage_dirpath=None, bq_service=None, compact=COMPACT_GRAPHS, query_job_id=None, query_job_location=None):
 
         Job.__init__(self)
-        GraphStorage.__init__(self, dirpath=storage_dirpath)
+        GraphStorage.__init__(self, dirpath=storage_dirpath, compact=compact)
         self.bq_service = bq_service or BigQueryService()
         self.fetch_edges = self.bq_service.fetch_retweet_edges_in_batches_v2 # just being less verbose. feels like javascript
 
@@ -50,12 +50,19 @@ class RetweetGrapher(GraphStorage, Job):
             self.users_limit = int(self.users_limit)
 
         self.batch_size = int(batch_size)
+        self.arrow_batch_size = int(arrow_batch_size) # the number of edges fetched from BQ at once, as columnar batches
+
+        # optionally, a query job which was already submitted (see app/retweet_graphs_v2/k_days/scheduler.py)
+        self.query_job_id = query_job_id
+        self.query_job_location = query_job_location
 
         print("-------------------------")
         print("RETWEET GRAPHER...")
         print("  USERS LIMIT:", self.users_limit)
         print("  BATCH SIZE:", self.batch_size)
+        print("  ARROW BATCH SIZE:", self.arrow_batch_size)
         print("  DRY RUN:", DRY_RUN)
+        print("  QUERY JOB:", self.query_job_id)
         print("-------------------------")
         print("CONVERSATION PARAMS...")
         print("  TOPIC:", self.topic)
@@ -74,31 +81,46 @@ class RetweetGrapher(GraphStorage, Job):
             "tweets_start_at": str(self.tweets_start_at),
             "tweets_end_at": str(self.tweets_end_at),
             "users_limit": self.users_limit,
-            "batch_size": self.batch_size
+            "batch_size": self.batch_size,
+            "arrow_batch_size": self.arrow_batch_size,
+            "query_job_id": self.query_job_id
         }
 
-    @profile
+    @monitored
     def perform(self):
+        """
+        Buffers the edge columns of each batch, and assembles the graph in one shot at the end,
+            so the ingestion doesn't cost any python objects per edge.
+        """
         self.results = []
-        self.graph = DiGraph()
-
-        for row in self.fetch_edges(topic=self.topic, start_at=self.tweets_start_at, end_at=self.tweets_end_at):
-
-            self.graph.add_edge(row["user_id"], row["retweeted_user_id"], weight=row["retweet_count"])
-
-            self.counter += 1
-            if self.counter % self.batch_size == 0:
+        self.graph = None
+        self.edges = EdgeBuffer()
+
+        if self.query_job_id:
+            batches = self.bq_service.fetch_job_results_in_batches(self.query_job_id, location=self.query_job_location, arrow_batch_size=self.arrow_batch_size)
+        else:
+            batches = self.fetch_edges(topic=self.topic, start_at=self.tweets_start_at, end_at=self.tweets_end_at, arrow_batch_size=self.arrow_batch_size)
+        for batch in batches:
+            if self.users_limit:
+                batch = batch.slice(0, self.users_limit - self.counter) # stops at exactly the limit, even mid-batch
+            self.edges.append_record_batch(batch, "user_id", "retweeted_user_id", "retweet_count")
+
+            previous_counter = self.counter
+            self.counter += batch.num_rows
+            if self.counter // self.batch_size > previous_counter // self.batch_size:
                 self.results.append(self.running_results)
-                if self.users_limit and self.counter >= self.users_limit:
-                    break
+            if self.users_limit and self.counter >= self.users_limit:
+                break
+
+        print(logstamp(), "ASSEMBLING GRAPH...")
+        self.graph = self.edges.to_compact_graph() if self.compact else self.edges.to_networkx()
+        self.edges = None
+        self.results.append(self.running_results)
 
     @property
     def running_results(self):
-        rr = {"ts": logstamp(),
-            "counter": self.counter,
-            "nodes": self.graph.number_of_nodes(),
-            "edges": self.graph.number_of_edges()
-        }
+        counts = self.edges.metadata if self.edges is not None else {"nodes": self.graph.number_of_nodes(), "edges": self.graph.number_of_edges()}
+        rr = {"ts": logstamp(), "counter": self.counter, "nodes": counts["nodes"], "edges": counts["edges"], **MONITOR.snapshot}
         print(rr["ts"], "|", fmt_n(rr["counter"]), "|", fmt_n(rr["nodes"]), "|", fmt_n(rr["edges"]))
         return rr
 
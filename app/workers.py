@@ -0,0 +1,31 @@
+import os
+import resource
+import multiprocessing
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GRAPH_WORKERS = int(os.getenv("GRAPH_WORKERS", default=str(os.cpu_count() or 1))) # the number of days to graph at once, each in its own process
+WORKER_MEMORY_MB = os.getenv("WORKER_MEMORY_MB") # optionally, the max memory per worker process (default is None, for no limit)
+
+def limit_memory(memory_mb):
+    """
+    Caps the address space of the current (worker) process, so a day which is too big raises a MemoryError in its own worker,
+        instead of the whole machine running out of memory and killing the other workers.
+    """
+    if memory_mb:
+        memory_bytes = int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+def worker_pool(max_workers=GRAPH_WORKERS, worker_memory_mb=WORKER_MEMORY_MB):
+    """
+    Returns a pool of worker processes, each of which handles a single task and then exits, so its memory gets returned to the system.
+
+    Params:
+        max_workers (int) the number of tasks to perform at once
+        worker_memory_mb (int) optionally, the max memory for each worker process (see limit_memory())
+    """
+    os.environ["CONFIRMED"] = "true" # the workers have no terminal to confirm from, and this process has already confirmed
+    context = multiprocessing.get_context("spawn") # doesn't copy this process' client connections into the workers
+    return context.Pool(processes=int(max_workers), initializer=limit_memory, initargs=(worker_memory_mb,), maxtasksperchild=1)
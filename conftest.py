@@ -2,8 +2,11 @@ import os
 
 import pytest
 from networkx import DiGraph
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from api import create_app
+from app.bq_local_service import LocalBigQueryService
 
 CI_ENV = (os.getenv("CI") == "true")
 
@@ -82,6 +85,30 @@ def mock_rt_graph():
     """
     return compile_mock_rt_graph()
 
+mock_retweets = [
+    # the columns of the "retweets_v2" table which are used by the retweet graph queries
+    # (the status ids are strings, like in the retweets tables, which copy them from the tweets table):
+    {"user_id": 1, "user_screen_name": "user1", "user_created_at": "2010-01-01", "retweeted_user_id": 2, "retweeted_user_screen_name": "user2", "status_id": "101", "status_text": "RT @user2: Impeach now", "created_at": "2020-01-01 10:00:00"},
+    {"user_id": 1, "user_screen_name": "user1", "user_created_at": "2010-01-01", "retweeted_user_id": 2, "retweeted_user_screen_name": "user2", "status_id": "102", "status_text": "RT @user2: #MAGA", "created_at": "2020-01-02 10:00:00"},
+    {"user_id": 1, "user_screen_name": "user1", "user_created_at": "2010-01-01", "retweeted_user_id": 3, "retweeted_user_screen_name": "user3", "status_id": "103", "status_text": "RT @user3: impeach", "created_at": "2020-01-03 10:00:00"},
+    {"user_id": 2, "user_screen_name": "user2", "user_created_at": "2011-01-01", "retweeted_user_id": 1, "retweeted_user_screen_name": "user1", "status_id": "104", "status_text": "RT @user1: hello", "created_at": "2020-01-03 11:00:00"},
+    {"user_id": 2, "user_screen_name": "user2", "user_created_at": "2011-01-01", "retweeted_user_id": 2, "retweeted_user_screen_name": "user2", "status_id": "105", "status_text": "RT @user2: me", "created_at": "2020-01-04 10:00:00"}, # retweeting themselves
+    {"user_id": 3, "user_screen_name": "user3", "user_created_at": "2012-01-01", "retweeted_user_id": 1, "retweeted_user_screen_name": "user1", "status_id": "106", "status_text": "RT @user1: #maga", "created_at": "2020-01-05 10:00:00"},
+]
+
+def compile_local_bq_service(dirpath, retweets=mock_retweets, tables=["retweets", "retweets_v2"], **kwargs):
+    """
+    Returns a local BigQuery service (see app/bq_local_service.py), with snapshots of the given retweets as each of the given tables.
+    Any additional kwargs get passed to the service.
+    """
+    for table_name in tables:
+        pq.write_table(pa.Table.from_pylist(retweets), os.path.join(dirpath, f"{table_name}.parquet"))
+    return LocalBigQueryService(snapshot_dirpath=str(dirpath), database_filepath=":memory:", cautious=False, **kwargs)
+
+@pytest.fixture
+def local_bq_service(tmp_path):
+    return compile_local_bq_service(tmp_path)
+
 
 
 
@@ -0,0 +1,74 @@
+import os
+
+from app.artifact_cache import ArtifactCache
+from app.gcs_service import GoogleCloudStorageService
+
+def write_file(filepath, contents):
+    with open(filepath, "w") as f:
+        f.write(contents)
+
+def read_file(filepath):
+    with open(filepath) as f:
+        return f.read()
+
+def offline_service(tmp_path, max_gb=1):
+    cache = ArtifactCache(dirpath=str(tmp_path / "cache"), max_gb=max_gb)
+    return GoogleCloudStorageService(bucket_dirpath=str(tmp_path / "bucket"), compression="gzip", cache=cache)
+
+def test_local_bucket(tmp_path):
+    service = offline_service(tmp_path)
+    write_file(tmp_path / "results.csv", "row_id,nodes\n1,100\n" * 1_000)
+
+    blob = service.upload(str(tmp_path / "results.csv"), "storage/data/graphs/results.csv")
+    assert blob.content_encoding == "gzip"
+    assert blob.size < os.path.getsize(tmp_path / "results.csv")
+    assert [blob.name for blob in service.bucket.list_blobs(prefix="storage/data")] == ["storage/data/graphs/results.csv"]
+    assert service.file_exists("storage/data/graphs/results.csv")
+    assert not service.file_exists("storage/data/graphs/oops.csv")
+
+    service.download("storage/data/graphs/results.csv", str(tmp_path / "downloaded.csv"))
+    assert read_file(tmp_path / "downloaded.csv") == read_file(tmp_path / "results.csv")
+
+def test_fetch(tmp_path):
+    service = offline_service(tmp_path)
+    write_file(tmp_path / "model.gpickle", "MODEL V1")
+    service.upload(str(tmp_path / "model.gpickle"), "storage/data/model.gpickle")
+    assert not service.is_stale("storage/data/model.gpickle", str(tmp_path / "model.gpickle")) # it was just uploaded
+
+    downloads = []
+    download_blob = service.download_blob
+    service.download_blob = lambda blob, filepath: downloads.append(blob.name) or download_blob(blob, filepath)
+
+    for dirname in ["worker_1", "worker_2"]: # different storage dirs share the cached contents
+        os.makedirs(tmp_path / dirname)
+        service.download("storage/data/model.gpickle", str(tmp_path / dirname / "model.gpickle"))
+        assert read_file(tmp_path / dirname / "model.gpickle") == "MODEL V1"
+    assert len(downloads) == 1
+    assert len(service.cache.entries) == 1
+
+    write_file(tmp_path / "model.gpickle", "MODEL V2")
+    service.upload(str(tmp_path / "model.gpickle"), "storage/data/model.gpickle")
+    assert service.is_stale("storage/data/model.gpickle", str(tmp_path / "worker_1" / "model.gpickle"))
+    service.download("storage/data/model.gpickle", str(tmp_path / "worker_1" / "model.gpickle"))
+    assert read_file(tmp_path / "worker_1" / "model.gpickle") == "MODEL V2"
+    assert not service.is_stale("storage/data/model.gpickle", str(tmp_path / "worker_1" / "model.gpickle"))
+    assert len(downloads) == 2
+
+    write_file(tmp_path / "worker_1" / "model.gpickle", "MODIFIED LOCALLY")
+    assert service.is_stale("storage/data/model.gpickle", str(tmp_path / "worker_1" / "model.gpickle"))
+    assert not service.is_stale("storage/data/oops.gpickle", str(tmp_path / "worker_1" / "model.gpickle")) # not uploaded
+
+def test_eviction(tmp_path):
+    service = offline_service(tmp_path, max_gb=2_500 / (1024 * 1024 * 1024)) # room for two of the files
+    for i in range(0, 3):
+        write_file(tmp_path / f"graph_{i}.bin", str(i) * 1_000)
+        service.upload_blob(str(tmp_path / f"graph_{i}.bin"), f"storage/data/graph_{i}.bin")
+
+    service.download("storage/data/graph_0.bin", str(tmp_path / "downloaded_0.bin"))
+    service.download("storage/data/graph_1.bin", str(tmp_path / "downloaded_1.bin"))
+    service.download("storage/data/graph_0.bin", str(tmp_path / "downloaded_0_again.bin")) # graph 1 is now the least recently used
+    service.download("storage/data/graph_2.bin", str(tmp_path / "downloaded_2.bin"))
+
+    assert sorted([entry["blob_name"] for entry in service.cache.entries]) == ["storage/data/graph_0.bin", "storage/data/graph_2.bin"]
+    assert service.cache.total_size <= service.cache.max_bytes
+    assert read_file(tmp_path / "downloaded_1.bin") == "1" * 1_000 # evicting doesn't affect the local copies
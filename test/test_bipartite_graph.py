@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from conftest import TMP_DATA_DIR
+from app.compact_graphs.bipartite_graph import BipartiteGraph, BipartiteGraphBuilder
+
+BOT_FOLLOWERS = [
+    {"bot_id": 3, "follower_ids": [10, 11, 12]},
+    {"bot_id": 1, "follower_ids": [11, 12, 12]}, # a duplicate follower
+    {"bot_id": 2, "follower_ids": [13]},
+]
+
+@pytest.fixture
+def bipartite_graph():
+    builder = BipartiteGraphBuilder()
+    batch = pa.RecordBatch.from_pylist(BOT_FOLLOWERS)
+    builder.append_record_batch(batch.slice(0, 2))
+    builder.append_record_batch(batch.slice(2))
+    builder.append_lists([2], [[10]]) # the same bot again
+    return builder.to_bipartite_graph()
+
+def test_structure(bipartite_graph):
+    graph = bipartite_graph
+    assert graph.bot_ids.tolist() == [1, 2, 3]
+    assert graph.follower_ids.tolist() == [10, 11, 12, 13]
+    assert graph.followers.toarray().tolist() == [[0, 1, 1, 0], [1, 0, 0, 1], [1, 1, 1, 0]]
+    assert graph.metadata["edges"] == 7
+    assert graph.number_of_nodes() == 7
+    assert dict(graph.follower_counts) == {1: 2, 2: 2, 3: 3}
+
+def test_queries(bipartite_graph):
+    graph = bipartite_graph
+    assert graph.followers_of([1, 2]).tolist() == [10, 11, 12, 13]
+    assert graph.followers_of([3, 99]).tolist() == [10, 11, 12] # ignoring unknown bots
+    assert graph.bots_followed_by(10).tolist() == [2, 3]
+    assert graph.bots_followed_by(13).tolist() == [2]
+    with pytest.raises(KeyError):
+        graph.bots_followed_by(99)
+
+    bot_ids, overlap = graph.follower_overlap()
+    assert bot_ids.tolist() == [1, 2, 3]
+    assert overlap.toarray().tolist() == [[2, 0, 2], [0, 2, 1], [2, 1, 3]]
+    bot_ids, overlap = graph.follower_overlap(bots=[3, 1])
+    assert bot_ids.tolist() == [1, 3]
+    assert overlap.toarray().tolist() == [[2, 2], [2, 3]]
+    assert graph.shared_followers(1, 3) == 2
+
+def test_conversion(bipartite_graph):
+    edges = sorted((u, v) for u, v, _ in bipartite_graph.to_compact_graph().edges())
+    assert edges == [(10, 2), (10, 3), (11, 1), (11, 3), (12, 1), (12, 3), (13, 2)] # from each follower to the bot
+
+def test_save_and_load(bipartite_graph):
+    filepath = os.path.join(TMP_DATA_DIR, "bipartite_graph.npz")
+    bipartite_graph.save(filepath)
+    graph = BipartiteGraph.load(filepath)
+    assert np.array_equal(graph.bot_ids, bipartite_graph.bot_ids)
+    assert np.array_equal(graph.follower_ids, bipartite_graph.follower_ids)
+    assert (graph.followers != bipartite_graph.followers).nnz == 0
+    os.remove(filepath)
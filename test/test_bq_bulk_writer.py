@@ -0,0 +1,103 @@
+import threading
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud.bigquery import SchemaField
+from google.api_core.exceptions import ServiceUnavailable, BadRequest
+
+from app.bq_bulk_writer import BulkWriter, split_into_sized_batches, serialized_size
+
+class MockClient:
+    """Records the insert requests, and fails the first request (to exercise retries) and any row with a negative user id."""
+    def __init__(self):
+        self.requests = []
+        self.lock = threading.Lock()
+        self.failed_once = False
+
+    def insert_rows(self, table, rows):
+        with self.lock:
+            if not self.failed_once:
+                self.failed_once = True
+                raise ServiceUnavailable("try again")
+            self.requests.append(rows)
+        return [{"index": i, "errors": [{"reason": "invalid"}]} for i, row in enumerate(rows) if row[1] < 0]
+
+def test_sized_batches():
+    rows = [{"start_date": "2020-01-01", "user_id": i, "bot_probability": 0.99} for i in range(100, 200)] # same serialized size
+    row_bytes = serialized_size(rows[0])
+
+    batches = list(split_into_sized_batches(rows, max_bytes=row_bytes * 10, max_rows=1000))
+    assert [len(batch) for _, batch in batches] == [10] * 10
+    assert [offset for offset, _ in batches] == list(range(0, 100, 10))
+
+    batches = list(split_into_sized_batches(rows, max_bytes=1_000_000, max_rows=30))
+    assert [len(batch) for _, batch in batches] == [30, 30, 30, 10]
+
+def test_serialized_size():
+    record = {"start_date": "2020-01-01", "user_id": 123, "bot_probability": 0.99}
+    request_row = '{"insertId": "%s", "json": {"start_date": "2020-01-01", "user_id": 123, "bot_probability": 0.99}}, ' % uuid4()
+    assert serialized_size(record) == len(request_row) # includes the column names and the envelope, not just the values
+
+def test_stream_records_with_retries_and_error_rows(monkeypatch):
+    monkeypatch.setattr("app.bq_bulk_writer.time.sleep", lambda seconds: None) # don't actually wait between retries
+    client = MockClient()
+    writer = BulkWriter(client, max_batch_rows=10, max_workers=3, max_retries=2, load_job_min_rows=1_000_000)
+
+    records = [{"start_date": "2020-01-01", "user_id": i, "bot_probability": 0.99} for i in range(0, 95)]
+    records[42]["user_id"] = -42
+    errors = writer.insert_records("my_table", records)
+
+    assert sum([len(rows) for rows in client.requests]) == 95
+    assert errors == [{"index": 42, "batch": 4, "errors": [{"reason": "invalid"}]}]
+
+class MockTable:
+    def __init__(self, schema):
+        self.schema = schema
+
+class MockLoadJob:
+    def __init__(self, err=None):
+        self.err = err
+        self.errors = None
+
+    def result(self):
+        if self.err:
+            raise self.err
+
+class MockLoadClient:
+    """Records the staged parquet files, and optionally fails the load job."""
+    def __init__(self, err=None):
+        self.err = err
+        self.loaded = []
+
+    def load_table_from_file(self, stage, table, job_config=None):
+        self.loaded.append(pq.read_table(stage))
+        return MockLoadJob(self.err)
+
+def test_load_records_with_table_schema():
+    client = MockLoadClient()
+    table = MockTable([
+        SchemaField("start_date", "DATE"),
+        SchemaField("created_at", "TIMESTAMP"),
+        SchemaField("user_id", "INT64"),
+        SchemaField("bot_probability", "FLOAT64"),
+    ])
+    writer = BulkWriter(client, load_job_min_rows=1)
+
+    records = [{"start_date": "2020-01-01", "created_at": "2020-01-01 10:00:00", "user_id": i, "bot_probability": 1} for i in range(0, 10)]
+    errors = writer.insert_records(table, records)
+
+    assert errors == []
+    schema = client.loaded[0].schema
+    assert schema.field("start_date").type == pa.date32()
+    assert schema.field("created_at").type == pa.timestamp("us", tz="UTC")
+    assert schema.field("bot_probability").type == pa.float64() # not inferred as an integer
+
+def test_load_records_failure_as_error_rows():
+    client = MockLoadClient(err=BadRequest("invalid schema"))
+    writer = BulkWriter(client, load_job_min_rows=1)
+
+    errors = writer.insert_records(MockTable(None), [{"user_id": 1}])
+    assert len(errors) == 1
+    assert errors[0]["index"] is None
+    assert "invalid schema" in errors[0]["errors"][0]["message"]
@@ -0,0 +1,76 @@
+import os
+import time
+
+import pyarrow as pa
+
+from app.bq_cache import QueryCache, is_cacheable, normalize_sql
+
+DATASET_ADDRESS = "my-project.impeachment_test"
+
+SQL = f"""
+    SELECT user_id, retweeted_user_id, count(distinct status_id) as retweet_count
+    FROM `{DATASET_ADDRESS}.retweets_v2`
+    GROUP BY 1,2
+"""
+
+def mock_table(n=3):
+    return pa.table({"user_id": list(range(n)), "retweeted_user_id": list(range(n, n * 2)), "retweet_count": [1] * n})
+
+def test_normalization():
+    assert normalize_sql("SELECT  1\n   FROM x; ") == "SELECT 1 FROM x"
+    assert QueryCache.compile_key(SQL, DATASET_ADDRESS) == QueryCache.compile_key(" ".join(SQL.split()), DATASET_ADDRESS)
+    assert QueryCache.compile_key(SQL, DATASET_ADDRESS) != QueryCache.compile_key(SQL, "my-project.impeachment_production")
+
+def test_cacheable():
+    assert is_cacheable(SQL)
+    assert is_cacheable("-- TOPIC: '#MAGA'\n SELECT 1")
+    assert is_cacheable("(SELECT 1) UNION ALL (SELECT 2)")
+    assert not is_cacheable(f"DROP TABLE IF EXISTS `{DATASET_ADDRESS}.topics`; CREATE TABLE `{DATASET_ADDRESS}.topics` (topic STRING)")
+    assert not is_cacheable(f"CREATE TABLE `{DATASET_ADDRESS}.users` as (SELECT DISTINCT user_id FROM `{DATASET_ADDRESS}.tweets`)")
+
+def test_write_and_read(tmp_path):
+    cache = QueryCache(dirpath=str(tmp_path))
+    assert cache.lookup(SQL, DATASET_ADDRESS) is None
+
+    cache.write_table(SQL, DATASET_ADDRESS, mock_table())
+    filepath = cache.lookup(SQL, DATASET_ADDRESS)
+    assert filepath
+    assert cache.read_table(filepath).to_pydict() == mock_table().to_pydict()
+    assert sum([batch.num_rows for batch in cache.read_batches(filepath, batch_size=2)]) == 3
+
+def test_partially_consumed_batches_are_not_cached(tmp_path):
+    cache = QueryCache(dirpath=str(tmp_path))
+    batches = cache.write_batches(SQL, DATASET_ADDRESS, mock_table(10).to_batches(max_chunksize=2))
+    next(batches)
+    batches.close()
+    assert cache.lookup(SQL, DATASET_ADDRESS) is None
+    assert os.listdir(str(tmp_path)) == []
+
+def test_ttl(tmp_path):
+    cache = QueryCache(dirpath=str(tmp_path), ttl_hours=0)
+    cache.write_table(SQL, DATASET_ADDRESS, mock_table())
+    time.sleep(0.01)
+    assert cache.lookup(SQL, DATASET_ADDRESS) is None
+
+def test_lru_eviction(tmp_path):
+    cache = QueryCache(dirpath=str(tmp_path))
+    queries = [SQL + f" LIMIT {i}" for i in range(1, 4)]
+    for sql in queries:
+        cache.write_table(sql, DATASET_ADDRESS, mock_table(1000))
+    cache.lookup(queries[0], DATASET_ADDRESS) # most recently used
+
+    cache.max_bytes = cache.total_size - 1 # make room for all but one
+    cache.evict()
+    assert cache.lookup(queries[0], DATASET_ADDRESS)
+    assert cache.lookup(queries[1], DATASET_ADDRESS) is None # least recently used
+    assert cache.lookup(queries[2], DATASET_ADDRESS)
+
+def test_invalidation(tmp_path):
+    cache = QueryCache(dirpath=str(tmp_path))
+    other_sql = f"SELECT topic FROM `{DATASET_ADDRESS}.topics`"
+    cache.write_table(SQL, DATASET_ADDRESS, mock_table())
+    cache.write_table(other_sql, DATASET_ADDRESS, pa.table({"topic": ["#MAGA"]}))
+
+    assert cache.invalidate("retweets_v2") == 1
+    assert cache.lookup(SQL, DATASET_ADDRESS) is None
+    assert cache.lookup(other_sql, DATASET_ADDRESS)
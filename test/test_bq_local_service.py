@@ -0,0 +1,105 @@
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from conftest import mock_retweets, compile_local_bq_service
+from app.bq_local_service import translate_sql
+
+def test_translate_sql():
+    sql = """
+        CREATE TABLE `my-project.impeachment_production.daily_bot_probabilities` (
+            user_id INT64,
+            bot_probability FLOAT64,
+            friend_names ARRAY<STRING>,
+        );
+    """
+    translated = translate_sql(sql)
+    assert '"daily_bot_probabilities"' in translated
+    assert "DOUBLE" in translated
+    assert "STRING[]" in translated
+    assert "," not in translated.split("friend_names")[-1]
+
+def test_fetch_retweet_edges(local_bq_service):
+    bq_service = local_bq_service
+
+    edges = sorted([(row.user_id, row.retweeted_user_id, row.retweet_count) for row in bq_service.fetch_retweet_edges_in_batches_v2()])
+    assert edges == [(1, 2, 2), (1, 3, 1), (2, 1, 1), (3, 1, 1)] # excludes user 2 retweeting themselves
+
+    edges = list(bq_service.fetch_retweet_edges_in_batches_v2(topic="impeach", start_at="2020-01-01", end_at="2020-01-04"))
+    assert sorted([(row.user_id, row.retweeted_user_id) for row in edges]) == [(1, 2), (1, 3)]
+
+    batches = list(bq_service.fetch_retweet_edges_in_batches_v2(arrow_batch_size=3))
+    assert [batch.num_rows for batch in batches] == [3, 1]
+    assert batches[0].schema.names == ["user_id", "retweeted_user_id", "retweet_count"]
+
+def test_fetch_retweeters_by_topic(local_bq_service):
+    bq_service = local_bq_service
+
+    counts = {row.user_id: row["count"] for row in bq_service.fetch_retweeters_by_topic_exclusive("#maga")}
+    assert counts == {1: 1, 2: 0, 3: 1}
+
+def test_migrate_and_upload(local_bq_service):
+    bq_service = local_bq_service
+    bq_service.migrate_daily_bot_probabilities_table()
+
+    errors = bq_service.upload_daily_bot_probabilities([
+        {"start_date": "2020-01-01", "user_id": 1, "bot_probability": 0.9},
+        {"start_date": "2020-01-01", "user_id": 2, "bot_probability": 0.1},
+        {"start_date": "2020-01-02", "user_id": 3, "bot_probability": 0.85},
+    ])
+    assert not any(errors)
+    assert sorted([row.user_id for row in bq_service.fetch_bot_ids(bot_min=0.8)]) == [1, 3]
+
+def test_topic_memberships(local_bq_service):
+    bq_service = local_bq_service
+    scanned_counts = sorted([tuple(row.values()) for row in bq_service.fetch_retweeters_by_topic_exclusive("#maga")])
+    scanned_edges = sorted([tuple(row.values()) for row in bq_service.fetch_retweet_edges_in_batches_v2(topic="impeach")])
+    assert bq_service.fetch_indexed_topics() == []
+
+    bq_service.migrate_topics_table()
+    bq_service.append_topics(["#MAGA"]) # not indexed until the index gets migrated
+    assert bq_service.fetch_indexed_topics() == []
+
+    bq_service.migrate_topic_memberships_table()
+    assert bq_service.fetch_indexed_topics() == ["#MAGA"]
+    bq_service.append_topics(["impeach"]) # subsequent topics get indexed as they are added
+    assert bq_service.fetch_indexed_topics() == ["#MAGA", "IMPEACH"]
+    assert "topic_memberships" in bq_service.sql_topic_filter("impeach")
+    assert "status_text" in bq_service.sql_topic_filter("#TrumpImpeachment")
+
+    assert sorted([tuple(row.values()) for row in bq_service.fetch_retweeters_by_topic_exclusive("#maga")]) == scanned_counts
+    assert sorted([tuple(row.values()) for row in bq_service.fetch_retweet_edges_in_batches_v2(topic="impeach")]) == scanned_edges
+
+    pairs = {row.user_id: (row.x_count, row.y_count) for row in bq_service.fetch_retweeters_by_topics_exclusive("#MAGA", "impeach")}
+    assert pairs == {3: (1, 0)} # user 1 talked about both
+
+def test_partitioned_tables(local_bq_service):
+    bq_service = local_bq_service
+    bq_service.destructively_migrate_partitioned_table("retweets_v2", cluster_by=["user_id", "retweeted_user_id"])
+    assert bq_service.client.table_names(table_type="BASE TABLE") == ["retweets_v2"]
+
+    edges = list(bq_service.fetch_retweet_edges_in_batches_v2(start_at="2020-01-03 00:00:00", end_at="2020-01-05 23:59:59"))
+    assert sorted([(row.user_id, row.retweeted_user_id) for row in edges]) == [(1, 3), (2, 1), (3, 1)]
+
+def test_refresh_topic_memberships(tmp_path):
+    bq_service = compile_local_bq_service(tmp_path, retweets=mock_retweets[0:3], tables=["retweets"])
+    bq_service.migrate_topics_table()
+    bq_service.append_topics(["#MAGA", "impeach"])
+    bq_service.migrate_topic_memberships_table()
+
+    pq.write_table(pa.Table.from_pylist(mock_retweets), tmp_path / "retweets.parquet") # more retweets get collected
+    bq_service.refresh_topic_memberships()
+    sql = "SELECT topic, status_id FROM topic_memberships ORDER BY 1,2"
+    assert [tuple(row.values()) for row in bq_service.execute_query(sql)] == [("#MAGA", "102"), ("#MAGA", "106"), ("IMPEACH", "101"), ("IMPEACH", "103")]
+
+    bq_service.refresh_topic_memberships() # only scans the statuses after each topic's latest indexed status
+    assert len(list(bq_service.execute_query(sql))) == 4
+
+def test_topic_matching_semantics(local_bq_service):
+    bq_service = local_bq_service
+    assert "REGEXP_CONTAINS" in bq_service.sql_topic_filter("#MAGA") # like the KS-test queries
+    scanned_counts = {row.user_id: row.count for row in bq_service.fetch_retweeters_by_topic_exclusive("@user1")}
+    bq_service.migrate_topics_table()
+    bq_service.append_topics(["@user1"])
+    bq_service.migrate_topic_memberships_table()
+    assert {row.user_id: row.count for row in bq_service.fetch_retweeters_by_topic_exclusive("@user1")} == scanned_counts == {1: 0, 2: 1, 3: 1}
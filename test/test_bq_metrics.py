@@ -0,0 +1,51 @@
+
+from conftest import compile_local_bq_service
+from app.bq_metrics import MetricsSink, sql_fingerprint
+
+def local_service(tmp_path, **kwargs):
+    metrics = MetricsSink(filepath=str(tmp_path / "metrics.jsonl"))
+    return compile_local_bq_service(tmp_path, tables=["retweets_v2"], metrics=metrics, **kwargs)
+
+def test_sql_fingerprint():
+    sql = "SELECT * FROM `my-project.my_dataset.retweets_v2` WHERE upper(status_text) LIKE '%IMPEACH%' LIMIT 10"
+    other_sql = """
+        SELECT *
+        FROM `my-project.my_dataset.retweets_v2`
+        WHERE upper(status_text) LIKE '%#MAGA%'
+        LIMIT 500
+    """
+    assert sql_fingerprint(sql) == sql_fingerprint(other_sql)
+    assert sql_fingerprint(sql) != sql_fingerprint(sql.replace("retweets_v2", "tweets"))
+
+def test_query_metrics(tmp_path):
+    bq_service = local_service(tmp_path)
+
+    edges = list(bq_service.fetch_retweet_edges_in_batches_v2())
+    batches = list(bq_service.fetch_retweet_edges_in_batches_v2(arrow_batch_size=3))
+    bq_service.migrate_daily_bot_probabilities_table()
+    assert len(edges) == 4
+    assert len(batches) == 2
+
+    records = bq_service.metrics.read()
+    assert [r["method"] for r in records] == ["fetch_retweet_edges_in_batches_v2", "fetch_retweet_edges_in_batches_v2", "migrate_daily_bot_probabilities_table"]
+    assert [r.get("rows") for r in records] == [4, 4, None]
+    assert records[0]["fingerprint"] == records[1]["fingerprint"]
+    assert records[0]["complete"] == True
+    assert records[0]["iteration_seconds"] >= 0
+
+    summaries = bq_service.metrics.summarize()
+    assert summaries[0]["method"] == "fetch_retweet_edges_in_batches_v2"
+    assert summaries[0]["queries"] == 2
+
+def test_dry_run(tmp_path):
+    bq_service = local_service(tmp_path, dry_run=True)
+
+    assert list(bq_service.fetch_retweet_edges_in_batches_v2()) == []
+    assert bq_service.migrate_daily_bot_probabilities_table() == []
+    assert bq_service.client.table_names() == ["retweets_v2"] # nothing was actually created
+
+    records = bq_service.metrics.read()
+    assert [r["method"] for r in records] == ["fetch_retweet_edges_in_batches_v2", "migrate_daily_bot_probabilities_table"]
+    assert all([r["dry_run"] for r in records])
+    assert bq_service.metrics.summarize() == []
+    assert len(bq_service.metrics.summarize(dry_run=True)) == 2
@@ -1,8 +1,12 @@
 
+import sys
+import subprocess
+from datetime import date
+
 import pytest
 
 from conftest import CI_ENV
-from app.bq_service import BigQueryService, split_into_batches
+from app.bq_service import BigQueryService, split_into_batches, sql_date_filter
 
 
 def test_split_into_batches():
@@ -14,6 +18,21 @@ def test_split_into_batches():
         [9, 10]
     ]
 
+def test_sql_date_filter():
+    assert sql_date_filter("2020-01-31") == "(created_at >= '2020-01-31' AND created_at < '2020-02-01')"
+    assert sql_date_filter(date(2020, 2, 29), "t.created_at") == "(t.created_at >= '2020-02-29' AND t.created_at < '2020-03-01')"
+
+def test_lazy_construction():
+    # in a fresh process, so the google.cloud modules haven't already been imported by other tests:
+    script = "; ".join([
+        "import sys",
+        "from app.bq_service import BigQueryService",
+        "bq_service = BigQueryService(cautious=False)",
+        "assert 'google.cloud.bigquery.client' not in sys.modules",
+        "assert 'pyarrow' not in sys.modules",
+    ])
+    subprocess.run([sys.executable, "-c", script], check=True)
+
 @pytest.mark.skipif(CI_ENV, reason="avoid issuing HTTP requests on CI")
 def test_upload_in_batches():
 
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from app.compact_graphs.compact_graph import CompactGraph
+from app.botcode_v2.classifier import NetworkClassifier
+from conftest import TMP_DATA_DIR
+
+def test_from_edges():
+    graph = CompactGraph.from_edges(sources=[3, 1, 1, 3], targets=[2, 2, 3, 2], weights=[1, 4, 5, 2], nodes=[9])
+    assert graph.nodes() == [1, 2, 3, 9]
+    assert graph.number_of_nodes() == 4
+    assert graph.number_of_edges() == 3 # combines the duplicate edge
+    assert sorted(graph.edges()) == [(1, 2, 4.0), (1, 3, 5.0), (3, 2, 3.0)]
+    assert graph.has_edge(3, 2) and not graph.has_edge(2, 3) and not graph.has_edge(2, 42)
+    assert graph.successors(1) == [2, 3]
+    assert graph.predecessors(2) == [1, 3]
+    assert 9 in graph and 42 not in graph
+
+def test_degrees(mock_rt_graph):
+    graph = CompactGraph.from_networkx(mock_rt_graph, weight_attr="rt_count")
+    assert graph.number_of_nodes() == mock_rt_graph.number_of_nodes()
+    assert graph.number_of_edges() == mock_rt_graph.number_of_edges()
+    assert dict(graph.in_degree(weight="rt_count")) == dict(mock_rt_graph.in_degree(weight="rt_count"))
+    assert dict(graph.out_degree(weight="rt_count")) == dict(mock_rt_graph.out_degree(weight="rt_count"))
+    assert dict(graph.in_degree()) == dict(mock_rt_graph.in_degree())
+    assert graph.in_degree(weight="rt_count")["leader1"] == 100
+
+def test_networkx_adapter(mock_rt_graph):
+    graph = CompactGraph.from_networkx(mock_rt_graph, weight_attr="rt_count").to_networkx()
+    assert sorted(graph.nodes) == sorted(mock_rt_graph.nodes)
+    assert sorted(graph.edges(data="rt_count")) == sorted(mock_rt_graph.edges(data="rt_count"))
+
+def test_save_and_load(mock_rt_graph):
+    filepath = os.path.join(TMP_DATA_DIR, "compact_graph.npz")
+    graph = CompactGraph.from_networkx(mock_rt_graph, weight_attr="rt_count")
+    graph.save(filepath)
+    loaded_graph = CompactGraph.load(filepath)
+    os.remove(filepath)
+    assert loaded_graph.nodes() == graph.nodes()
+    assert sorted(loaded_graph.edges()) == sorted(graph.edges())
+    assert loaded_graph.weight_attr == "rt_count"
+
+def test_bot_classification(mock_rt_graph):
+    # the compact graph should produce the same bot probabilities as the networkx graph
+    expected_probabilities = NetworkClassifier(mock_rt_graph, weight_attr="rt_count").bot_probabilities
+    graph = CompactGraph.from_networkx(mock_rt_graph, weight_attr="rt_count")
+    probabilities = NetworkClassifier(graph, weight_attr="rt_count").bot_probabilities
+    assert probabilities.keys() == expected_probabilities.keys()
+    for user, probability in expected_probabilities.items():
+        assert round(probabilities[user], 10) == round(probability, 10)
+
+def test_node_attributes():
+    filepath = os.path.join(TMP_DATA_DIR, "attributed_graph.npz")
+    graph = CompactGraph.from_edges(sources=["A", "B"], targets=["C", "C"], weight_attr=None)
+    graph.set_node_attributes(["C", "A"], user_id=[3, 1], rate=[2.5, 1.0], bot=[True, False], community=["x", "yy"])
+    assert graph.node_attributes["user_id"].tolist() == [1, -1, 3] # aligned with the node ids
+    assert graph.node_attribute("rate", "C") == 2.5
+    assert graph.node_attribute("community", "A") == "yy"
+
+    graph.save(filepath)
+    loaded_graph = CompactGraph.load(filepath)
+    os.remove(filepath)
+    assert loaded_graph.node_attributes["bot"].tolist() == [False, False, True]
+    nx_graph = loaded_graph.to_networkx()
+    assert nx_graph.nodes["A"] == {"user_id": 1, "rate": 1.0, "bot": False, "community": "yy"}
+    assert nx_graph.nodes["B"] == {} # wasn't given attributes
+
+    with pytest.raises(KeyError):
+        graph.set_node_attributes(["Z"], rate=[1])
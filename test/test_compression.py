@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from conftest import TMP_DATA_DIR
+from app.compression import compress_file, decompress_file, is_compressible
+
+SOURCE_FILEPATH = os.path.join(TMP_DATA_DIR, "results.csv")
+COMPRESSED_FILEPATH = os.path.join(TMP_DATA_DIR, "results.csv.compressed")
+DECOMPRESSED_FILEPATH = os.path.join(TMP_DATA_DIR, "results_decompressed.csv")
+
+@pytest.fixture(scope="module", autouse=True)
+def source_file():
+    with open(SOURCE_FILEPATH, "w") as f:
+        f.write("row_id,ts,counter,nodes,edges\n")
+        for i in range(1, 10_000):
+            f.write(f"{i},2020-06-01 12:00:00,{i * 100},{i * 80},{i * 500}\n")
+    yield SOURCE_FILEPATH
+    os.remove(SOURCE_FILEPATH)
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_round_trip(encoding):
+    if encoding == "zstd":
+        pytest.importorskip("zstandard")
+
+    compress_file(SOURCE_FILEPATH, COMPRESSED_FILEPATH, encoding=encoding, level=9)
+    assert os.path.getsize(COMPRESSED_FILEPATH) < os.path.getsize(SOURCE_FILEPATH) / 4
+    decompress_file(COMPRESSED_FILEPATH, DECOMPRESSED_FILEPATH, encoding=encoding)
+    with open(SOURCE_FILEPATH, "rb") as source, open(DECOMPRESSED_FILEPATH, "rb") as decompressed:
+        assert decompressed.read() == source.read()
+    os.remove(COMPRESSED_FILEPATH)
+    os.remove(DECOMPRESSED_FILEPATH)
+
+def test_compressible():
+    assert is_compressible("data/graph.gpickle")
+    assert is_compressible("data/results.csv")
+    assert not is_compressible("data/bot_probabilities_histogram.png")
+    assert not is_compressible("data/tweets.csv.gz")
+
+    with pytest.raises(ValueError):
+        compress_file(SOURCE_FILEPATH, COMPRESSED_FILEPATH, encoding="lzma")
@@ -0,0 +1,43 @@
+import pyarrow as pa
+from pandas import DataFrame
+
+from app.bot_impact_v4.daily_jobs import consecutive_dates, batches_to_df, perform_daily
+from app.bot_impact_v4.daily_active_user_friend_grapher import active_nodes, build_graph
+
+def test_consecutive_dates():
+    assert consecutive_dates("2020-01-31", 3) == ["2020-01-31", "2020-02-01", "2020-02-02"]
+
+def test_batches_to_df():
+    batch = pa.RecordBatch.from_pylist([{"user_id": 1, "rate": 2}, {"user_id": 2, "rate": 5}])
+    df = batches_to_df([batch.slice(0, 1), batch.slice(1)])
+    assert df.to_dict("records") == [{"user_id": 1, "rate": 2}, {"user_id": 2, "rate": 5}]
+    assert batches_to_df([]).empty
+
+def test_perform_daily():
+    failed_dates = perform_daily(int, ["1", "oops", "3"], max_workers=2) # each date in its own worker process
+    assert list(failed_dates.keys()) == ["oops"]
+
+    failed_dates = perform_daily(int, ["1", "oops", "3"], max_workers=1) # in this process
+    assert list(failed_dates.keys()) == ["oops"]
+
+def test_daily_active_user_friend_graph(mock_user_friends):
+    statuses_df = DataFrame([
+        {"status_id": 10, "user_id": 1, "screen_name": "A", "rate": 2, "bot": False},
+        {"status_id": 11, "user_id": 1, "screen_name": "A", "rate": 2, "bot": False},
+        {"status_id": 12, "user_id": 3, "screen_name": "C", "rate": 1, "bot": True},
+        {"status_id": 13, "user_id": 4, "screen_name": "D", "rate": 1, "bot": False},
+    ])
+    nodes_df = active_nodes(statuses_df)
+    assert nodes_df["screen_name"].tolist() == ["A", "C", "D"]
+
+    friends = pa.RecordBatch.from_pylist(mock_user_friends)
+    graph = build_graph(nodes_df, [friends], active_friends_only=True)
+    assert graph.nodes() == ["A", "C", "D"]
+    assert sorted((u, v) for u, v, _ in graph.edges()) == [("A", "C"), ("A", "D"), ("C", "D"), ("D", "C")]
+    assert graph.node_attributes["rate"].tolist() == [2, 1, 1]
+    assert graph.to_networkx().nodes["C"] == {"user_id": 3, "rate": 1, "bot": True}
+
+    graph = build_graph(nodes_df, [friends], active_friends_only=False)
+    assert graph.nodes() == ["A", "B", "C", "D", "E", "F"]
+    assert graph.node_attributes["bot"].tolist() == [False, False, True, False, False, False]
+    assert graph.to_networkx().nodes["B"] == {} # not active that day
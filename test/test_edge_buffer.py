@@ -0,0 +1,68 @@
+import numpy as np
+import pyarrow as pa
+
+from app.compact_graphs.edge_buffer import EdgeBuffer, NodeIndex
+
+def test_node_index():
+    node_index = NodeIndex()
+    assert node_index.encode([30, 10, 30]).tolist() == [0, 1, 0] # in the order first seen
+    assert node_index.encode([20, 10, 40]).tolist() == [2, 1, 3]
+    assert node_index.lookup([40, 50, 30]).tolist() == [3, -1, 0]
+    assert node_index.node_ids.tolist() == [30, 10, 20, 40]
+    assert len(node_index) == 4
+
+def test_node_index_many_batches():
+    node_index = NodeIndex()
+    rng = np.random.default_rng(0)
+    seen = {}
+    for _ in range(0, 200):
+        ids = rng.integers(0, 5_000, size=50)
+        indices = node_index.encode(ids)
+        for user_id, index in zip(ids.tolist(), indices.tolist()):
+            assert seen.setdefault(user_id, index) == index
+        assert len(node_index.runs) <= np.log2(len(node_index)) + 1 # merged as they go, rather than re-sorted each batch
+
+    assert len(node_index) == len(seen)
+    assert node_index.lookup(list(seen.keys())).tolist() == list(seen.values())
+    assert node_index.sorted_ids.tolist() == sorted(seen.keys())
+    assert len(node_index.runs) == 1
+
+def test_friend_lists(mock_user_friends, mock_graph):
+    buffer = EdgeBuffer(capacity=2) # grows as needed
+    friends = pa.RecordBatch.from_pylist(mock_user_friends)
+    buffer.append_lists(friends.column("screen_name"), friends.column("friend_names"))
+    assert buffer.metadata == {"nodes": 6, "edges": 8}
+
+    graph = buffer.to_networkx(weight_attr=None)
+    assert sorted(graph.nodes) == sorted(mock_graph.nodes)
+    assert sorted(graph.edges) == sorted(mock_graph.edges)
+
+    # also from python lists, like the rows of a database cursor:
+    list_buffer = EdgeBuffer(capacity=2)
+    list_buffer.append_lists([row["screen_name"] for row in mock_user_friends], [row["friend_names"] for row in mock_user_friends])
+    assert sorted(list_buffer.to_compact_graph().edges()) == sorted(buffer.to_compact_graph().edges())
+
+def test_reversed_lists():
+    buffer = EdgeBuffer()
+    buffer.append_lists(pa.array([1, 2]), pa.array([[10, 11], [11]]), reverse=True) # from each follower to the bot
+    assert sorted(buffer.to_compact_graph().edges()) == [(10, 1, 1.0), (11, 1, 1.0), (11, 2, 1.0)]
+
+def test_record_batches(mock_rt_graph):
+    edges = list(mock_rt_graph.edges(data="rt_count"))
+    buffer = EdgeBuffer(capacity=2)
+    for i in range(0, len(edges), 4):
+        batch = pa.RecordBatch.from_pylist([{"user": e[0], "retweeted_user": e[1], "retweet_count": e[2]} for e in edges[i:i+4]])
+        buffer.append_record_batch(batch, "user", "retweeted_user", "retweet_count")
+    assert buffer.edge_count == len(edges)
+    assert buffer.node_count == mock_rt_graph.number_of_nodes()
+
+    graph = buffer.to_compact_graph(weight_attr="rt_count")
+    assert sorted(graph.edges()) == sorted(edges)
+    assert dict(graph.in_degree(weight="rt_count")) == dict(mock_rt_graph.in_degree(weight="rt_count"))
+
+def test_duplicate_edges():
+    buffer = EdgeBuffer()
+    buffer.append(np.array([1, 1, 2]), np.array([2, 2, 1]), np.array([3, 4, 5]))
+    buffer.append([1], [2], [1])
+    assert buffer.edge_count == 4
+    assert sorted(buffer.to_compact_graph().edges()) == [(1, 2, 8.0), (2, 1, 5.0)]
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+from conftest import TMP_DATA_DIR
+from app.compact_graphs.external_sort import ExternalGraphBuilder, merge_sorted_runs, KEY_BYTES
+from app.compact_graphs.compact_graph import CompactGraph
+
+def test_merge_sorted_runs():
+    runs = [np.array([1, 4, 5, 9]), np.array([2, 4, 6]), np.array([], dtype=np.int64), np.array([0, 9, 10])]
+    merged = np.concatenate(list(merge_sorted_runs(runs, block_size=2)))
+    assert merged.tolist() == [0, 1, 2, 4, 5, 6, 9, 10]
+
+def test_external_graph_builder(mock_user_friends, mock_graph):
+    builder = ExternalGraphBuilder(memory_mb=3 * KEY_BYTES / 1024**2, tmp_dirpath=TMP_DATA_DIR) # a buffer of three edges
+    for row in mock_user_friends:
+        builder.append_lists([row["screen_name"]], [row["friend_names"]])
+    builder.append_lists([row["screen_name"] for row in mock_user_friends], [row["friend_names"] for row in mock_user_friends]) # duplicates
+    assert builder.metadata["edges"] == 16
+    assert builder.metadata["runs"] > 1
+
+    filepath = os.path.join(TMP_DATA_DIR, "external_graph.npz")
+    assert builder.build(filepath) == 8
+    assert not os.path.exists(builder.runs_dirpath)
+
+    graph = CompactGraph.load(filepath)
+    assert sorted(graph.nodes()) == sorted(mock_graph.nodes)
+    assert sorted((u, v) for u, v, _ in graph.edges()) == sorted(mock_graph.edges)
+    os.remove(filepath)
+
+def test_random_edges():
+    rng = np.random.default_rng(0)
+    sources = rng.integers(0, 500, 5000)
+    targets = rng.integers(0, 500, 5000)
+
+    builder = ExternalGraphBuilder(memory_mb=1000 * KEY_BYTES / 1024**2, tmp_dirpath=TMP_DATA_DIR)
+    for i in range(0, 5000, 700):
+        builder.append(sources[i:i+700], targets[i:i+700])
+
+    filepath = os.path.join(TMP_DATA_DIR, "external_graph.npz")
+    builder.build(filepath)
+    graph = CompactGraph.load(filepath)
+    assert sorted((u, v) for u, v, _ in graph.edges()) == sorted(set(zip(sources.tolist(), targets.tolist())))
+    os.remove(filepath)
@@ -0,0 +1,40 @@
+import pyarrow as pa
+import pytest
+
+from app.compact_graphs.friend_graph_builder import FriendGraphBuilder
+
+def test_friend_lists(mock_user_friends, mock_graph):
+    friends = pa.RecordBatch.from_pylist(mock_user_friends)
+    builder = FriendGraphBuilder()
+    builder.append_record_batch(friends.slice(0, 3))
+    builder.append_record_batch(friends.slice(3))
+    assert builder.metadata == {"nodes": 6, "edges": 8, "restrict": False}
+
+    graph = builder.to_compact_graph()
+    assert sorted(graph.nodes()) == sorted(mock_graph.nodes)
+    assert sorted((u, v) for u, v, _ in graph.edges()) == sorted(mock_graph.edges)
+
+    # also from python lists, like the rows of a database cursor:
+    list_builder = FriendGraphBuilder()
+    list_builder.append_lists([row["screen_name"] for row in mock_user_friends], [row["friend_names"] for row in mock_user_friends])
+    assert sorted(list_builder.to_networkx().edges) == sorted(mock_graph.edges)
+
+def test_duplicate_rows():
+    builder = FriendGraphBuilder()
+    builder.append_lists(["B", "A"], [["C", "C"], ["B"]])
+    builder.append_lists(["A", "D"], [["C"], []]) # the same user again, and a user without friends
+    graph = builder.to_compact_graph()
+    assert graph.nodes() == ["A", "B", "C", "D"]
+    assert sorted(graph.edges()) == [("A", "B", 1.0), ("A", "C", 1.0), ("B", "C", 1.0)]
+
+def test_node_subset():
+    nodes = ["A", "B", "C", "E"]
+    builder = FriendGraphBuilder(nodes=nodes, restrict=True)
+    builder.append_lists(["A", "B", "C", "D", "E"], pa.array([["B", "C", "D"], ["C", "D"], ["D"], ["C"], ["F"]]))
+    assert builder.edge_count == 3
+    graph = builder.to_compact_graph()
+    assert graph.nodes() == nodes # including E, whose only friend was excluded
+    assert sorted((u, v) for u, v, _ in graph.edges()) == [("A", "B"), ("A", "C"), ("B", "C")]
+
+    with pytest.raises(ValueError):
+        FriendGraphBuilder(restrict=True)
@@ -0,0 +1,77 @@
+import os
+
+from app.local_bucket import LocalBucket
+from app.gcs_manifest import BucketManifest
+from app.artifact_cache import ArtifactCache
+from app.gcs_service import GoogleCloudStorageService
+
+class CountingBucket(LocalBucket):
+    """Counts the list and metadata requests."""
+    def __init__(self, dirpath):
+        super().__init__(dirpath)
+        self.list_requests = 0
+        self.get_requests = 0
+
+    def list_blobs(self, prefix=None):
+        self.list_requests += 1
+        return super().list_blobs(prefix=prefix)
+
+    def get_blob(self, name):
+        self.get_requests += 1
+        return super().get_blob(name)
+
+def write_file(filepath, contents):
+    with open(filepath, "w") as f:
+        f.write(contents)
+
+def test_manifest(tmp_path):
+    bucket = CountingBucket(str(tmp_path / "bucket"))
+    for date in ["2020-01-01", "2020-01-04", "2020-01-07"]:
+        bucket.blob(f"storage/data/k_days/3/{date}/bot_probabilities.csv").upload_from_string(b"user_id,bot_probability\n1,0.9\n")
+    bucket.blob("storage/data/k_days/5/2020-01-01/bot_probabilities.csv").upload_from_string(b"user_id,bot_probability\n")
+
+    manifest = BucketManifest(bucket, "storage/data/k_days/3/", dirpath=str(tmp_path / "manifests"))
+    dates = [f"2020-01-{day:02}" for day in range(1, 31)]
+    existing = [date for date in dates if manifest.exists(f"storage/data/k_days/3/{date}/bot_probabilities.csv")]
+    assert existing == ["2020-01-01", "2020-01-04", "2020-01-07"]
+    assert manifest.size("storage/data/k_days/3/2020-01-01/bot_probabilities.csv") == 30
+    assert manifest.size("storage/data/k_days/3/2020-01-02/bot_probabilities.csv") is None
+    assert not manifest.exists("storage/data/k_days/5/2020-01-01/bot_probabilities.csv") # outside the prefix
+    assert bucket.list_requests == 1
+    assert bucket.get_requests == 0
+
+    # later runs reuse the saved manifest, until it gets too old:
+    BucketManifest(bucket, "storage/data/k_days/3/", dirpath=str(tmp_path / "manifests"))
+    assert bucket.list_requests == 1
+    BucketManifest(bucket, "storage/data/k_days/3/", dirpath=str(tmp_path / "manifests"), max_age_minutes=0)
+    assert bucket.list_requests == 2
+
+    # refreshing part of the manifest:
+    bucket.blob("storage/data/k_days/3/2020-01-10/bot_probabilities.csv").upload_from_string(b"user_id,bot_probability\n")
+    bucket.delete_blobs([bucket.blob("storage/data/k_days/3/2020-01-01/bot_probabilities.csv")])
+    manifest.refresh("storage/data/k_days/3/2020-01-1")
+    assert manifest.exists("storage/data/k_days/3/2020-01-10/bot_probabilities.csv")
+    assert manifest.exists("storage/data/k_days/3/2020-01-01/bot_probabilities.csv") # not refreshed yet
+    manifest.refresh()
+    assert not manifest.exists("storage/data/k_days/3/2020-01-01/bot_probabilities.csv")
+
+def test_service_manifest(tmp_path):
+    cache = ArtifactCache(dirpath=str(tmp_path / "cache"))
+    service = GoogleCloudStorageService(bucket_dirpath=str(tmp_path / "bucket"), compression="gzip", cache=cache)
+    service.bucket = CountingBucket(str(tmp_path / "bucket"))
+    service.transfer.bucket = service.bucket
+    service.use_manifest("storage/data/k_days/3/", dirpath=str(tmp_path / "manifests"))
+
+    write_file(tmp_path / "results.csv", "row_id,nodes\n1,100\n")
+    service.upload(str(tmp_path / "results.csv"), "storage/data/k_days/3/2020-01-01/results.csv") # gets recorded in the manifest
+    assert service.file_exists("storage/data/k_days/3/2020-01-01/results.csv")
+    assert not service.file_exists("storage/data/k_days/3/2020-01-04/results.csv")
+    assert not service.is_stale("storage/data/k_days/3/2020-01-01/results.csv", str(tmp_path / "results.csv"))
+    assert service.is_stale("storage/data/k_days/3/2020-01-01/results.csv", str(tmp_path / "oops.csv"))
+
+    write_file(tmp_path / "results.csv", "row_id,nodes\n1,200\n")
+    assert service.is_stale("storage/data/k_days/3/2020-01-01/results.csv", str(tmp_path / "results.csv")) # modified locally
+    assert service.bucket.list_requests == 1
+    assert service.bucket.get_requests == 0
+
+    assert service.file_exists("storage/data/k_days/5/2020-01-01/results.csv") == False # outside the prefix, so asks the bucket
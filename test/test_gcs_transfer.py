@@ -0,0 +1,169 @@
+import os
+import threading
+
+import pytest
+from google.api_core.exceptions import NotFound, ServiceUnavailable
+
+from app.gcs_transfer import ChunkedTransfer, IntegrityError, crc32c, file_crc32c, chunk_ranges
+
+class MockBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.data = None
+        self.generation = None
+        self.content_type = None
+        self.content_encoding = None
+
+    @property
+    def size(self):
+        return None if self.data is None else len(self.data)
+
+    @property
+    def crc32c(self):
+        return None if self.data is None else crc32c(self.data)
+
+    def save(self, data):
+        self.data = data
+        self.generation = self.bucket.next_generation()
+        self.bucket.blobs[self.name] = self
+
+    def upload_from_filename(self, filepath, content_type=None, checksum=None):
+        with open(filepath, "rb") as f:
+            self.save(f.read())
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.part_uploads.append(self.name)
+        self.save(data)
+
+    def compose(self, sources):
+        self.save(b"".join([source.data for source in sources]))
+
+    def download_to_filename(self, filepath, raw_download=False, checksum=None):
+        blob = self.bucket.blobs.get(self.name)
+        if blob is None:
+            raise NotFound(self.name)
+        with open(filepath, "wb") as f:
+            f.write(blob.data)
+
+    def download_as_bytes(self, start, end, raw_download=False, checksum=None, if_generation_match=None):
+        with self.bucket.lock:
+            self.bucket.range_downloads.append(start)
+            if start in self.bucket.failing_ranges:
+                self.bucket.failing_ranges.remove(start)
+                raise ServiceUnavailable("try again")
+        return self.data[start : end + 1]
+
+class MockBucket:
+    """Stores blobs in memory, and records part uploads and range downloads."""
+    def __init__(self):
+        self.blobs = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.part_uploads = []
+        self.range_downloads = []
+        self.failing_ranges = []
+
+    def next_generation(self):
+        with self.lock:
+            self.generation += 1
+            return self.generation
+
+    def blob(self, name):
+        return MockBlob(self, name)
+
+    def get_blob(self, name):
+        return self.blobs.get(name)
+
+    def list_blobs(self, prefix):
+        return [blob for name, blob in self.blobs.items() if name.startswith(prefix)]
+
+    def delete_blobs(self, blobs):
+        for blob in blobs:
+            self.blobs.pop(blob.name, None)
+
+@pytest.fixture
+def local_filepath(tmp_path):
+    filepath = str(tmp_path / "graph.gpickle")
+    with open(filepath, "wb") as f:
+        f.write(os.urandom(100_000))
+    return filepath
+
+def mock_transfer(bucket):
+    return ChunkedTransfer(bucket, chunk_size=1_000, parallel_min_size=10_000, max_workers=4, max_retries=2)
+
+def test_chunk_ranges():
+    assert chunk_ranges(2_500, 1_000) == [(0, 1_000), (1_000, 2_000), (2_000, 2_500)]
+    assert chunk_ranges(0, 1_000) == []
+
+def test_upload_in_parts(local_filepath):
+    bucket = MockBucket()
+    transfer = mock_transfer(bucket)
+
+    blob = transfer.upload(local_filepath, "storage/data/graph.gpickle", content_type="application/octet-stream", content_encoding="gzip")
+    assert blob.crc32c == file_crc32c(local_filepath)
+    assert blob.content_encoding == "gzip"
+    assert len(bucket.part_uploads) == 100 # composed in tiers, because there are more than 32 parts
+    assert list(bucket.blobs.keys()) == ["storage/data/graph.gpickle"] # the parts got cleaned up
+
+def test_upload_resumes(local_filepath):
+    bucket = MockBucket()
+    transfer = mock_transfer(bucket)
+
+    prefix = f"storage/data/graph.gpickle.parts/{file_crc32c(local_filepath).replace('/', '_').replace('+', '-').rstrip('=')}/"
+    with open(local_filepath, "rb") as f:
+        for i in range(0, 60): # as if a previous upload got interrupted
+            bucket.blob(f"{prefix}{i:05}").save(f.read(1_000))
+
+    blob = transfer.upload(local_filepath, "storage/data/graph.gpickle")
+    assert blob.crc32c == file_crc32c(local_filepath)
+    assert len(bucket.part_uploads) == 40
+
+def test_download_in_parts(local_filepath, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.gcs_transfer.time.sleep", lambda seconds: None) # don't actually wait between retries
+    bucket = MockBucket()
+    transfer = mock_transfer(bucket)
+    transfer.upload(local_filepath, "storage/data/graph.gpickle")
+
+    downloaded_filepath = str(tmp_path / "downloaded.gpickle")
+    bucket.failing_ranges = [5_000, 42_000]
+    transfer.download(bucket.get_blob("storage/data/graph.gpickle"), downloaded_filepath)
+    assert len(bucket.range_downloads) == 102 # including the retries
+    assert file_crc32c(downloaded_filepath) == file_crc32c(local_filepath)
+    assert not os.path.isfile(f"{downloaded_filepath}.part.json")
+
+    with pytest.raises(NotFound):
+        transfer.download(bucket.blob("storage/data/oops.gpickle"), downloaded_filepath)
+
+def test_download_resumes(local_filepath, tmp_path):
+    bucket = MockBucket()
+    transfer = mock_transfer(bucket)
+    blob = transfer.upload(local_filepath, "storage/data/graph.gpickle")
+
+    downloaded_filepath = str(tmp_path / "downloaded.gpickle")
+    bucket.failing_ranges = [50_000]
+    transfer.max_retries = 0
+    with pytest.raises(ServiceUnavailable):
+        transfer.download(blob, downloaded_filepath)
+    assert os.path.isfile(f"{downloaded_filepath}.part.json")
+
+    bucket.range_downloads = []
+    transfer.download(blob, downloaded_filepath)
+    assert 1 <= len(bucket.range_downloads) < 100 # only the parts which hadn't already been downloaded
+    assert file_crc32c(downloaded_filepath) == file_crc32c(local_filepath)
+
+def test_download_integrity(local_filepath, tmp_path):
+    bucket = MockBucket()
+    transfer = mock_transfer(bucket)
+    blob = transfer.upload(local_filepath, "storage/data/graph.gpickle")
+
+    downloaded_filepath = str(tmp_path / "downloaded.gpickle")
+    with open(f"{downloaded_filepath}.part", "wb") as f:
+        f.write(b"\x00" * blob.size) # a corrupted partial download, claiming to be complete
+    with open(f"{downloaded_filepath}.part.json", "w") as f:
+        f.write(f'{{"generation": {blob.generation}, "size": {blob.size}, "completed": {list(range(0, 100))}}}')
+
+    with pytest.raises(IntegrityError):
+        transfer.download(blob, downloaded_filepath)
+    assert not os.path.isfile(downloaded_filepath)
+    assert not os.path.isfile(f"{downloaded_filepath}.part")
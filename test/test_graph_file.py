@@ -0,0 +1,115 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from conftest import TMP_DATA_DIR
+from app.compact_graphs.compact_graph import CompactGraph
+from app.compact_graphs.graph_file import write_graph_file, read_graph_file, read_graph_header, MAGIC, VERSION
+from app.friend_graphs.base_grapher import BaseGrapher
+from app.friend_graphs.graph_analyzer import GraphAnalyzer
+from app.gcs_service import GoogleCloudStorageService
+from app.retweet_graphs.bq_retweet_grapher import BigQueryRetweetGrapher
+from app.retweet_graphs_v2.graph_storage import GraphStorage
+
+GRAPH_FILEPATH = os.path.join(TMP_DATA_DIR, "graph.bin")
+
+def test_round_trip(mock_rt_graph):
+    graph = CompactGraph.from_networkx(mock_rt_graph, weight_attr="rt_count")
+    graph.user_indices = np.arange(graph.number_of_nodes(), dtype=np.int32)
+    write_graph_file(GRAPH_FILEPATH, graph)
+
+    header = read_graph_header(GRAPH_FILEPATH)
+    assert header["version"] == VERSION
+    assert header["nodes"] == graph.number_of_nodes()
+    assert header["edges"] == graph.number_of_edges()
+
+    for mmap in [True, False]:
+        loaded_graph = read_graph_file(GRAPH_FILEPATH, mmap=mmap)
+        assert loaded_graph.out_edges.indices.flags.writeable != mmap # a read-only view of the file, rather than a copy
+        assert loaded_graph.nodes() == graph.nodes()
+        assert sorted(loaded_graph.edges()) == sorted(graph.edges())
+        assert loaded_graph.weight_attr == "rt_count"
+        assert loaded_graph.user_indices.tolist() == graph.user_indices.tolist()
+        assert dict(loaded_graph.in_degree(weight="rt_count")) == dict(graph.in_degree(weight="rt_count"))
+        del loaded_graph
+    os.remove(GRAPH_FILEPATH)
+
+def test_node_attributes():
+    graph = CompactGraph.from_edges(sources=np.array(["A", "B"], dtype=object), targets=np.array(["C", "C"], dtype=object), weight_attr=None)
+    graph.set_node_attributes(["A", "C"], rate=[2, 1], bot=[False, True])
+    write_graph_file(GRAPH_FILEPATH, graph)
+
+    loaded_graph = read_graph_file(GRAPH_FILEPATH)
+    assert loaded_graph.nodes() == ["A", "B", "C"]
+    assert loaded_graph.weight_attr is None
+    assert loaded_graph.node_attributes["rate"].tolist() == [2, -1, 1]
+    assert loaded_graph.to_networkx().nodes["C"] == {"rate": 1, "bot": True}
+    del loaded_graph
+    os.remove(GRAPH_FILEPATH)
+
+def test_empty_graph():
+    write_graph_file(GRAPH_FILEPATH, CompactGraph.from_edges(sources=[], targets=[], nodes=[1]))
+    graph = read_graph_file(GRAPH_FILEPATH)
+    assert graph.nodes() == [1]
+    assert graph.number_of_edges() == 0
+    del graph
+    os.remove(GRAPH_FILEPATH)
+
+def test_unsupported_files():
+    with open(GRAPH_FILEPATH, "wb") as f:
+        f.write(b"NOT A GRAPH")
+    with pytest.raises(ValueError):
+        read_graph_file(GRAPH_FILEPATH)
+
+    header = json.dumps({"version": VERSION + 1}).encode("utf-8")
+    with open(GRAPH_FILEPATH, "wb") as f:
+        f.write(MAGIC + np.uint64(len(header)).tobytes() + header)
+    with pytest.raises(ValueError, match="VERSION"):
+        read_graph_file(GRAPH_FILEPATH)
+    os.remove(GRAPH_FILEPATH)
+
+def test_grapher_binary_graph_weights(tmp_path, monkeypatch, mock_rt_graph):
+    monkeypatch.setattr("app.compact_graphs.user_dictionary.USER_DICTIONARY_DIRPATH", str(tmp_path / "user_dictionaries"))
+    for grapher_class, weight_attr in [(BigQueryRetweetGrapher, "rt_count"), (BaseGrapher, None)]:
+        grapher = grapher_class.__new__(grapher_class) # without any services
+        grapher.gcs_service = None
+        grapher.graph = mock_rt_graph
+        grapher.write_binary_graph_to_file(GRAPH_FILEPATH)
+
+        loaded_graph = read_graph_file(GRAPH_FILEPATH)
+        assert loaded_graph.weight_attr == weight_attr
+        if weight_attr:
+            assert dict(loaded_graph.in_degree(weight=weight_attr)) == dict(mock_rt_graph.in_degree(weight=weight_attr))
+    os.remove(GRAPH_FILEPATH)
+
+def test_storage_prefers_binary_graph_only_when_compact(tmp_path, monkeypatch, mock_rt_graph):
+    monkeypatch.setattr("app.compact_graphs.user_dictionary.USER_DICTIONARY_DIRPATH", str(tmp_path / "user_dictionaries"))
+    monkeypatch.setattr("app.retweet_graphs_v2.graph_storage.seek_confirmation", lambda: None)
+    monkeypatch.setattr("app.retweet_graphs_v2.graph_storage.WIFI_ENABLED", False)
+    storage = GraphStorage(dirpath=str(tmp_path / "graph"), gcs_service=object(), compact=False, binary=True)
+    storage.graph = mock_rt_graph
+    storage.write_graph_to_file()
+    assert os.path.isfile(storage.local_binary_graph_filepath)
+
+    assert not isinstance(storage.load_graph(), CompactGraph) # for networkx callers, like the BotSimilarityGrapher
+    assert isinstance(storage.load_graph(compact=True), CompactGraph)
+
+def test_analyzer_prefers_binary_graph_only_when_compact(tmp_path, monkeypatch, mock_rt_graph):
+    monkeypatch.setattr("app.compact_graphs.user_dictionary.USER_DICTIONARY_DIRPATH", str(tmp_path / "user_dictionaries"))
+    monkeypatch.setattr("app.friend_graphs.base_grapher.GoogleCloudStorageService", lambda: GoogleCloudStorageService(bucket_dirpath=str(tmp_path / "bucket")))
+    analyzer = GraphAnalyzer(job_id="my-job", storage_mode="local")
+    analyzer.job.local_dirpath = str(tmp_path)
+    analyzer.job.local_graph_filepath = str(tmp_path / "graph.gpickle")
+    analyzer.job.local_binary_graph_filepath = str(tmp_path / "graph.bin")
+    analyzer.job.graph = mock_rt_graph
+    analyzer.job.write_binary_graph_to_file()
+
+    graph = analyzer.load_graph() # for networkx callers, like the botcode classifier
+    assert not isinstance(graph, CompactGraph)
+    assert sorted(graph.edges()) == sorted(mock_rt_graph.edges())
+    assert isinstance(analyzer.load_graph(compact=True), CompactGraph)
+
+    analyzer.job.write_graph_to_file(analyzer.job.local_graph_filepath)
+    assert all(["rt_count" in data for _, _, data in analyzer.load_graph().edges(data=True)]) # the gpickle, with its edge attributes
@@ -0,0 +1,35 @@
+import time
+
+import numpy as np
+
+from app.resource_monitor import ResourceMonitor, MONITOR, monitored
+
+def test_stages():
+    monitor = ResourceMonitor(enabled=True, interval=0.01)
+    for _ in range(2):
+        with monitor.stage("allocation"):
+            array = np.ones(25_000_000) # 200 MB
+            time.sleep(0.05)
+            del array
+    monitor.stop()
+
+    meta = monitor.metadata
+    assert meta["samples"] >= 4 # at least at the start and end of each stage
+    stage = meta["stages"]["allocation"]
+    assert stage["calls"] == 2
+    assert stage["seconds"] >= 0.1
+    assert stage["peak_rss_mb"] >= stage["start_rss_mb"] + 150
+    assert meta["peak_rss_mb"] >= stage["peak_rss_mb"]
+
+def test_disabled():
+    assert MONITOR.enabled == False # unless opted-in
+
+    @monitored
+    def perform():
+        return "DONE"
+
+    assert perform() == "DONE"
+    assert perform.__name__ == "perform"
+    assert MONITOR.stages == {}
+    assert MONITOR.snapshot == {}
+    assert MONITOR.thread is None
@@ -0,0 +1,25 @@
+import pyarrow as pa
+
+from app.gcs_service import GoogleCloudStorageService
+from app.retweet_graphs_v2.retweet_grapher import RetweetGrapher
+
+class MockBigQueryService:
+    """Streams the retweet edges in batches of four rows."""
+    def __init__(self, edges):
+        self.edges = edges
+
+    def fetch_retweet_edges_in_batches_v2(self, topic=None, start_at=None, end_at=None, arrow_batch_size=None):
+        for i in range(0, len(self.edges), 4):
+            yield pa.RecordBatch.from_pylist(self.edges[i:i+4])
+
+def test_users_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.retweet_graphs_v2.retweet_grapher.seek_confirmation", lambda: None)
+    monkeypatch.setattr("app.retweet_graphs_v2.graph_storage.seek_confirmation", lambda: None)
+    monkeypatch.setattr("app.retweet_graphs_v2.graph_storage.GoogleCloudStorageService", lambda: GoogleCloudStorageService(bucket_dirpath=str(tmp_path / "bucket")))
+    edges = [{"user_id": i, "retweeted_user_id": 1000, "retweet_count": 1} for i in range(0, 10)]
+
+    grapher = RetweetGrapher(users_limit=6, batch_size=100, storage_dirpath=str(tmp_path / "graph"), bq_service=MockBigQueryService(edges), compact=True)
+    grapher.start()
+    grapher.perform()
+    assert grapher.counter == 6 # stops mid-batch, at exactly the limit
+    assert grapher.graph.number_of_edges() == 6
@@ -0,0 +1,12 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app.workers import limit_memory
+
+def test_worker_memory_limit():
+    with multiprocessing.Pool(processes=1, initializer=limit_memory, initargs=(1024,), maxtasksperchild=1) as pool:
+        assert pool.apply(np.zeros, (1_000,)).shape == (1_000,)
+        with pytest.raises(MemoryError):
+            pool.apply(np.zeros, (2**31,)) # 16 GB
@@ -0,0 +1,31 @@
+
+from datetime import datetime, timezone
+
+from app.ks_test.topic_matrix import TopicMatrix
+
+def ts(date_string):
+    return datetime.strptime(date_string, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+def test_topic_matrix(local_bq_service):
+    bq_service = local_bq_service
+
+    topics = ["#MAGA", "impeach", "hello"]
+    matrix = TopicMatrix.fetch(bq_service, topics)
+    assert matrix.metadata == {"topics": ["#MAGA", "IMPEACH", "HELLO"], "users": 3, "nonzero_counts": 4}
+
+    # same populations as the separate queries:
+    for topic in topics:
+        counts = {row.user_id: row["count"] for row in bq_service.fetch_retweeters_by_topic_exclusive(topic)}
+        assert dict(zip(matrix.user_ids.tolist(), matrix.topic_counts(topic).tolist())) == counts
+
+    x, y = matrix.xy("#maga")
+    assert sorted(x) == [ts("2010-01-01"), ts("2012-01-01")] # users 1 and 3
+    assert y == [ts("2011-01-01")] # user 2
+
+    x, y = matrix.xy_pair("#MAGA", "hello")
+    assert sorted(x) == [ts("2010-01-01"), ts("2012-01-01")]
+    assert y == [ts("2011-01-01")]
+
+    x, y = matrix.xy_pair("#MAGA", "impeach")
+    assert x == [ts("2012-01-01")] # user 1 talked about both
+    assert y == []
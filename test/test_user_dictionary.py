@@ -0,0 +1,88 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from app.gcs_service import GoogleCloudStorageService
+from app.compact_graphs.user_dictionary import UserDictionary, DictionaryConflict
+from app.compact_graphs.compact_graph import CompactGraph
+from conftest import TMP_DATA_DIR
+
+DICTIONARY_DIRPATH = os.path.join(TMP_DATA_DIR, "user_dictionaries")
+
+def test_commit_and_reload():
+    shutil.rmtree(DICTIONARY_DIRPATH, ignore_errors=True)
+
+    dictionary = UserDictionary(dirpath=DICTIONARY_DIRPATH)
+    assert dictionary.commit([30, 10, 30]).tolist() == [0, 1, 0]
+    assert dictionary.commit([10, 20]).tolist() == [1, 2]
+
+    reloaded = UserDictionary(dirpath=DICTIONARY_DIRPATH) # memory-mapped
+    assert isinstance(reloaded.sorted_ids, np.memmap)
+    assert len(reloaded) == 3
+    assert reloaded.lookup([20, 30, 40]).tolist() == [2, 0, -1]
+    assert reloaded.decode([0, 1, 2]).tolist() == [30, 10, 20]
+
+    # another instance which loaded earlier still gets consistent indices, because it reloads before committing:
+    assert dictionary.commit([40]).tolist() == [3]
+    assert reloaded.commit([50, 40]).tolist() == [4, 3]
+
+    shutil.rmtree(DICTIONARY_DIRPATH)
+
+def test_shared_graph_indices():
+    shutil.rmtree(DICTIONARY_DIRPATH, ignore_errors=True)
+
+    day_1 = CompactGraph.from_edges(sources=["user1", "user2"], targets=["leader1", "leader1"])
+    day_2 = CompactGraph.from_edges(sources=["user2", "user3"], targets=["leader1", "leader2"])
+    dictionary = UserDictionary.for_ids(day_1.node_ids, dirpath=DICTIONARY_DIRPATH)
+    assert dictionary.name == "screen_names"
+    for graph in [day_1, day_2]:
+        graph.user_indices = dictionary.commit(graph.node_ids)
+
+    # edges in common between the two days, as an array operation:
+    def edge_keys(graph):
+        sources, targets, _ = graph.user_edge_arrays()
+        return sources.astype(np.int64) * 2**32 + targets
+    common_edges = np.intersect1d(edge_keys(day_1), edge_keys(day_2))
+    assert dictionary.decode(common_edges // 2**32).tolist() == ["user2"]
+    assert dictionary.decode(common_edges % 2**32).tolist() == ["leader1"]
+
+    # the user indices get saved with the graph:
+    filepath = os.path.join(TMP_DATA_DIR, "compact_graph.npz")
+    day_2.save(filepath)
+    assert CompactGraph.load(filepath).user_indices.tolist() == day_2.user_indices.tolist()
+    os.remove(filepath)
+
+    shutil.rmtree(DICTIONARY_DIRPATH)
+
+def test_synced_dictionaries(tmp_path):
+    service = GoogleCloudStorageService(bucket_dirpath=str(tmp_path / "bucket"))
+    machine_1 = UserDictionary(dirpath=str(tmp_path / "machine_1"), gcs_service=service)
+    machine_2 = UserDictionary(dirpath=str(tmp_path / "machine_2"), gcs_service=service)
+
+    assert machine_1.commit([30, 10]).tolist() == [0, 1]
+    assert machine_2.commit([10, 20]).tolist() == [1, 2] # pulls the other machine's users first
+    assert machine_1.lookup([20]).tolist() == [-1]
+    machine_1.require([2, 0]) # like the user indices of a graph built on the other machine
+    assert machine_1.decode([2, 0]).tolist() == [20, 30]
+    with pytest.raises(ValueError, match="ISN'T IN"):
+        machine_1.require([3])
+
+    # when another machine pushes between this one's pull and push, the commit gets retried from the latest version:
+    encode = machine_1.encode
+    def encode_after_machine_2(ids):
+        machine_1.encode = encode
+        machine_2.commit([40])
+        return encode(ids)
+    machine_1.encode = encode_after_machine_2
+    assert machine_1.commit([50]).tolist() == [4]
+    assert machine_2.commit([50, 40]).tolist() == [4, 3]
+    assert UserDictionary(dirpath=str(tmp_path / "machine_1")).decode([3, 4]).tolist() == [40, 50] # saved locally too
+
+    # a dictionary which was committed to offline can't be reconciled with one which other machines have pushed to:
+    offline = UserDictionary(dirpath=str(tmp_path / "machine_3"))
+    offline.commit([60])
+    offline.gcs_service = service
+    with pytest.raises(DictionaryConflict):
+        offline.commit([70])
@@ -0,0 +1,51 @@
+import os
+import shutil
+
+from networkx import DiGraph
+
+from app.compact_graphs.compact_graph import CompactGraph
+from app.compact_graphs.user_dictionary import UserDictionary
+from app.compact_graphs.window_graph import WindowGraph
+from app.retweet_graphs_v2.k_days.generator import DateRangeGenerator
+from conftest import TMP_DATA_DIR
+
+DICTIONARY_DIRPATH = os.path.join(TMP_DATA_DIR, "user_dictionaries")
+
+def test_date_range_days():
+    date_range = DateRangeGenerator.get_date_ranges(start_date="2020-01-30", k_days=3, n_periods=1)[0]
+    assert [day.start_date for day in date_range.days] == ["2020-01-30", "2020-01-31", "2020-02-01"]
+    assert [day.end_date for day in date_range.days] == ["2020-01-30", "2020-01-31", "2020-02-01"]
+
+def compile_networkx_graph():
+    graph = DiGraph()
+    graph.add_edge(1, 20, weight=2)
+    return graph
+
+def test_sliding_window():
+    shutil.rmtree(DICTIONARY_DIRPATH, ignore_errors=True)
+    dictionary = UserDictionary(dirpath=DICTIONARY_DIRPATH)
+
+    daily_graphs = {
+        "2020-01-01": CompactGraph.from_edges(sources=[1, 2], targets=[10, 10], weights=[3, 1]),
+        "2020-01-02": CompactGraph.from_edges(sources=[2, 3], targets=[10, 20], weights=[2, 5]),
+        "2020-01-03": CompactGraph.from_edges(sources=[4], targets=[30], weights=[1]), # a new user, after the earlier days were saved
+    }
+    for graph in daily_graphs.values():
+        graph.user_indices = dictionary.commit(graph.node_ids)
+
+    window = WindowGraph(user_dictionary=dictionary)
+    window.slide_to(["2020-01-01", "2020-01-02"], load_graph=daily_graphs.get)
+    graph = window.to_compact_graph()
+    assert sorted(graph.edges()) == [(1, 10, 3.0), (2, 10, 3.0), (3, 20, 5.0)]
+    assert dictionary.decode(graph.user_indices).tolist() == graph.node_ids.tolist()
+
+    window.slide_to(["2020-01-02", "2020-01-03"], load_graph=daily_graphs.get)
+    assert window.keys == ["2020-01-02", "2020-01-03"]
+    graph = window.to_compact_graph()
+    assert sorted(graph.edges()) == [(2, 10, 2.0), (3, 20, 5.0), (4, 30, 1.0)]
+    assert graph.node_ids.tolist() == [2, 3, 4, 10, 20, 30] # excludes users who only had edges on the expired day
+
+    window.slide_to(["2020-01-03", "2020-01-04"], load_graph={**daily_graphs, "2020-01-04": compile_networkx_graph()}.get) # gets indexed as it's added
+    assert sorted(window.to_compact_graph().edges()) == [(1, 20, 2.0), (4, 30, 1.0)]
+
+    shutil.rmtree(DICTIONARY_DIRPATH)